@@ -2,7 +2,9 @@
 
 This class represents a CRS fighter. A CRS fighter has a fighter id (i.e., 1
 or 2), a name (i.e., model name), and a CRS. The CRS is loaded using the
-model name and configuration file.
+model name and configuration file. It is taken from the shared model pool at
+each turn rather than kept by the fighter, so that a model evicted from the
+pool is not kept in memory.
 """
 
 import json
@@ -10,6 +12,7 @@ from typing import TYPE_CHECKING, Any, Dict, List, Optional, Tuple
 
 from utils import get_crs_model
 
+from src.model.crs_model import CRSModel
 from src.model.utils import get_entity, get_options
 
 if TYPE_CHECKING:
@@ -35,13 +38,13 @@ class CRSFighter:
 
         self.name = name
         self.config_path = config_path
-        self.model = get_crs_model(self.name, self.config_path)
+        self.kg_dataset = self.model.crs_model.kg_dataset
 
         # Load entity data
         self._load_entity_data()
 
         # Load options
-        self.options = get_options(self.model.crs_model.kg_dataset)
+        self.options = get_options(self.kg_dataset)
 
         # Generation arguments.
         self.response_generation_args = {}
@@ -50,16 +53,21 @@ class CRSFighter:
                 {
                     "movie_token": (
                         "<movie>"
-                        if self.model.crs_model.kg_dataset.startswith("redial")
+                        if self.kg_dataset.startswith("redial")
                         else "<mask>"
                     ),
                 }
             )
 
+    @property
+    def model(self) -> CRSModel:
+        """CRS model, loaded again if it was evicted from the model pool."""
+        return get_crs_model(self.name, self.config_path)
+
     def _load_entity_data(self):
         """Loads entity data."""
         with open(
-            f"data/{self.model.crs_model.kg_dataset}/entity2id.json",
+            f"data/{self.kg_dataset}/entity2id.json",
             "r",
             encoding="utf-8",
         ) as f:
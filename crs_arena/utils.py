@@ -13,19 +13,35 @@ import openai
 import pandas as pd
 import streamlit as st
 import wget
-import yaml
 from huggingface_hub import HfApi
 from streamlit_gsheets import GSheetsConnection
 
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
 
 from src.model.crs_model import CRSModel
+from src.serving.model_pool import DEFAULT_MEMORY_BUDGET_GB, ModelPool
 
 # Initialize Hugging Face API
 HF_API = HfApi(token=st.secrets.hf.hf_token)
 
 
-@st.cache_resource(show_spinner="Loading CRS...", max_entries=5)
+@st.cache_resource(show_spinner=False)
+def get_model_pool() -> ModelPool:
+    """Returns the pool of CRS models shared by all the users.
+
+    The models are loaded on first use and the least recently used ones are
+    evicted when the loaded models exceed the memory budget, set in the
+    secrets (`model_pool.memory_budget_gb`).
+
+    Returns:
+        Model pool.
+    """
+    memory_budget_gb = st.secrets.get("model_pool", {}).get(
+        "memory_budget_gb", DEFAULT_MEMORY_BUDGET_GB
+    )
+    return ModelPool({}, int(memory_budget_gb * 1024**3))
+
+
 def get_crs_model(model_name: str, model_config_file: str) -> CRSModel:
     """Returns a CRS model.
 
@@ -45,15 +61,15 @@ def get_crs_model(model_name: str, model_config_file: str) -> CRSModel:
             f"Model configuration file {model_config_file} not found."
         )
 
-    model_args = yaml.safe_load(open(model_config_file, "r"))
-
     if "chatgpt" in model_name:
         openai.api_key = st.secrets.openai.api_key
 
-    # Extract crs model from name
-    name = model_name.split("_")[0]
-
-    return CRSModel(name, **model_args)
+    model_pool = get_model_pool()
+    model_pool.configs.setdefault(model_name, model_config_file)
+    if model_pool.is_loaded(model_name):
+        return model_pool.get(model_name).crs_model
+    with st.spinner("Loading CRS..."):
+        return model_pool.get(model_name).crs_model
 
 
 def execute_sql_query(query: str, params: Dict[str, str]) -> List[Any]:
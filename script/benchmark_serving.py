@@ -0,0 +1,239 @@
+"""Benchmark the latency of the asynchronous CRS server under load.
+
+Requests built from the test conversations are sent to the ASGI app of
+`CRSAsyncServer` in-process, i.e., without the HTTP transport. Arrivals are
+open-loop (Poisson process), so that the latency includes the queueing delay
+at each request rate. For each rate, the p50/p99 latencies and the throughput
+are reported with micro-batching and without (batches of one request).
+
+For CRB-CRS on ReDial, use the following command:
+python -m script.benchmark_serving \
+    --crs_model crbcrs \
+    --model_config data/arena/crs_config/CRB_CRS/crb_crs_redial.yaml \
+    --rps 1 5 10 20 --max_batch_size 16 --max_batch_delay_ms 5
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import random
+import time
+from typing import Any, Dict, List
+
+import numpy as np
+import yaml
+
+from src.model.crs_model import CRSModel
+from src.model.utils import load_jsonl_data
+from src.serving.asgi_server import CRSAsyncServer
+from src.serving.micro_batcher import DEFAULT_MAX_BATCH_SIZE
+from src.serving.model_pool import ModelPool
+
+
+def parse_args() -> argparse.Namespace:
+    """Parses command line arguments."""
+    parser = argparse.ArgumentParser(
+        description="Benchmark the latency of the asynchronous CRS server."
+    )
+    parser.add_argument(
+        "--crs_model",
+        type=str,
+        required=True,
+        choices=["kbrd", "barcor", "unicrs", "chatgpt", "crbcrs"],
+    )
+    parser.add_argument(
+        "--model_config",
+        type=str,
+        required=True,
+        help="Path to a YAML file with the model's arguments.",
+    )
+    parser.add_argument(
+        "--data_file",
+        type=str,
+        default="data/redial_eval/test_data_processed.jsonl",
+        help="Path to the processed test data.",
+    )
+    parser.add_argument(
+        "--rps",
+        type=float,
+        nargs="+",
+        default=[1, 5, 10, 20],
+        help="Request rates (requests per second) to benchmark.",
+    )
+    parser.add_argument(
+        "--duration",
+        type=float,
+        default=30.0,
+        help="Duration in seconds of the load at each rate.",
+    )
+    parser.add_argument(
+        "--num_sessions",
+        type=int,
+        default=50,
+        help="Number of concurrent sessions the requests are spread over.",
+    )
+    parser.add_argument(
+        "--max_batch_size",
+        type=int,
+        default=DEFAULT_MAX_BATCH_SIZE,
+        help="Maximum number of requests per batch.",
+    )
+    parser.add_argument(
+        "--max_batch_delay_ms",
+        type=float,
+        default=5.0,
+        help="Maximum time in milliseconds a request waits for a batch.",
+    )
+    parser.add_argument("--seed", type=int, default=42)
+    return parser.parse_args()
+
+
+async def send_request(
+    server: CRSAsyncServer, sender_data: Dict[str, Any]
+) -> Dict[str, Any]:
+    """Sends a POST request to the ASGI app.
+
+    Args:
+        server: ASGI app.
+        sender_data: JSON body of the request.
+
+    Returns:
+        Status code and latency in milliseconds of the request.
+    """
+    body = json.dumps(sender_data).encode()
+    messages: List[Dict[str, Any]] = []
+
+    async def receive() -> Dict[str, Any]:
+        return {"type": "http.request", "body": body, "more_body": False}
+
+    async def send(message: Dict[str, Any]) -> None:
+        messages.append(message)
+
+    scope = {"type": "http", "method": "POST", "path": "/", "headers": []}
+    start = time.perf_counter()
+    await server(scope, receive, send)
+    return {
+        "status": messages[0]["status"],
+        "latency": (time.perf_counter() - start) * 1000,
+    }
+
+
+async def run_load(
+    server: CRSAsyncServer,
+    requests: List[Dict[str, Any]],
+    rps: float,
+    duration: float,
+    rng: random.Random,
+) -> Dict[str, Any]:
+    """Sends requests to the server with Poisson arrivals.
+
+    Args:
+        server: ASGI app.
+        requests: Requests to send, cycled through.
+        rps: Request rate.
+        duration: Duration in seconds of the load.
+        rng: Random number generator for the arrival times.
+
+    Returns:
+        Latencies of the successful requests, number of errors, and
+        throughput.
+    """
+    await server.startup()
+    loop = asyncio.get_running_loop()
+    start = loop.time()
+    tasks = []
+    arrival = rng.expovariate(rps)
+    while arrival < duration:
+        await asyncio.sleep(max(0.0, start + arrival - loop.time()))
+        tasks.append(
+            asyncio.create_task(
+                send_request(server, requests[len(tasks) % len(requests)])
+            )
+        )
+        arrival += rng.expovariate(rps)
+    results = await asyncio.gather(*tasks)
+    elapsed = loop.time() - start
+    await server.shutdown()
+
+    latencies = [r["latency"] for r in results if r["status"] == 200]
+    return {
+        "latencies": np.array(latencies),
+        "errors": len(results) - len(latencies),
+        "throughput": len(latencies) / elapsed,
+    }
+
+
+def build_requests(
+    conversations: List[Dict[str, Any]], num_sessions: int
+) -> List[Dict[str, Any]]:
+    """Builds the requests from the conversations.
+
+    Args:
+        conversations: Conversations with a context.
+        num_sessions: Number of sessions the requests are spread over.
+
+    Returns:
+        JSON bodies of the requests.
+    """
+    return [
+        {
+            "context": conversation["context"][:-1],
+            "message": conversation["context"][-1],
+            "session_id": f"session-{i % num_sessions}",
+        }
+        for i, conversation in enumerate(conversations)
+        if conversation["context"]
+    ]
+
+
+def main(args: argparse.Namespace) -> None:
+    """Runs the serving benchmark.
+
+    Args:
+        args: Command line arguments.
+    """
+    with open(args.model_config, "r") as f:
+        model_args = yaml.safe_load(f)
+    model_pool = ModelPool({}, memory_budget=0)
+    model_pool.add(args.crs_model, CRSModel(args.crs_model, **model_args))
+    requests = build_requests(
+        load_jsonl_data(args.data_file), args.num_sessions
+    )
+    logging.info(f"Built {len(requests)} requests.")
+
+    modes = {
+        "batched": args.max_batch_size,
+        "unbatched": 1,
+    }
+    print("mode\trps\tthroughput\tp50 (ms)\tp99 (ms)\terrors")
+    for mode, max_batch_size in modes.items():
+        for rps in args.rps:
+            server = CRSAsyncServer(
+                model_pool,
+                args.crs_model,
+                max_batch_size=max_batch_size,
+                max_batch_delay=args.max_batch_delay_ms / 1000,
+            )
+            result = asyncio.run(
+                run_load(
+                    server,
+                    requests,
+                    rps,
+                    args.duration,
+                    random.Random(args.seed),
+                )
+            )
+            latencies = result["latencies"]
+            if len(latencies) == 0:
+                latencies = np.array([np.nan])
+            print(
+                f"{mode}\t{rps:g}\t{result['throughput']:.2f}\t"
+                f"{np.percentile(latencies, 50):.1f}\t"
+                f"{np.percentile(latencies, 99):.1f}\t{result['errors']}"
+            )
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    main(parse_args())
@@ -0,0 +1,115 @@
+"""Benchmark UniCRS response decoding latency.
+
+Compares the per-token decoding latency when the soft prompt key/values are
+folded once into the KV cache against passing the prompt to every decoding
+step, for several response lengths.
+
+Usage:
+python -m script.benchmark_unicrs_decode \
+    --config data/arena/crs_config/UniCRS/unicrs_redial.yaml \
+    --resp_max_lengths 16 32 64 128
+"""
+
+import argparse
+import logging
+import time
+from typing import Any, Dict, List
+
+import torch
+import yaml
+
+from src.model.UNICRS import UNICRS
+from src.model.utils import load_jsonl_data
+
+
+def parse_args() -> argparse.Namespace:
+    """Parses command line arguments."""
+    parser = argparse.ArgumentParser(
+        description="Benchmark UniCRS response decoding latency."
+    )
+    parser.add_argument(
+        "--config",
+        type=str,
+        default="data/arena/crs_config/UniCRS/unicrs_redial.yaml",
+        help="Path to the UniCRS configuration file.",
+    )
+    parser.add_argument(
+        "--data_file",
+        type=str,
+        default="data/redial_eval/test_data_processed.jsonl",
+        help="Path to the processed test data.",
+    )
+    parser.add_argument(
+        "--resp_max_lengths",
+        type=int,
+        nargs="+",
+        default=[16, 32, 64, 128],
+        help="Number of tokens to decode.",
+    )
+    parser.add_argument(
+        "--num_samples",
+        type=int,
+        default=20,
+        help="Number of conversation contexts to decode from.",
+    )
+    return parser.parse_args()
+
+
+def time_decoding(
+    model: UNICRS,
+    inputs: List[Dict[str, Any]],
+    num_tokens: int,
+    fold_prompt: bool,
+) -> float:
+    """Returns the average decoding latency per token in milliseconds.
+
+    Args:
+        model: UniCRS model.
+        inputs: Generation inputs returned by `get_conv`.
+        num_tokens: Number of tokens to decode.
+        fold_prompt: Whether to fold the prompt into the KV cache.
+    """
+    elapsed = 0.0
+    for input_batch in inputs:
+        if torch.cuda.is_available():
+            torch.cuda.synchronize()
+        start = time.perf_counter()
+        model.model.generate(
+            **input_batch["context"],
+            min_new_tokens=num_tokens,
+            max_new_tokens=num_tokens,
+            fold_prompt=fold_prompt,
+        )
+        if torch.cuda.is_available():
+            torch.cuda.synchronize()
+        elapsed += time.perf_counter() - start
+    return elapsed / (len(inputs) * num_tokens) * 1000
+
+
+def main(args: argparse.Namespace) -> None:
+    """Runs the decoding benchmark.
+
+    Args:
+        args: Command line arguments.
+    """
+    model_args = yaml.safe_load(open(args.config, "r"))
+    model = UNICRS(**model_args)
+
+    inputs = []
+    for conv_dict in load_jsonl_data(args.data_file)[: args.num_samples]:
+        input_batch, _ = model.get_conv(conv_dict)
+        inputs.append(input_batch)
+
+    # Warm up
+    time_decoding(model, inputs[:1], 4, True)
+
+    print("resp_max_length\tper-step prompt (ms/token)\tfolded (ms/token)")
+    for num_tokens in args.resp_max_lengths:
+        per_step = time_decoding(model, inputs, num_tokens, False)
+        folded = time_decoding(model, inputs, num_tokens, True)
+        print(f"{num_tokens}\t{per_step:.2f}\t{folded:.2f}")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    main(parse_args())
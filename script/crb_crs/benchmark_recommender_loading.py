@@ -0,0 +1,124 @@
+"""Benchmark the cold start of the CRB-CRS recommender.
+
+Compares loading the recommender from a pickle file and from a folder of
+artifacts (see `script/crb_crs/convert_recommender.py`). Each trial runs in a
+fresh process and measures the time to load the recommender, the time to
+produce the first recommendations and integrate metadata in a response, and
+the peak memory of the process. The median times and the maximum peak
+memory over the trials are reported.
+
+Usage:
+python -m script.crb_crs.benchmark_recommender_loading \
+    --recommender_paths data/models/crb_crs_redial/movie_recommender.pkl \
+        data/models/crb_crs_redial/movie_recommender
+"""
+
+import argparse
+import logging
+import multiprocessing
+import resource
+import time
+from typing import Dict, List
+
+from src.model.crb_crs.recommender import Recommender
+
+# Conversation used for the first response
+CONTEXT = [
+    "Hi! I am looking for a movie like Toy Story (1995)",
+    "Have you seen @80067 ?",
+    "Yes, I loved it. What is it about?",
+]
+RESPONSE = "You might like @80067 , it is a great comedy"
+
+
+def parse_args() -> argparse.Namespace:
+    """Parses command line arguments."""
+    parser = argparse.ArgumentParser(
+        description="Benchmark the cold start of the CRB-CRS recommender."
+    )
+    parser.add_argument(
+        "--recommender_paths",
+        type=str,
+        nargs="+",
+        required=True,
+        help="Paths to the recommender, pickle files or artifact folders.",
+    )
+    parser.add_argument(
+        "--num_trials",
+        type=int,
+        default=5,
+        help="Number of cold starts per recommender.",
+    )
+    return parser.parse_args()
+
+
+def time_cold_start(recommender_path: str) -> Dict[str, float]:
+    """Loads the recommender and produces a first response.
+
+    Args:
+        recommender_path: Path to the recommender.
+
+    Returns:
+        Load time and first response time in seconds, and peak memory in MB.
+    """
+    start = time.perf_counter()
+    recommender = Recommender.load(recommender_path)
+    load_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    recommended_items = recommender.get_recommendations(CONTEXT)
+    response = recommender.replace_item_ids_with_recommendations(
+        RESPONSE, ["80067"], recommended_items[:1]
+    )
+    recommender.integrate_domain_metadata(CONTEXT, response)
+    response_time = time.perf_counter() - start
+
+    # ru_maxrss is in kilobytes on Linux
+    peak_memory = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    return {
+        "load": load_time,
+        "first_response": response_time,
+        "peak_memory": peak_memory,
+    }
+
+
+def benchmark(recommender_path: str, num_trials: int) -> List[Dict]:
+    """Runs cold starts of a recommender, each in a fresh process.
+
+    Args:
+        recommender_path: Path to the recommender.
+        num_trials: Number of cold starts.
+
+    Returns:
+        Measurements of each cold start.
+    """
+    context = multiprocessing.get_context("spawn")
+    results = []
+    for _ in range(num_trials):
+        with context.Pool(1) as pool:
+            results.append(pool.apply(time_cold_start, (recommender_path,)))
+    return results
+
+
+def main(args: argparse.Namespace) -> None:
+    """Runs the cold start benchmark.
+
+    Args:
+        args: Command line arguments.
+    """
+    print("recommender\tload (s)\tfirst response (s)\tpeak memory (MB)")
+    for recommender_path in args.recommender_paths:
+        results = benchmark(recommender_path, args.num_trials)
+        load = sorted(result["load"] for result in results)
+        first_response = sorted(result["first_response"] for result in results)
+        peak_memory = max(result["peak_memory"] for result in results)
+        print(
+            f"{recommender_path}\t{load[len(load) // 2]:.3f}\t"
+            f"{first_response[len(first_response) // 2]:.3f}\t"
+            f"{peak_memory:.0f}"
+        )
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    main(parse_args())
@@ -0,0 +1,102 @@
+"""Script to precompute the embeddings of the CRB-CRS candidate responses.
+
+The retrieval index is loaded (or built) first as it determines which corpus
+lines can be retrieved.
+
+For ReDial, use the following command:
+python -m script.crb_crs.build_candidate_embeddings \
+    --corpus_folder data/redial/corpus \
+    --dataset redial
+"""
+
+import argparse
+import logging
+import os
+
+from src.model.crb_crs.retriever.candidate_embeddings import (
+    CandidateEmbeddings,
+)
+from src.model.crb_crs.retriever.corpus import (
+    ORIGINAL_CORPUS_FILE,
+    build_candidate_mask,
+    read_corpus,
+)
+from src.model.crb_crs.retriever.tfidf_index import TfidfIndex
+
+
+def parse_args() -> argparse.Namespace:
+    """Parses command line arguments."""
+    parser = argparse.ArgumentParser(
+        description="Precompute the candidate embeddings for CRB-CRS."
+    )
+    parser.add_argument(
+        "--corpus_folder",
+        type=str,
+        required=True,
+        help="Path to the folder containing the corpus files.",
+    )
+    parser.add_argument(
+        "--dataset",
+        type=str,
+        required=True,
+        choices=["redial", "opendialkg"],
+        help="Dataset name, used for preprocessing.",
+    )
+    parser.add_argument(
+        "--index_folder",
+        type=str,
+        default=None,
+        help=(
+            "Path to the retrieval index. Defaults to the index subfolder of "
+            "the corpus folder."
+        ),
+    )
+    parser.add_argument(
+        "--embeddings_folder",
+        type=str,
+        default=None,
+        help=(
+            "Path to save the embeddings. Defaults to the embeddings "
+            "subfolder of the corpus folder."
+        ),
+    )
+    parser.add_argument(
+        "--batch_size",
+        type=int,
+        default=256,
+        help="Number of sentences embedded per forward pass.",
+    )
+    return parser.parse_args()
+
+
+def main(args: argparse.Namespace) -> None:
+    """Precomputes the candidate embeddings for CRB-CRS.
+
+    Args:
+        args: Command line arguments.
+    """
+    index_folder = args.index_folder or os.path.join(
+        args.corpus_folder, "index"
+    )
+    embeddings_folder = args.embeddings_folder or os.path.join(
+        args.corpus_folder, "embeddings"
+    )
+
+    index = TfidfIndex.load_or_build(args.corpus_folder, index_folder)
+    candidate_embeddings = CandidateEmbeddings.build(
+        read_corpus(args.corpus_folder, ORIGINAL_CORPUS_FILE),
+        build_candidate_mask(index.line_metadata),
+        index.corpus_hash,
+        args.dataset,
+        args.batch_size,
+    )
+    candidate_embeddings.save(embeddings_folder)
+    logging.info(
+        f"{candidate_embeddings.embeddings.shape[0]} candidate embeddings "
+        f"saved at {embeddings_folder}."
+    )
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    main(parse_args())
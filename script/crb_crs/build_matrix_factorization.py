@@ -0,0 +1,81 @@
+"""Script to factorize the MovieLens ratings for the CRB-CRS recommender.
+
+The ratings are streamed into a sparse matrix and factorized with randomized
+SVD. The factors are saved as versioned artifacts in the matrix factorization
+folder of the recommender.
+
+For ReDial, use the following command:
+python -m script.crb_crs.build_matrix_factorization \
+    --movielens_data_folder data/movielens \
+    --output_folder data/models/crb_crs_redial/matrix_factorization
+"""
+
+import argparse
+import logging
+import os
+
+from src.model.crb_crs.recommender.matrix_factorization import (
+    DEFAULT_CHUNK_SIZE,
+    DEFAULT_N_COMPONENTS,
+    RatingFactors,
+)
+
+
+def parse_args() -> argparse.Namespace:
+    """Parses command line arguments."""
+    parser = argparse.ArgumentParser(
+        description="Factorize the MovieLens ratings for CRB-CRS."
+    )
+    parser.add_argument(
+        "--movielens_data_folder",
+        type=str,
+        default="data/movielens",
+        help="Path to the folder with the MovieLens data.",
+    )
+    parser.add_argument(
+        "--output_folder",
+        type=str,
+        required=True,
+        help="Path to the folder to save the factors.",
+    )
+    parser.add_argument(
+        "--n_components",
+        type=int,
+        default=DEFAULT_N_COMPONENTS,
+        help="Number of latent factors.",
+    )
+    parser.add_argument(
+        "--chunk_size",
+        type=int,
+        default=DEFAULT_CHUNK_SIZE,
+        help="Number of rating rows read at once.",
+    )
+    parser.add_argument(
+        "--max_rows",
+        type=int,
+        default=None,
+        help="Number of rating rows to use. Defaults to all.",
+    )
+    return parser.parse_args()
+
+
+def main(args: argparse.Namespace) -> None:
+    """Factorizes the MovieLens ratings.
+
+    Args:
+        args: Command line arguments.
+    """
+    rating_factors = RatingFactors.build(
+        os.path.join(args.movielens_data_folder, "ratings_latest.csv"),
+        os.path.join(args.movielens_data_folder, "movies.csv"),
+        n_components=args.n_components,
+        chunk_size=args.chunk_size,
+        max_rows=args.max_rows,
+    )
+    rating_factors.save(args.output_folder)
+    logging.info(f"Rating factors saved at {args.output_folder}.")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    main(parse_args())
@@ -0,0 +1,61 @@
+"""Script to build the neighbour tables of the CRB-CRS movie recommender.
+
+The tables are (re)built for an existing recommender, which is saved back.
+
+For ReDial, use the following command:
+python -m script.crb_crs.build_neighbour_tables \
+    --recommender_path data/models/crb_crs_redial/movie_recommender.pkl
+"""
+
+import argparse
+import logging
+
+from src.model.crb_crs.recommender import Recommender
+from src.model.crb_crs.recommender.neighbour_tables import (
+    DEFAULT_NUM_NEIGHBOURS,
+)
+
+
+def parse_args() -> argparse.Namespace:
+    """Parses command line arguments."""
+    parser = argparse.ArgumentParser(
+        description="Build the neighbour tables of the movie recommender."
+    )
+    parser.add_argument(
+        "--recommender_path",
+        type=str,
+        required=True,
+        help="Path to the recommender.",
+    )
+    parser.add_argument(
+        "--num_neighbours",
+        type=int,
+        default=DEFAULT_NUM_NEIGHBOURS,
+        help="Number of neighbours per item.",
+    )
+    parser.add_argument(
+        "--output_path",
+        type=str,
+        default=None,
+        help="Path to save the recommender. Defaults to recommender_path.",
+    )
+    return parser.parse_args()
+
+
+def main(args: argparse.Namespace) -> None:
+    """Builds the neighbour tables of the movie recommender.
+
+    Args:
+        args: Command line arguments.
+    """
+    recommender = Recommender.load(args.recommender_path)
+    recommender.build_neighbour_tables(args.num_neighbours)
+
+    output_path = args.output_path or args.recommender_path
+    recommender.save(output_path)
+    logging.info(f"Recommender with neighbour tables saved at {output_path}.")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    main(parse_args())
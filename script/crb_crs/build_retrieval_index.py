@@ -0,0 +1,68 @@
+"""Script to build the retrieval index for the retriever component of CRB-CRS.
+
+For ReDial, use the following command:
+python -m script.crb_crs.build_retrieval_index \
+    --corpus_folder data/redial/corpus \
+    --index_folder data/redial/corpus/index
+
+Add --bm25 to also build the index of the BM25 retrieval backend.
+"""
+
+import argparse
+import logging
+import os
+
+from src.model.crb_crs.retriever.bm25_index import BM25Index
+from src.model.crb_crs.retriever.tfidf_index import TfidfIndex
+
+
+def parse_args() -> argparse.Namespace:
+    """Parses command line arguments."""
+    parser = argparse.ArgumentParser(
+        description="Build the retrieval index for CRB-CRS."
+    )
+    parser.add_argument(
+        "--corpus_folder",
+        type=str,
+        required=True,
+        help="Path to the folder containing the corpus files.",
+    )
+    parser.add_argument(
+        "--index_folder",
+        type=str,
+        default=None,
+        help=(
+            "Path to save the index. Defaults to the index subfolder of the "
+            "corpus folder."
+        ),
+    )
+    parser.add_argument(
+        "--bm25",
+        action="store_true",
+        help="Build the BM25 index (bm25 subfolder of the index folder).",
+    )
+    return parser.parse_args()
+
+
+def main(args: argparse.Namespace) -> None:
+    """Builds the retrieval index for CRB-CRS.
+
+    Args:
+        args: Command line arguments.
+    """
+    index_folder = args.index_folder or os.path.join(
+        args.corpus_folder, "index"
+    )
+    index = TfidfIndex.build(args.corpus_folder)
+    index.save(index_folder)
+    logging.info(f"Retrieval index saved at {index_folder}.")
+
+    if args.bm25:
+        bm25_folder = os.path.join(index_folder, "bm25")
+        BM25Index.build(args.corpus_folder).save(bm25_folder)
+        logging.info(f"BM25 index saved at {bm25_folder}.")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    main(parse_args())
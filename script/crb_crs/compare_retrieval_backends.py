@@ -0,0 +1,180 @@
+"""Compare the TF-IDF and BM25 retrieval backends of CRB-CRS.
+
+The queries are built from the contexts of the test conversations, as in
+`CRBCRSModel.get_response` (last utterance, last two, and last three
+utterances). For each backend, the latency of `retrieve_candidates` is
+measured per query. The recall of the BM25 backend is the fraction of the
+candidates retrieved by the TF-IDF backend (the reference) that BM25 also
+retrieves.
+
+A query made only of words that are not in the vocabulary is added, as BM25
+matches no corpus line for it (the retriever then falls back to TF-IDF). The
+number of queries without candidates is reported for each backend.
+
+For ReDial, use the following command:
+python -m script.crb_crs.compare_retrieval_backends \
+    --corpus_folder data/redial/corpus \
+    --dataset redial
+"""
+
+import argparse
+import logging
+import time
+from typing import Dict, List
+
+import numpy as np
+
+from src.model.crb_crs.retriever.retriever import Retriever
+from src.model.utils import load_jsonl_data
+
+# Query whose words are not in the vocabulary of the corpus
+OUT_OF_VOCABULARY_QUERY = "zzxqj qjzzx"
+
+
+def parse_args() -> argparse.Namespace:
+    """Parses command line arguments."""
+    parser = argparse.ArgumentParser(
+        description="Compare the TF-IDF and BM25 retrieval backends."
+    )
+    parser.add_argument(
+        "--corpus_folder",
+        type=str,
+        required=True,
+        help="Path to the folder containing the corpus files.",
+    )
+    parser.add_argument(
+        "--dataset",
+        type=str,
+        default="redial",
+        choices=["redial", "opendialkg"],
+        help="Dataset name.",
+    )
+    parser.add_argument(
+        "--domain",
+        type=str,
+        default="movies",
+        help="Domain of the CRS.",
+    )
+    parser.add_argument(
+        "--data_file",
+        type=str,
+        default="data/redial_eval/test_data_processed.jsonl",
+        help="Path to the processed test data.",
+    )
+    parser.add_argument(
+        "--num_samples",
+        type=int,
+        default=200,
+        help="Number of conversations to build queries from.",
+    )
+    parser.add_argument(
+        "--num_candidates",
+        type=int,
+        default=5,
+        help="Number of candidates retrieved per query.",
+    )
+    return parser.parse_args()
+
+
+def build_queries(
+    retriever: Retriever, conversations: List[Dict]
+) -> List[str]:
+    """Builds the retrieval queries of conversations.
+
+    Args:
+        retriever: Retriever.
+        conversations: Conversations with a context.
+
+    Returns:
+        List of queries.
+    """
+    queries = []
+    for conversation in conversations:
+        context = conversation["context"]
+        for window_size in range(1, min(len(context), 3) + 1):
+            queries.append(retriever.build_query(context[-window_size:]))
+    return queries
+
+
+def run_backend(
+    retriever: Retriever,
+    backend: str,
+    queries: List[str],
+    num_candidates: int,
+) -> Dict:
+    """Retrieves the candidates of each query with a backend.
+
+    Args:
+        retriever: Retriever with both backends loaded.
+        backend: Retrieval backend.
+        queries: Queries.
+        num_candidates: Number of candidates per query.
+
+    Returns:
+        Candidates per query and latencies in milliseconds.
+    """
+    retriever.retrieval_backend = backend
+    # Warm up
+    retriever.retrieve_candidates(queries[0], num_candidates)
+
+    candidates = []
+    latencies = []
+    for query in queries:
+        start = time.perf_counter()
+        candidates.append(retriever.retrieve_candidates(query, num_candidates))
+        latencies.append((time.perf_counter() - start) * 1000)
+    return {"candidates": candidates, "latencies": np.array(latencies)}
+
+
+def main(args: argparse.Namespace) -> None:
+    """Runs the comparison of the retrieval backends.
+
+    Args:
+        args: Command line arguments.
+    """
+    retriever = Retriever(
+        args.corpus_folder,
+        None,
+        args.dataset,
+        args.domain,
+        retrieval_backend="bm25",
+    )
+    conversations = load_jsonl_data(args.data_file)[: args.num_samples]
+    queries = build_queries(retriever, conversations)
+    queries.append(OUT_OF_VOCABULARY_QUERY)
+    logging.info(f"Built {len(queries)} queries.")
+
+    results = {
+        backend: run_backend(retriever, backend, queries, args.num_candidates)
+        for backend in ["tfidf", "bm25"]
+    }
+
+    recalls = [
+        len(set(reference) & set(candidates)) / len(reference)
+        for reference, candidates in zip(
+            results["tfidf"]["candidates"], results["bm25"]["candidates"]
+        )
+        if reference
+    ]
+    print(
+        "backend\tp50 (ms)\tp99 (ms)\tmean candidates\t"
+        "queries without candidates"
+    )
+    for backend, result in results.items():
+        latencies = result["latencies"]
+        num_candidates = np.mean([len(c) for c in result["candidates"]])
+        num_empty = sum(not c for c in result["candidates"])
+        print(
+            f"{backend}\t{np.percentile(latencies, 50):.2f}\t"
+            f"{np.percentile(latencies, 99):.2f}\t{num_candidates:.2f}\t"
+            f"{num_empty}"
+        )
+    print(
+        f"BM25 recall of the TF-IDF candidates@{args.num_candidates}: "
+        f"{np.mean(recalls):.3f}"
+    )
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    main(parse_args())
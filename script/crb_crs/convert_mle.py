@@ -0,0 +1,52 @@
+"""Script to convert a pickled MLE model to the compact array-backed format.
+
+For ReDial, use the following command:
+python -m script.crb_crs.convert_mle \
+    --model_file data/models/crb_crs_redial/mle_model.pkl \
+    --output_folder data/models/crb_crs_redial/mle_model
+"""
+
+import argparse
+import logging
+
+from src.model.crb_crs.retriever.compact_mle import CompactNGramMLE
+from src.model.crb_crs.retriever.mle_model import NGramMLE
+
+
+def parse_args() -> argparse.Namespace:
+    """Parses command line arguments."""
+    parser = argparse.ArgumentParser(
+        description="Convert a pickled MLE model to the compact format."
+    )
+    parser.add_argument(
+        "--model_file",
+        type=str,
+        required=True,
+        help="Path to the pickled MLE model.",
+    )
+    parser.add_argument(
+        "--output_folder",
+        type=str,
+        required=True,
+        help="Path to the folder to save the compact model.",
+    )
+    return parser.parse_args()
+
+
+def main(args: argparse.Namespace) -> None:
+    """Converts a pickled MLE model to the compact format.
+
+    Args:
+        args: Command line arguments.
+    """
+    model = CompactNGramMLE.from_ngram_mle(NGramMLE.load(args.model_file))
+    model.save(args.output_folder)
+    logging.info(
+        f"Compact MLE model ({model.vocab_size} words, n={model.n}) saved at "
+        f"{args.output_folder}."
+    )
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    main(parse_args())
@@ -0,0 +1,52 @@
+"""Script to convert a pickled recommender to a folder of artifacts.
+
+The folder loads faster than the pickle (see
+`MovieRecommender.save_artifacts`) and can be used as `recommender_path` in
+the CRB-CRS configuration.
+
+For ReDial, use the following command:
+python -m script.crb_crs.convert_recommender \
+    --recommender_path data/models/crb_crs_redial/movie_recommender.pkl \
+    --output_folder data/models/crb_crs_redial/movie_recommender
+"""
+
+import argparse
+import logging
+
+from src.model.crb_crs.recommender import Recommender
+
+
+def parse_args() -> argparse.Namespace:
+    """Parses command line arguments."""
+    parser = argparse.ArgumentParser(
+        description="Convert a pickled recommender to a folder of artifacts."
+    )
+    parser.add_argument(
+        "--recommender_path",
+        type=str,
+        required=True,
+        help="Path to the pickled recommender.",
+    )
+    parser.add_argument(
+        "--output_folder",
+        type=str,
+        required=True,
+        help="Path to the folder to save the artifacts.",
+    )
+    return parser.parse_args()
+
+
+def main(args: argparse.Namespace) -> None:
+    """Converts a pickled recommender to a folder of artifacts.
+
+    Args:
+        args: Command line arguments.
+    """
+    recommender = Recommender.load(args.recommender_path)
+    recommender.save_artifacts(args.output_folder)
+    logging.info(f"Recommender artifacts saved at {args.output_folder}.")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    main(parse_args())
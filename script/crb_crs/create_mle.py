@@ -1,9 +1,13 @@
 """Script to create MLE model for retriever component of CRB-CRS.
 
+By default, the n-grams are counted in chunks by a pool of processes and the
+model is written in the compact format (folder). Use `--format pickle` to
+create the legacy pickled model in a single process.
+
 For ReDial, use the following command:
 python -m script.crb_crs.create_mle \
     --corpus_file data/redial/GT_corpus_tokens.txt \
-    --output_file data/models/crb_crs/mle_model.pkl
+    --output_path data/models/crb_crs/mle_model
 """
 
 import argparse
@@ -11,6 +15,7 @@ import logging
 import os
 
 from src.model.crb_crs.retriever.mle_model import NGramMLE
+from src.model.crb_crs.retriever.ngram_counting import count_ngrams
 
 
 def parse_args() -> argparse.Namespace:
@@ -25,10 +30,15 @@ def parse_args() -> argparse.Namespace:
         help="Path to the corpus file.",
     )
     parser.add_argument(
+        "--output_path",
         "--output_file",
+        dest="output_path",
         type=str,
         required=True,
-        help="Path to save the created MLE model.",
+        help=(
+            "Path to save the created MLE model (folder for the compact "
+            "format, file for the pickle format)."
+        ),
     )
     parser.add_argument(
         "--n",
@@ -36,6 +46,25 @@ def parse_args() -> argparse.Namespace:
         default=2,
         help="Maximum n-gram order. Defaults to 2.",
     )
+    parser.add_argument(
+        "--format",
+        type=str,
+        default="compact",
+        choices=["compact", "pickle"],
+        help="Format of the created model. Defaults to compact.",
+    )
+    parser.add_argument(
+        "--num_workers",
+        type=int,
+        default=None,
+        help="Number of worker processes. Defaults to the number of CPUs.",
+    )
+    parser.add_argument(
+        "--chunk_size",
+        type=int,
+        default=1_000_000,
+        help="Number of words counted per task. Defaults to 1,000,000.",
+    )
     return parser.parse_args()
 
 
@@ -45,13 +74,21 @@ def main(args: argparse.Namespace) -> None:
     Args:
         args: Command line arguments.
     """
-    model = NGramMLE(args.n, args.corpus_file)
-
-    model.create_ngrams()
+    if args.format == "pickle":
+        model = NGramMLE(args.n, args.corpus_file)
+        model.create_ngrams()
+        os.makedirs(os.path.dirname(args.output_path), exist_ok=True)
+    else:
+        if not os.path.exists(args.corpus_file):
+            raise FileNotFoundError(
+                f"Corpus file not found: {args.corpus_file}"
+            )
+        model = count_ngrams(
+            args.corpus_file, args.n, args.num_workers, args.chunk_size
+        )
 
-    os.makedirs(os.path.dirname(args.output_file), exist_ok=True)
-    model.save(args.output_file)
-    logging.info(f"MLE model saved at {args.output_file}.")
+    model.save(args.output_path)
+    logging.info(f"MLE model saved at {args.output_path}.")
 
 
 if __name__ == "__main__":
@@ -13,7 +13,7 @@ from src.model.crb_crs.retriever.retriever import (
     CRS_PREFIX,
     USER_PREFIX,
 )
-from src.model.crb_crs.utils_preprocessing import preprocess_utterance
+from src.model.crb_crs.utils_preprocessing import get_preprocessor
 
 ParsedDialogue = List[str]
 
@@ -58,15 +58,27 @@ def parse_dialogue(
     user_id = dialogue.get("initiatorWorkerId")
     system_id = dialogue.get("respondentWorkerId")
 
-    for message in dialogue.get("messages", []):
+    messages = dialogue.get("messages", [])
+    utterances = [{"text": message.get("text")} for message in messages]
+    preprocessor = get_preprocessor()
+    preprocessed_utterances = preprocessor.preprocess_batch(
+        utterances, "redial", no_stopwords=False
+    )
+    preprocessed_utterances_no_stopwords = preprocessor.preprocess_batch(
+        utterances, "redial", no_stopwords=True
+    )
+
+    for (
+        message,
+        preprocessed_utterance,
+        preprocessed_utterance_no_stopwords,
+    ) in zip(
+        messages,
+        preprocessed_utterances,
+        preprocessed_utterances_no_stopwords,
+    ):
         sender_id = message.get("senderWorkerId")
         utterance = message.get("text")
-        preprocessed_utterance = preprocess_utterance(
-            {"text": utterance}, "redial", no_stopwords=False
-        )
-        preprocessed_utterance_no_stopwords = preprocess_utterance(
-            {"text": utterance}, "redial", no_stopwords=True
-        )
 
         if sender_id == user_id:
             parsed_dialogue_original.append(f"{USER_PREFIX} {utterance}")
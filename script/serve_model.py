@@ -1,19 +1,58 @@
 """Start a Flask server to interact with the model.
 
+With `--async_server`, an asynchronous ASGI server is started instead (see
+`src/serving/asgi_server.py`). It micro-batches concurrent requests, e.g.:
+python -m script.serve_model --crs_model crbcrs --kg_dataset redial \
+    --model_config data/arena/crs_config/CRB_CRS/crb_crs_redial.yaml \
+    --async_server --max_batch_size 16 --max_batch_delay_ms 5
+
+With `--model_pool`, the models configured in `data/arena/crs_config/` are
+served by the same process: a request names its model (e.g., "model":
+"kbrd_redial"), which is loaded on first use. The least recently used models
+are evicted when the loaded models exceed `--memory_budget_gb`, except the
+models given to `--pin`, e.g.:
+python -m script.serve_model --model_pool --memory_budget_gb 8 \
+    --pin crbcrs_redial --async_server
+
+Conversations are kept server-side, in memory or in a SQLite database
+(`--session_store sqlite --session_db data/sessions.db`), so that clients only
+need to send the new message with the session id returned by the server.
+
 Inspired by `script/ask.py`."""
 
 import argparse
-import json
 import logging
 import random
 import uuid
 from typing import Any, Dict, Tuple
 
 import openai
+import yaml
 from flask import Flask, request, session
 
 from src.model.crs_model import CRSModel
-from src.model.utils import get_entity, get_options
+from src.serving.conversation import (
+    DatasetResources,
+    add_response,
+    get_dataset_resources,
+    update_session,
+)
+from src.serving.micro_batcher import DEFAULT_MAX_BATCH_SIZE
+from src.serving.model_pool import (
+    DEFAULT_CONFIG_FOLDER,
+    DEFAULT_MEMORY_BUDGET_GB,
+    ModelPool,
+    find_model_configs,
+)
+from src.serving.session_store import (
+    DEFAULT_MAX_SESSIONS,
+    DEFAULT_TTL,
+    SESSION_STORES,
+    ConversationSession,
+    InMemorySessionStore,
+    SessionStore,
+    create_session_store,
+)
 
 logging.basicConfig(
     format="[%(asctime)s] %(levelname)-12s %(message)s",
@@ -36,7 +75,13 @@ def parse_args() -> argparse.Namespace:
     parser.add_argument(
         "--crs_model",
         type=str,
-        choices=["kbrd", "barcor", "unicrs", "chatgpt"],
+        choices=["kbrd", "barcor", "unicrs", "chatgpt", "crbcrs"],
+    )
+    parser.add_argument(
+        "--model_config",
+        type=str,
+        help="Path to a YAML file with the model's arguments, e.g., a CRS "
+        "Arena configuration. Takes precedence over the model arguments.",
     )
 
     parser.add_argument(
@@ -71,11 +116,93 @@ def parse_args() -> argparse.Namespace:
     # server
     parser.add_argument("--host", type=str, default="127.0.0.1")
     parser.add_argument("--port", type=str, default="5005")
+    parser.add_argument(
+        "--async_server",
+        action="store_true",
+        help="Start an asynchronous ASGI server that micro-batches requests.",
+    )
+    parser.add_argument(
+        "--max_batch_size",
+        type=int,
+        default=DEFAULT_MAX_BATCH_SIZE,
+        help="Maximum number of requests per batch (async server).",
+    )
+    parser.add_argument(
+        "--max_batch_delay_ms",
+        type=float,
+        default=5.0,
+        help="Maximum time in milliseconds a request waits for a batch to fill"
+        " (async server).",
+    )
+
+    # model pool
+    parser.add_argument(
+        "--model_pool",
+        action="store_true",
+        help="Serve, on demand, the models configured in the configuration "
+        "folder. Requests are routed by the model name they carry.",
+    )
+    parser.add_argument(
+        "--model_config_folder",
+        type=str,
+        default=DEFAULT_CONFIG_FOLDER,
+        help="Folder with a subfolder of configuration files per CRS.",
+    )
+    parser.add_argument(
+        "--memory_budget_gb",
+        type=float,
+        default=DEFAULT_MEMORY_BUDGET_GB,
+        help="Memory the pooled models may use before the least recently "
+        "used ones are evicted.",
+    )
+    parser.add_argument(
+        "--pin",
+        type=str,
+        nargs="*",
+        default=[],
+        help="Names of the pooled models to load upfront and never evict.",
+    )
+    parser.add_argument(
+        "--default_model",
+        type=str,
+        help="Name of the model serving the requests that do not name one. "
+        "Defaults to --crs_model.",
+    )
+
+    # sessions
+    parser.add_argument(
+        "--session_store",
+        type=str,
+        default="memory",
+        choices=SESSION_STORES,
+        help="Where the conversation sessions are stored.",
+    )
+    parser.add_argument(
+        "--session_db",
+        type=str,
+        default="data/sessions.db",
+        help="Path to the SQLite database of the sessions.",
+    )
+    parser.add_argument(
+        "--session_ttl",
+        type=float,
+        default=DEFAULT_TTL,
+        help="Time in seconds after which an inactive session expires.",
+    )
+    parser.add_argument(
+        "--max_sessions",
+        type=int,
+        default=DEFAULT_MAX_SESSIONS,
+        help="Maximum number of sessions kept.",
+    )
 
     parser.add_argument("--seed", type=int, default=42)
     parser.add_argument("--debug", action="store_true")
 
-    return parser.parse_args()
+    args = parser.parse_args()
+    if args.crs_model is None and not args.model_pool:
+        parser.error("Either --crs_model or --model_pool is required.")
+    return args
 
 
 def get_model_args(
@@ -153,34 +280,26 @@ def get_model_args(
 class CRSFlaskServer:
     def __init__(
         self,
-        crs_model: CRSModel,
-        kg_dataset: str,
-        response_generation_args: Dict[str, Any] = {},
+        model_pool: ModelPool,
+        default_model: str = None,
+        session_store: SessionStore = None,
     ) -> None:
         """Initializes CRS Flask server.
 
         Args:
-            crs_model: CRS model.
-            kg_dataset: Name of knowledge graph dataset.
-            response_generation_args: Arguments for response generation.
-              Defaults to None.
+            model_pool: Pool of the CRS models to serve.
+            default_model: Name of the model serving the requests that do not
+              name one. Defaults to None, i.e., requests must name a model.
+            session_store: Store of the conversation sessions. Defaults to
+              None, i.e., an in-memory store.
         """
-        self.crs_model = crs_model
-
-        # Load entity data
-        with open(
-            f"data/{kg_dataset}/entity2id.json", "r", encoding="utf-8"
-        ) as f:
-            self.entity2id = json.load(f)
-
-        self.id2entity = {int(v): k for k, v in self.entity2id.items()}
-        self.entity_list = list(self.entity2id.keys())
+        self.model_pool = model_pool
+        self.default_model = default_model
 
-        # Get options
-        self.options = get_options(kg_dataset)
-
-        # Response generation arguments
-        self.response_generation_args = response_generation_args
+        # Conversation sessions
+        if session_store is None:
+            session_store = InMemorySessionStore()
+        self.session_store = session_store
 
         self.app = Flask(__name__)
         self.app.add_url_rule(
@@ -215,34 +334,66 @@ class CRSFlaskServer:
             logger.debug(f"Received user request:\n{sender_data}")
 
             try:
+                # Route the request to the model it names
+                model_name = sender_data.get("model") or self.default_model
+                if model_name is None:
+                    raise ValueError("Invalid sender data. Missing model.")
+                model = self.model_pool.get(model_name)
+                dataset = get_dataset_resources(model.kg_dataset)
+
+                # The session id is sent by the client or kept in the cookie
+                session_id = (
+                    sender_data.get("session_id")
+                    or session.get("session_id")
+                    or uuid.uuid4().hex
+                )
+                conversation_session = self.session_store.get_or_create(
+                    f"{model.name}/{session_id}"
+                )
+
                 # Process conversation to create conversation dictionary
-                conversation_dict = self._process_sender_data(sender_data)
+                conversation_dict = self._process_sender_data(
+                    sender_data, conversation_session, dataset
+                )
                 state = conversation_dict.pop("state")
 
                 # Get response
-                response, new_state = self.crs_model.get_response(
+                response, new_state = model.crs_model.get_response(
                     conversation_dict,
-                    self.id2entity,
-                    self.options,
+                    dataset.id2entity,
+                    dataset.options,
                     state,
-                    **self.response_generation_args,
+                    **model.response_generation_args,
                 )
                 logger.debug(f"Generated response: {response}")
-                session["state"] = new_state
-                return {"response": response}, 200
+                add_response(
+                    conversation_session,
+                    response,
+                    new_state,
+                    dataset.entity_list,
+                )
+                self.session_store.put(conversation_session)
+                session["session_id"] = session_id
+                return {"response": response, "session_id": session_id}, 200
             except ValueError as e:
                 logger.error(f"Error occurred: {e}")
                 return (
-                    "An error occurred, make sure you have provided the context"
-                    " and message.",
+                    "An error occurred, make sure you have provided the"
+                    " message and the name of a served model.",
                     400,
                 )
 
     def _process_sender_data(
-        self, sender_data: Dict[str, Any]
+        self,
+        sender_data: Dict[str, Any],
+        conversation_session: ConversationSession,
+        dataset: DatasetResources,
     ) -> Dict[str, Any]:
         """Processes sender data to create conversation dictionary.
 
+        The new message (and the context, if any) are added to the session,
+        only the new utterances are linked to entities.
+
         The conversation dictionary contains the following keys: context,
         entity, rec, resp, template, and state. Context is a list of the
         previous utterances, entity is a list of entities mentioned in the
@@ -253,37 +404,21 @@ class CRSFlaskServer:
 
         Args:
             sender_data: Data sent by the sender.
+            conversation_session: Session of the conversation.
+            dataset: Entities and options of the dataset of the model.
 
         Raises:
-            ValueError: If context or message is not present in sender data.
+            ValueError: If message is not present in sender data.
 
         Returns:
             Conversation dictionary.
         """
-        if any(key not in sender_data for key in ["context", "message"]):
-            raise ValueError(
-                "Invalid sender data. Missing context or message."
-            )
-
-        context = sender_data["context"] + [sender_data["message"]]
-
-        state = session.pop("state", None)
-        if state is None or len(state) != len(self.options[1]):
-            state = [0.0] * len(self.options[1])
-
-        entities = []
-        for utterance in context:
-            utterance_entities = get_entity(utterance, self.entity_list)
-            entities.extend(utterance_entities)
-
-        return {
-            "context": context,
-            "entity": entities,
-            "rec": [],
-            "resp": "",
-            "template": [],
-            "state": state,
-        }
+        return update_session(
+            conversation_session,
+            sender_data,
+            dataset.entity_list,
+            len(dataset.options[1]),
+        )
 
 
 if __name__ == "__main__":
@@ -293,25 +428,60 @@ if __name__ == "__main__":
     if args.debug:
         logger.setLevel(logging.DEBUG)
 
-    model_args = get_model_args(args.crs_model, args)
-    logger.info(f"Loaded arguments for {args.crs_model} model.")
-    logger.debug(f"Model arguments:\n{model_args}")
-
-    # Load model
-    crs_model = CRSModel(crs_model=args.crs_model, **model_args)
-    logger.info(f"Loaded {args.crs_model} model.")
-
-    # Generation arguments
-    response_generation_args = {}
-    if args.crs_model == "unicrs":
-        response_generation_args = {
-            "movie_token": (
-                "<movie>" if args.kg_dataset.startswith("redial") else "<mask>"
-            ),
-        }
+    if args.api_key:
+        openai.api_key = args.api_key
+
+    # Pool of the models, loaded on first use
+    model_configs = {}
+    if args.model_pool:
+        model_configs = find_model_configs(args.model_config_folder)
+    model_pool = ModelPool(
+        model_configs, int(args.memory_budget_gb * 1024**3), args.pin
+    )
+    logger.info(f"Models available on demand: {list(model_configs)}.")
 
-    # Start CRS Flask server
-    crs_server = CRSFlaskServer(
-        crs_model, args.kg_dataset, response_generation_args
+    default_model = args.default_model
+    if args.crs_model:
+        if args.model_config:
+            with open(args.model_config, "r") as f:
+                model_args = yaml.safe_load(f)
+        else:
+            model_args = get_model_args(args.crs_model, args)
+        logger.info(f"Loaded arguments for {args.crs_model} model.")
+        logger.debug(f"Model arguments:\n{model_args}")
+
+        # Load model
+        crs_model = CRSModel(crs_model=args.crs_model, **model_args)
+        model_pool.add(args.crs_model, crs_model)
+        default_model = default_model or args.crs_model
+        logger.info(f"Loaded {args.crs_model} model.")
+
+    # Load the pinned models upfront
+    for model_name in args.pin:
+        model_pool.pin(model_name)
+
+    session_store = create_session_store(
+        args.session_store,
+        args.session_db,
+        args.session_ttl,
+        args.max_sessions,
     )
-    crs_server.start(args.host, args.port)
+
+    if args.async_server:
+        # Only needed to serve the ASGI app
+        import uvicorn
+
+        from src.serving.asgi_server import CRSAsyncServer
+
+        crs_server = CRSAsyncServer(
+            model_pool,
+            default_model,
+            args.max_batch_size,
+            args.max_batch_delay_ms / 1000,
+            session_store,
+        )
+        uvicorn.run(crs_server, host=args.host, port=int(args.port))
+    else:
+        # Start CRS Flask server
+        crs_server = CRSFlaskServer(model_pool, default_model, session_store)
+        crs_server.start(args.host, args.port)
@@ -0,0 +1,136 @@
+"""Offline recommendation evaluation of UniCRS on the processed test data.
+
+The processed test files contain one sample per recommender turn, the context
+of a sample extending the context of the previous turn of the same dialog.
+Samples are grouped by dialog and the turns of consecutive dialogs are ranked
+together with `UNICRS.get_rec_batch`.
+
+Note that the backbone key/values of a shared context prefix cannot be reused
+across turns: at every layer the context attends to the KG and text prompt,
+which is recomputed from the whole context and entities of each turn, and the
+context window is left-truncated to `context_max_length` tokens.
+
+Usage:
+python -m script.unicrs_offline_eval \
+    --config data/arena/crs_config/UniCRS/unicrs_redial.yaml \
+    --data_file data/redial_eval/test_data_processed.jsonl
+"""
+
+import argparse
+import json
+import logging
+import os
+from collections import defaultdict
+from typing import Any, Dict, List
+
+import yaml
+from tqdm import tqdm
+
+from src.model.metric import RecMetric
+from src.model.UNICRS import UNICRS
+from src.model.utils import load_jsonl_data
+
+
+def parse_args() -> argparse.Namespace:
+    """Parses command line arguments."""
+    parser = argparse.ArgumentParser(
+        description="Offline recommendation evaluation of UniCRS."
+    )
+    parser.add_argument(
+        "--config",
+        type=str,
+        default="data/arena/crs_config/UniCRS/unicrs_redial.yaml",
+        help="Path to the UniCRS configuration file.",
+    )
+    parser.add_argument(
+        "--data_file",
+        type=str,
+        default="data/redial_eval/test_data_processed.jsonl",
+        help="Path to the processed test data.",
+    )
+    parser.add_argument(
+        "--batch_size",
+        type=int,
+        default=32,
+        help="Maximum number of samples ranked together.",
+    )
+    parser.add_argument(
+        "--output_file",
+        type=str,
+        default=None,
+        help="Path to save the evaluation report.",
+    )
+    return parser.parse_args()
+
+
+def group_by_dialog(
+    samples: List[Dict[str, Any]]
+) -> List[List[Dict[str, Any]]]:
+    """Groups samples by dialog, ordered by turn.
+
+    Args:
+        samples: Processed test samples.
+
+    Returns:
+        List of dialogs, each a list of samples ordered by turn id.
+    """
+    dialogs = defaultdict(list)
+    for sample in samples:
+        dialogs[str(sample["dialog_id"])].append(sample)
+    return [
+        sorted(dialog, key=lambda sample: int(sample["turn_id"]))
+        for dialog in dialogs.values()
+    ]
+
+
+def batch_dialogs(
+    dialogs: List[List[Dict[str, Any]]], batch_size: int
+) -> List[List[Dict[str, Any]]]:
+    """Packs the turns of consecutive dialogs into batches.
+
+    Args:
+        dialogs: List of dialogs.
+        batch_size: Maximum number of samples per batch.
+
+    Returns:
+        List of batches of samples.
+    """
+    batches = [[]]
+    for dialog in dialogs:
+        for sample in dialog:
+            if len(batches[-1]) == batch_size:
+                batches.append([])
+            batches[-1].append(sample)
+    return [batch for batch in batches if batch]
+
+
+def main(args: argparse.Namespace) -> None:
+    """Evaluates the recommendations of UniCRS.
+
+    Args:
+        args: Command line arguments.
+    """
+    model_args = yaml.safe_load(open(args.config, "r"))
+    model = UNICRS(**model_args)
+
+    dialogs = group_by_dialog(load_jsonl_data(args.data_file))
+    logging.info(f"Loaded {len(dialogs)} dialogs.")
+
+    metric = RecMetric([1, 10, 25, 50])
+    for batch in tqdm(batch_dialogs(dialogs, args.batch_size)):
+        for preds, labels in model.get_rec_batch(batch):
+            if labels and preds:
+                metric.evaluate(preds[0], labels)
+
+    report = metric.report()
+    print(json.dumps(report, indent=2))
+
+    if args.output_file:
+        os.makedirs(os.path.dirname(args.output_file) or ".", exist_ok=True)
+        with open(args.output_file, "w", encoding="utf-8") as f:
+            json.dump(report, f)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    main(parse_args())
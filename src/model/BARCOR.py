@@ -90,46 +90,20 @@ class BARCOR:
             context, truncation=True, max_length=self.context_max_length
         )
 
-        data_list = []
-
-        if "rec" not in conv_dict.keys() or not conv_dict["rec"]:
-            # Interactive mode: the ground truth is not provided
-            data_dict = {
-                "context": context_ids,
-                "entity": [
-                    self.entity2id[ent]
-                    for ent in conv_dict["entity"]
-                    if ent in self.entity2id
-                ],
-            }
-            if "template" in conv_dict:
-                data_dict["template"] = conv_dict["template"]
-            data_list.append(data_dict)
-        else:
-            for rec in conv_dict["rec"]:
-                if rec in self.entity2id:
-                    data_dict = {
-                        "context": context_ids,
-                        "entity": [
-                            self.entity2id[ent]
-                            for ent in conv_dict["entity"]
-                            if ent in self.entity2id
-                        ],
-                        "rec": self.entity2id[rec],
-                    }
-                    if "template" in conv_dict:
-                        data_dict["template"] = conv_dict["template"]
-                    data_list.append(data_dict)
+        # All the ground truth items share the same context, the model is run
+        # once and its ranking is broadcast to every label.
+        labels = None
+        if "rec" in conv_dict.keys() and conv_dict["rec"]:
+            labels = [
+                self.entity2id[rec]
+                for rec in conv_dict["rec"]
+                if rec in self.entity2id
+            ]
+            if len(labels) == 0:
+                return [], labels
 
         # dataloader
-        input_dict = defaultdict(list)
-        label_list = []
-
-        for data in data_list:
-            input_dict["input_ids"].append(data["context"])
-            if "rec" in data.keys():
-                label_list.append(data["rec"])
-
+        input_dict = {"input_ids": [context_ids]}
         input_dict = self.tokenizer.pad(
             input_dict,
             max_length=self.context_max_length,
@@ -137,16 +111,10 @@ class BARCOR:
             pad_to_multiple_of=self.pad_to_multiple_of,
         )
 
-        if len(label_list) > 0:
-            input_dict["labels"] = label_list
-
         for k, v in input_dict.items():
             if not isinstance(v, torch.Tensor):
                 input_dict[k] = torch.as_tensor(v, device=self.device)
 
-        labels = (
-            input_dict["labels"].tolist() if "labels" in input_dict else None
-        )
         self.crs_rec_model.eval()
         outputs = self.crs_rec_model(**input_dict)
         item_ids = torch.as_tensor(self.kg["item_ids"], device=self.device)
@@ -154,6 +122,9 @@ class BARCOR:
         ranks = torch.topk(logits, k=50, dim=-1).indices
         preds = item_ids[ranks].tolist()
 
+        if labels is not None:
+            preds = preds * len(labels)
+
         return preds, labels
 
     def get_conv(self, conv_dict):
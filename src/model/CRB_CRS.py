@@ -12,12 +12,12 @@ https://github.com/ahtsham58/CRB-CRS/tree/main
 import logging
 import os
 import re
-from typing import Any, Dict, List, Tuple
+from typing import Any, Dict, List, Tuple, Union
 
 from nltk.tokenize import word_tokenize
 
 from src.model.crb_crs.recommender import *
-from src.model.crb_crs.retriever.mle_model import NGramMLE
+from src.model.crb_crs.retriever.compact_mle import load_mle_model
 from src.model.crb_crs.retriever.retriever import Retriever
 
 
@@ -29,6 +29,9 @@ class CRBCRSModel:
         corpus_folder: str,
         mle_model_path: str,
         recommender_path: str,
+        index_folder: str = None,
+        embeddings_folder: str = None,
+        retrieval_backend: str = "tfidf",
     ) -> None:
         """Initializes the CRB-CRS model.
 
@@ -36,8 +39,17 @@ class CRBCRSModel:
             dataset: Dataset name.
             domain: Domain of application.
             corpus_folder: Path to the folder containing the corpus.
-            mle_model_path: Path to the MLE model.
-            recommender_path: Path to the recommender model.
+            mle_model_path: Path to the MLE model, either a pickle file or a
+              folder with the compact model.
+            recommender_path: Path to the recommender model, either a pickle
+              file or a folder of artifacts.
+            index_folder: Path to the retrieval index folder. Defaults to
+              None, i.e., the `index` subfolder of the corpus folder.
+            embeddings_folder: Path to the precomputed candidate embeddings.
+              Defaults to None, i.e., the `embeddings` subfolder of the corpus
+              folder.
+            retrieval_backend: Retrieval backend of the retriever, "tfidf" or
+              "bm25". Defaults to "tfidf".
 
         Raises:
             FileNotFoundError: If MLE model path does not exist.
@@ -46,10 +58,18 @@ class CRBCRSModel:
             raise FileNotFoundError(
                 f"MLE model path {mle_model_path} does not exist."
             )
-        mle_model = NGramMLE.load(mle_model_path)
+        mle_model = load_mle_model(mle_model_path)
         self.kg_dataset = dataset  # No relation with a KG, naming is kept for compatibility. # noqa
 
-        self.retriever = Retriever(corpus_folder, mle_model, dataset, domain)
+        self.retriever = Retriever(
+            corpus_folder,
+            mle_model,
+            dataset,
+            domain,
+            index_folder,
+            embeddings_folder,
+            retrieval_backend,
+        )
         self.recommender = Recommender.load(recommender_path)
 
     def get_rec(self, conv_dict: Dict[str, Any]):
@@ -79,29 +99,97 @@ class CRBCRSModel:
         Returns:
             Generated response.
         """
-        # Retrieval
-        context = conv_dict["context"]
-        last_user_utterance = context[-1]
-        last_user_utterance_tokens = word_tokenize(last_user_utterance)
-        candidate_responses = []
+        result = self.get_response_batch([conv_dict])[0]
+        if isinstance(result, Exception):
+            raise result
+        return result
 
-        # Get candidates based on the last user utterance
-        candidate_responses.extend(self._get_candidates([last_user_utterance]))
+    def get_response_batch(
+        self,
+        conv_dicts: List[Dict[str, Any]],
+        id2entity: Dict[int, str] = None,
+        options: Tuple[str, Dict[str, str]] = None,
+        states: List[List[float]] = None,
+    ) -> List[Tuple[str, List[float]]]:
+        """Generates responses for several conversation contexts.
 
-        if len(context) > 1:
-            # Get candidates based on last user utterance and the previous
-            # agent utterance
-            candidate_responses.extend(self._get_candidates(context[-2:]))
+        The candidates of all the conversations are retrieved in a single
+        pass. A conversation for which no response can be generated does not
+        fail the others, the error is returned in place of its response.
 
-        if len(context) > 2:
-            # Get candidates based on the last user utterance, the previous
-            # agent utterance, and the user utterance before that
-            candidate_responses.extend(self._get_candidates(context[-3:]))
+        Args:
+            conv_dicts: Conversation contexts.
+            id2entity (not used): Mapping from entity id to entity name.
+              Defaults to None.
+            options (not used): Prompt with options and dictionary of options.
+              Defaults to None.
+            states (not used): State of the option choices per conversation.
+              Defaults to None.
 
+        Returns:
+            Generated response for each conversation, or the error raised
+            while generating it.
+        """
+        contexts = [conv_dict["context"] for conv_dict in conv_dicts]
+        context_windows_per_context = []
+        for context in contexts:
+            try:
+                context_windows = self._get_context_windows(context)
+            except Exception as e:
+                context_windows = e
+            context_windows_per_context.append(context_windows)
+        candidates_per_context = self._get_candidates_batch(
+            context_windows_per_context
+        )
+        responses = []
+        for context, candidate_responses in zip(
+            contexts, candidates_per_context
+        ):
+            try:
+                if isinstance(candidate_responses, Exception):
+                    raise candidate_responses
+                responses.append(self._respond(context, candidate_responses))
+            except Exception as e:
+                logging.error(f"Error while generating a response: {e}")
+                responses.append(e)
+        return responses
+
+    def _get_context_windows(self, context: List[str]) -> List[List[str]]:
+        """Gets the context windows used to retrieve candidates.
+
+        The windows are the last user utterance, the last user utterance and
+        the previous agent utterance, the last user utterance, the previous
+        agent utterance, and the user utterance before that, and the entire
+        conversation context.
+
+        Args:
+            context: Conversation context.
+
+        Returns:
+            List of context windows.
+        """
+        context_windows = [[context[-1]]]
+        if len(context) > 1:
+            context_windows.append(context[-2:])
+        if len(context) > 2:
+            context_windows.append(context[-3:])
         if len(context) > 3:
-            # Get candidates based on the entire conversation context
-            candidate_responses.extend(self._get_candidates(context))
+            context_windows.append(context)
+        return context_windows
 
+    def _respond(
+        self, context: List[str], candidate_responses: List[str]
+    ) -> Tuple[str, List[float]]:
+        """Ranks the candidates and completes the best one.
+
+        Args:
+            context: Conversation context.
+            candidate_responses: Candidate responses.
+
+        Returns:
+            Generated response.
+        """
+        last_user_utterance_tokens = word_tokenize(context[-1])
         ranked_candidates = self.retriever.rank_candidates(
             last_user_utterance_tokens, candidate_responses
         )
@@ -146,11 +234,73 @@ class CRBCRSModel:
             ]
         return []
 
-    def _get_candidates(self, context: List[str]) -> List[str]:
-        """Gets candidate responses based on the conversation context."""
-        input_query = self.retriever.build_query(context)
-        candidates = self.retriever.retrieve_candidates(context=input_query)
-        return self.retriever.filter_outliers_from_candidates(candidates)
+    def _get_candidates(self, context_windows: List[List[str]]) -> List[str]:
+        """Gets candidate responses based on several context windows.
+
+        The candidates of all the windows are retrieved in a single pass.
+
+        Args:
+            context_windows: List of conversation context windows.
+
+        Raises:
+            ValueError: If a window has no candidates.
+
+        Returns:
+            Filtered candidates of all the windows.
+        """
+        candidates = self._get_candidates_batch([context_windows])[0]
+        if isinstance(candidates, Exception):
+            raise candidates
+        return candidates
+
+    def _get_candidates_batch(
+        self,
+        context_windows_per_context: List[
+            Union[List[List[str]], Exception]
+        ],
+    ) -> List[Union[List[str], Exception]]:
+        """Gets candidate responses for the context windows of several contexts.
+
+        The candidates of all the windows of all the contexts are retrieved in
+        a single pass. A context whose candidates cannot be filtered, e.g., a
+        window without candidates, does not fail the others.
+
+        Args:
+            context_windows_per_context: Context windows of each context, or
+              the error raised while building them.
+
+        Returns:
+            Filtered candidates of all the windows, or error, per context.
+        """
+        input_queries = [
+            self.retriever.build_query(window)
+            for context_windows in context_windows_per_context
+            if not isinstance(context_windows, Exception)
+            for window in context_windows
+        ]
+        candidates_per_window = iter(
+            self.retriever.retrieve_candidates_batch(input_queries)
+        )
+        candidates_per_context = []
+        for context_windows in context_windows_per_context:
+            if isinstance(context_windows, Exception):
+                candidates_per_context.append(context_windows)
+                continue
+            window_candidates = [
+                next(candidates_per_window) for _ in context_windows
+            ]
+            try:
+                candidates = []
+                for retrieved_candidates in window_candidates:
+                    candidates.extend(
+                        self.retriever.filter_outliers_from_candidates(
+                            retrieved_candidates
+                        )
+                    )
+            except Exception as e:
+                candidates = e
+            candidates_per_context.append(candidates)
+        return candidates_per_context
 
     def get_choice(self, gen_inputs, option, state, conv_dict=None):
         """Generates a choice between options given a conversation context.
@@ -2,7 +2,7 @@ import json
 import logging
 import sys
 from collections import defaultdict
-from typing import Any, Dict, List, Tuple
+from typing import Any, Dict, List, Tuple, Union
 
 import torch
 from accelerate import Accelerator
@@ -141,7 +141,29 @@ class UNICRS:
             self.conv_prompt_encoder
         )
 
-    def get_rec(self, conv_dict):
+        # The KG is static at inference time, so the entity embeddings of
+        # each prompt encoder are computed once instead of at every call.
+        with torch.no_grad():
+            self.rec_entity_embeds = (
+                self.rec_prompt_encoder.get_entity_embeds()
+            )
+            self.conv_entity_embeds = (
+                self.conv_prompt_encoder.get_entity_embeds()
+            )
+
+        # Encoding of the last seen context, shared by rec, conv, and choice
+        self._context_encoding = None
+
+    def _tokenize_context(self, conv_dict):
+        """Tokenizes the conversation context for the backbone and the prompt.
+
+        Args:
+            conv_dict: Conversation context.
+
+        Returns:
+            Dictionary with the context ids, prompt ids, entity ids, and
+            number of turns.
+        """
         text_list = []
         turn_idx = 0
         for utt in conv_dict["context"]:
@@ -168,72 +190,31 @@ class UNICRS:
             prompt_context, truncation=True, max_length=self.context_max_length
         )
 
-        self.data_list = []
-
-        if "rec" not in conv_dict.keys() or not conv_dict["rec"]:
-            # Interactive mode: the ground truth is not provided
-            data_dict = {
-                "context": context_ids,
-                "prompt": prompt_ids,
-                "entity": [
-                    self.entity2id[ent]
-                    for ent in conv_dict["entity"][-self.entity_max_length :]
-                    if ent in self.entity2id
-                ],
-            }
-            self.data_list.append(data_dict)
-        else:
-            for rec in conv_dict["rec"]:
-                if rec in self.entity2id:
-                    data_dict = {
-                        "context": context_ids,
-                        "prompt": prompt_ids,
-                        "entity": [
-                            self.entity2id[ent]
-                            for ent in conv_dict["entity"][
-                                -self.entity_max_length :
-                            ]
-                            if ent in self.entity2id
-                        ],
-                        "rec": self.entity2id[rec],
-                    }
-                    self.data_list.append(data_dict)
-
-        context_dict = defaultdict(list)
-        prompt_dict = defaultdict(list)
-        entity_list = []
-        label_list = []
-
-        for data in self.data_list:
-            context_dict["input_ids"].append(data["context"])
-            prompt_dict["input_ids"].append(data["prompt"])
-            entity_list.append(data["entity"])
-            if "rec" in data.keys():
-                label_list.append(data["rec"])
-
-        context_dict = self.tokenizer.pad(
-            context_dict,
-            max_length=self.context_max_length,
-            padding=self.padding,
-            pad_to_multiple_of=self.pad_to_multiple_of,
-        )
-
-        if len(label_list) > 0:
-            context_dict["rec_labels"] = label_list
+        entity_ids = [
+            self.entity2id[ent]
+            for ent in conv_dict["entity"][-self.entity_max_length :]
+            if ent in self.entity2id
+        ]
 
-        for k, v in context_dict.items():
-            if not isinstance(v, torch.Tensor):
-                context_dict[k] = torch.as_tensor(v, device=self.device)
+        return {
+            "context": context_ids,
+            "prompt_ids": prompt_ids,
+            "entity_ids": entity_ids,
+            "turn_idx": turn_idx,
+        }
 
-        position_ids = context_dict["attention_mask"].long().cumsum(-1) - 1
-        position_ids.masked_fill_(context_dict["attention_mask"] == 0, 1)
-        context_dict["position_ids"] = position_ids
+    def _encode_prompts(self, tokenized_contexts):
+        """Encodes a batch of tokenized contexts with the text encoder.
 
-        input_batch = {}  # for model
-        input_batch["context"] = context_dict
+        Args:
+            tokenized_contexts: Outputs of `_tokenize_context`.
 
+        Returns:
+            Dictionary with the padded prompt inputs, the padded entity ids,
+            and the RoBERTa token embeddings.
+        """
         prompt_dict = self.prompt_tokenizer.pad(
-            prompt_dict,
+            {"input_ids": [data["prompt_ids"] for data in tokenized_contexts]},
             max_length=self.context_max_length,
             padding=self.padding,
             pad_to_multiple_of=self.pad_to_multiple_of,
@@ -241,73 +222,170 @@ class UNICRS:
         for k, v in prompt_dict.items():
             if not isinstance(v, torch.Tensor):
                 prompt_dict[k] = torch.as_tensor(v, device=self.device)
-        input_batch["prompt"] = prompt_dict
 
         entity_list = padded_tensor(
-            entity_list,
+            [data["entity_ids"] for data in tokenized_contexts],
             pad_id=self.entity_pad_id,
             pad_tail=True,
             device=self.device,
             debug=self.debug,
             max_length=self.entity_max_length,
         )
-        input_batch["entity"] = entity_list
+
+        with torch.no_grad():
+            token_embeds = self.text_encoder(**prompt_dict).last_hidden_state
+
+        return {
+            "prompt": prompt_dict,
+            "entity": entity_list,
+            "token_embeds": token_embeds,
+        }
+
+    def _encode_context(self, conv_dict):
+        """Encodes the conversation context shared by rec, conv, and choice.
+
+        The encoding (token ids, entity ids, and RoBERTa token embeddings) is
+        memoized for the last seen context so that a single turn runs the
+        text encoder once.
+
+        Args:
+            conv_dict: Conversation context.
+
+        Returns:
+            Dictionary with the encoded context.
+        """
+        cache_key = (
+            tuple(conv_dict["context"]),
+            tuple(conv_dict["entity"][-self.entity_max_length :]),
+        )
+        # The memo is read once, as another thread may replace it
+        entry = self._context_encoding
+        if entry is not None and entry[0] == cache_key:
+            return entry[1]
+
+        tokenized_context = self._tokenize_context(conv_dict)
+        encoding = {
+            "context": tokenized_context["context"],
+            "turn_idx": tokenized_context["turn_idx"],
+            **self._encode_prompts([tokenized_context]),
+        }
+        self._context_encoding = (cache_key, encoding)
+        return encoding
+
+    def _get_rec_labels(self, conv_dict):
+        """Returns the ground truth item ids, None in interactive mode."""
+        if "rec" not in conv_dict.keys() or not conv_dict["rec"]:
+            # Interactive mode: the ground truth is not provided
+            return None
+        return [
+            self.entity2id[rec]
+            for rec in conv_dict["rec"]
+            if rec in self.entity2id
+        ]
+
+    def _rank_items(self, context_ids_list, entity, token_embeds):
+        """Ranks the items for a batch of encoded contexts.
+
+        Args:
+            context_ids_list: Context token ids for each conversation.
+            entity: Padded entity ids (batch_size, entity_len).
+            token_embeds: RoBERTa token embeddings of the prompt contexts.
+
+        Returns:
+            Top 50 item ids for each conversation.
+        """
+        context_dict = self.tokenizer.pad(
+            {"input_ids": context_ids_list},
+            max_length=self.context_max_length,
+            padding=self.padding,
+            pad_to_multiple_of=self.pad_to_multiple_of,
+        )
+
+        for k, v in context_dict.items():
+            if not isinstance(v, torch.Tensor):
+                context_dict[k] = torch.as_tensor(v, device=self.device)
+
+        position_ids = context_dict["attention_mask"].long().cumsum(-1) - 1
+        position_ids.masked_fill_(context_dict["attention_mask"] == 0, 1)
+        context_dict["position_ids"] = position_ids
 
         # infer
-        token_embeds = self.text_encoder(
-            **input_batch["prompt"]
-        ).last_hidden_state
         prompt_embeds = self.rec_prompt_encoder(
-            entity_ids=input_batch["entity"],
             token_embeds=token_embeds,
             output_entity=True,
+            entity_embeds=self.rec_entity_embeds[entity],
         )
-        input_batch["context"]["prompt_embeds"] = prompt_embeds
-        input_batch["context"][
-            "entity_embeds"
-        ] = self.rec_prompt_encoder.get_entity_embeds()
+        context_dict["prompt_embeds"] = prompt_embeds
+        context_dict["entity_embeds"] = self.rec_entity_embeds
 
-        outputs = self.model(**input_batch["context"], rec=True)
+        outputs = self.model(**context_dict, rec=True)
         logits = outputs.rec_logits[:, self.item_ids]
         ranks = torch.topk(logits, k=50, dim=-1).indices
-        preds = self.item_ids[ranks].tolist()
+        return self.item_ids[ranks].tolist()
 
-        if "rec_labels" in input_batch["context"]:
-            labels = input_batch["context"]["rec_labels"].tolist()
-        else:
-            labels = None
+    def get_rec(self, conv_dict):
+        # All the ground truth items share the same context, the model is run
+        # once and its ranking is broadcast to every label.
+        labels = self._get_rec_labels(conv_dict)
+        if labels is not None and len(labels) == 0:
+            return [], labels
+
+        encoding = self._encode_context(conv_dict)
+        preds = self._rank_items(
+            [encoding["context"]], encoding["entity"], encoding["token_embeds"]
+        )
+
+        if labels is not None:
+            preds = preds * len(labels)
 
         return preds, labels
 
-    def get_conv(self, conv_dict):
-        # dataset
+    def get_rec_batch(self, conv_dicts):
+        """Generates recommendations for a batch of conversation contexts.
 
-        text_list = []
-        turn_idx = 0
-        for utt in conv_dict["context"]:
-            if utt != "" and len(utt) > 0:
-                text = ""
-                if turn_idx % 2 == 0:
-                    text += "User: "
-                else:
-                    text += "System: "
-                text += utt
-                text_list.append(text)
-            turn_idx += 1
+        Contexts are padded to the same length, except for the entities that
+        are attended by the prompt. Contexts are therefore grouped by number
+        of entities and each group is ranked in a single forward pass, which
+        gives the same output as calling `get_rec` on each context.
 
-        context = f"{self.tokenizer.eos_token}".join(text_list)
-        context += f"{self.tokenizer.eos_token}"
-        prompt_context = f"{self.prompt_tokenizer.sep_token}".join(text_list)
+        Args:
+            conv_dicts: Conversation contexts.
 
-        self.tokenizer.truncation_side = "left"
-        context_ids = self.tokenizer.encode(
-            context, truncation=True, max_length=self.context_max_length
-        )
+        Returns:
+            List with the output of `get_rec` for each conversation.
+        """
+        labels_list = [self._get_rec_labels(c) for c in conv_dicts]
+        outputs = [([], labels) for labels in labels_list]
+
+        groups = defaultdict(list)
+        for i, labels in enumerate(labels_list):
+            if labels is not None and len(labels) == 0:
+                continue
+            tokenized_context = self._tokenize_context(conv_dicts[i])
+            groups[max(len(tokenized_context["entity_ids"]), 1)].append(
+                (i, tokenized_context)
+            )
 
-        self.prompt_tokenizer.truncation_side = "left"
-        prompt_ids = self.prompt_tokenizer.encode(
-            prompt_context, truncation=True, max_length=self.context_max_length
-        )
+        for group in groups.values():
+            tokenized_contexts = [data for _, data in group]
+            encoding = self._encode_prompts(tokenized_contexts)
+            preds = self._rank_items(
+                [data["context"] for data in tokenized_contexts],
+                encoding["entity"],
+                encoding["token_embeds"],
+            )
+            for (i, _), pred in zip(group, preds):
+                labels = labels_list[i]
+                num_rows = 1 if labels is None else len(labels)
+                outputs[i] = ([pred] * num_rows, labels)
+
+        return outputs
+
+    def get_conv(self, conv_dict):
+        # dataset
+
+        encoding = self._encode_context(conv_dict)
+        turn_idx = encoding["turn_idx"]
 
         self.tokenizer.truncation_side = "right"
         if turn_idx % 2 == 0:
@@ -320,37 +398,20 @@ class UNICRS:
         )
         resp_ids.append(self.tokenizer.eos_token_id)
 
-        entity_list = [
-            self.entity2id[ent]
-            for ent in conv_dict["entity"][-self.entity_max_length :]
-            if ent in self.entity2id
-        ]
-
-        data_dict = {
-            "context": context_ids,
-            "prompt": prompt_ids,
-            "entity": entity_list,
-        }
-
         # dataloader
 
         context_dict = defaultdict(list)
         context_len_list = []
-        prompt_dict = defaultdict(list)
-        entity_list = []
         label_dict = defaultdict(list)
 
         bot_prompt = self.tokenizer.convert_tokens_to_ids(
             self.tokenizer.tokenize("System:")
         )
 
-        context = data_dict["context"] + bot_prompt
-        context_len_list.append((len(data_dict["context"])))
+        context = encoding["context"] + bot_prompt
+        context_len_list.append((len(encoding["context"])))
         context_dict["input_ids"] = context
 
-        prompt_dict["input_ids"] = data_dict["prompt"]
-        entity_list.append(data_dict["entity"])
-
         context_max_length = self.context_max_length + len(bot_prompt)
 
         context_dict = self.tokenizer.pad(
@@ -376,42 +437,18 @@ class UNICRS:
         input_batch["context_len"] = context_len_list
 
         input_batch["context"] = context_dict
-
-        prompt_dict = self.prompt_tokenizer.pad(
-            prompt_dict,
-            max_length=self.context_max_length,
-            padding=self.padding,
-            pad_to_multiple_of=self.pad_to_multiple_of,
-        )
-        for k, v in prompt_dict.items():
-            if not isinstance(v, torch.Tensor):
-                prompt_dict[k] = torch.as_tensor(
-                    v, device=self.device
-                ).unsqueeze(0)
-        input_batch["prompt"] = prompt_dict
-
-        entity_list = padded_tensor(
-            entity_list,
-            pad_id=self.entity_pad_id,
-            pad_tail=True,
-            device=self.device,
-            debug=self.debug,
-            max_length=self.entity_max_length,
-        )
-        input_batch["entity"] = entity_list
+        input_batch["prompt"] = encoding["prompt"]
+        input_batch["entity"] = encoding["entity"]
 
         # infer
 
         self.conv_prompt_encoder.eval()
 
-        token_embeds = self.text_encoder(
-            **input_batch["prompt"]
-        ).last_hidden_state
         prompt_embeds = self.conv_prompt_encoder(
-            entity_ids=input_batch["entity"],
-            token_embeds=token_embeds,
+            token_embeds=encoding["token_embeds"],
             output_entity=False,
             use_conv_prefix=True,
+            entity_embeds=self.conv_entity_embeds[input_batch["entity"]],
         )
         input_batch["context"]["prompt_embeds"] = prompt_embeds
 
@@ -470,46 +507,162 @@ class UNICRS:
         Returns:
             Generated response and updated state.
         """
-        generated_inputs, generated_response = self.get_conv(conv_dict)
+        result = self.get_response_batch(
+            [conv_dict], id2entity, options, [state], movie_token
+        )[0]
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    def get_response_batch(
+        self,
+        conv_dicts: List[Dict[str, Any]],
+        id2entity: Dict[int, str],
+        options: Tuple[str, Dict[str, str]],
+        states: List[List[float]],
+        movie_token: str = "<mask>",
+    ) -> List[Union[Tuple[str, List[float]], Exception]]:
+        """Generates responses for several conversation contexts.
+
+        The response and the choice are generated for each conversation,
+        then the items of all the conversations that need recommendations
+        are ranked in a batch (see `get_rec_batch`). A conversation for which
+        no response can be generated does not fail the others, the error is
+        returned in place of its response.
+
+        Args:
+            conv_dicts: Conversation contexts.
+            id2entity: Mapping from entity ID to entity name.
+            options: Prompt with options and dictionary of options.
+            states: State of the option choices per conversation.
+            movie_token: Mask token for the movie. Defaults to "<mask>".
+
+        Returns:
+            Generated response and updated state, or the error raised while
+            generating it, per conversation.
+        """
         options_letter = list(options[1].keys())
+        results = [None] * len(conv_dicts)
 
         # Get the choice between recommend and generate
-        choice = self.get_choice(generated_inputs, options_letter, state)
+        choices = {}
+        for i, (conv_dict, state) in enumerate(zip(conv_dicts, states)):
+            try:
+                generated_inputs, generated_response = self.get_conv(
+                    conv_dict
+                )
+                choice = self.get_choice(
+                    generated_inputs, options_letter, state
+                )
+                choices[i] = (choice, generated_response)
+            except Exception as e:
+                logging.error(f"Error while generating a response: {e}")
+                results[i] = e
+
+        # Recommendations are needed to recommend items or to fill the
+        # placeholders of the generated response
+        rec_indices = [
+            i
+            for i, (choice, generated_response) in choices.items()
+            if choice == options_letter[-1]
+            or movie_token in self._strip_speaker(generated_response)
+        ]
+        recommended_items = {}
+        if rec_indices:
+            try:
+                recs = self.get_rec_batch([conv_dicts[i] for i in rec_indices])
+                for i, (preds, _) in zip(rec_indices, recs):
+                    recommended_items[i] = preds[0] if preds else []
+            except Exception as e:
+                logging.error(f"Error while generating recommendations: {e}")
+                for i in rec_indices:
+                    results[i] = e
+                    del choices[i]
+
+        for i, (choice, generated_response) in choices.items():
+            try:
+                response = self._complete_response(
+                    choice,
+                    generated_response,
+                    recommended_items.get(i, []),
+                    id2entity,
+                    options_letter,
+                    movie_token,
+                )
+            except Exception as e:
+                logging.error(f"Error while generating a response: {e}")
+                results[i] = e
+                continue
+
+            # Update the state. Hack: penalize the choice to reduce the
+            # likelihood of selecting the same choice again
+            state = states[i]
+            state[options_letter.index(choice)] += -1e5
+            results[i] = (response, state)
+        return results
+
+    def _strip_speaker(self, generated_response: str) -> str:
+        """Removes the text up to the system prefix of a generated response.
+
+        Args:
+            generated_response: Generated response.
+
+        Returns:
+            Response of the system.
+        """
+        return generated_response[
+            generated_response.rfind("System:") + len("System:") + 1 :
+        ]
 
-        # Generate recommendations
-        recommended_items, _ = self.get_rec(conv_dict)
+    def _complete_response(
+        self,
+        choice: str,
+        generated_response: str,
+        recommended_items: List[int],
+        id2entity: Dict[int, str],
+        options_letter: List[str],
+        movie_token: str,
+    ) -> str:
+        """Executes the chosen step to complete the response.
 
+        Args:
+            choice: Chosen option.
+            generated_response: Generated response.
+            recommended_items: Recommended item ids, empty if they are not
+              needed.
+            id2entity: Mapping from entity ID to entity name.
+            options_letter: Letters of the options, the last one is to
+              recommend items.
+            movie_token: Mask token for the movie.
+
+        Returns:
+            Response.
+        """
         if choice == options_letter[-1]:
+            # Generate recommendations
             recommended_items_str = ""
-            for i, item_id in enumerate(recommended_items[0][:3]):
+            for i, item_id in enumerate(recommended_items[:3]):
                 recommended_items_str += f"{i+1}: {id2entity[item_id]}  \n"
-            response = (
+            return (
                 "I would recommend the following items:  \n"
                 f"{recommended_items_str}"
             )
-        else:
-            # Original : Generate a response to ask for preferences. The
-            # fallback is to use the generated response.
-            # response = (
-            #     options[1].get(choice, {}).get("template", generated_response)
-            # )
-            generated_response = generated_response[
-                generated_response.rfind("System:") + len("System:") + 1 :
-            ]
-            for i in range(str.count(generated_response, movie_token)):
-                try:
-                    generated_response = generated_response.replace(
-                        movie_token, id2entity[recommended_items[i]], 1
-                    )
-                except IndexError as e:
-                    logging.error(e)
-                    generated_response = generated_response.replace(
-                        movie_token, "", 1
-                    )
-            response = generated_response.strip()
-
-        # Update the state. Hack: penalize the choice to reduce the
-        # likelihood of selecting the same choice again
-        state[options_letter.index(choice)] += -1e5
-
-        return response, state
+
+        # Original : Generate a response to ask for preferences. The
+        # fallback is to use the generated response.
+        # response = (
+        #     options[1].get(choice, {}).get("template", generated_response)
+        # )
+        generated_response = self._strip_speaker(generated_response)
+        num_movie_tokens = str.count(generated_response, movie_token)
+        for i in range(num_movie_tokens):
+            try:
+                generated_response = generated_response.replace(
+                    movie_token, id2entity[recommended_items[i]], 1
+                )
+            except IndexError as e:
+                logging.error(e)
+                generated_response = generated_response.replace(
+                    movie_token, "", 1
+                )
+        return generated_response.strip()
@@ -0,0 +1,352 @@
+"""Sparse matrix factorization of the MovieLens ratings for CRB-CRS.
+
+The ratings CSV is streamed in chunks. Users and titles are integer-coded and
+the ratings are gathered in a sparse title x user CSR matrix, which is
+factorized with randomized truncated SVD. The factors are centered and
+normalized so that their dot products are the correlations between titles.
+They are saved, with the titles and their mean rating, as versioned
+artifacts that are memory-mapped when loaded.
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+import os
+from typing import Any, Dict, List, Tuple
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+from sklearn.decomposition import TruncatedSVD
+from sklearn.utils.extmath import randomized_svd
+
+FACTORS_VERSION = 1
+MANIFEST_FILE = "manifest.json"
+FACTORS_FILE = "rating_factors.npy"
+RATING_MEANS_FILE = "rating_means.npy"
+TITLES_FILE = "titles.json"
+
+DEFAULT_N_COMPONENTS = 20
+DEFAULT_CHUNK_SIZE = 1_000_000
+
+
+def correlation_factors(matrix: np.ndarray) -> np.ndarray:
+    """Computes factors whose dot products are the row correlations.
+
+    The rows are centered and normalized, so that `factors @ factors.T` is
+    `np.corrcoef(matrix)` without materializing it.
+
+    Args:
+        matrix: Matrix of latent factors, one row per movie.
+
+    Returns:
+        Normalized factors (float32).
+    """
+    centered = matrix - matrix.mean(axis=1, keepdims=True)
+    centered /= np.linalg.norm(centered, axis=1, keepdims=True)
+    return centered.astype(np.float32)
+
+
+def factors_from_correlation(
+    correlation: np.ndarray, rank: int = DEFAULT_N_COMPONENTS
+) -> np.ndarray:
+    """Recovers low-rank factors from a dense correlation matrix.
+
+    Used to convert the dense matrices saved by older versions. The
+    correlation matrix of `rank` latent factors has rank at most `rank`.
+
+    Args:
+        correlation: Dense correlation matrix.
+        rank: Rank of the matrix. Defaults to DEFAULT_N_COMPONENTS.
+
+    Returns:
+        Factors (float32) whose dot products are the correlations.
+    """
+    u, s, _ = randomized_svd(
+        np.nan_to_num(correlation), n_components=rank, random_state=42
+    )
+    return (u * np.sqrt(s)).astype(np.float32)
+
+
+def read_movie_titles(movies_file: str) -> Tuple[List[str], pd.Series]:
+    """Reads the MovieLens titles and codes them in sorted order.
+
+    Args:
+        movies_file: Path to the MovieLens movies CSV.
+
+    Returns:
+        Sorted distinct titles and the title code of each movie id.
+    """
+    movies = pd.read_csv(movies_file, usecols=["movieId", "title"]).dropna(
+        subset=["title"]
+    )
+    titles, codes = np.unique(movies["title"].values, return_inverse=True)
+    return list(titles), pd.Series(codes, index=movies["movieId"].values)
+
+
+def read_ratings(
+    ratings_file: str,
+    title_codes: pd.Series,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    max_rows: int = None,
+) -> Dict[str, np.ndarray]:
+    """Streams the ratings CSV and codes the titles of the rated movies.
+
+    Ratings of movies without a title are dropped.
+
+    Args:
+        ratings_file: Path to the MovieLens ratings CSV.
+        title_codes: Title code of each movie id.
+        chunk_size: Number of rows read at once. Defaults to
+          DEFAULT_CHUNK_SIZE.
+        max_rows: Number of rows to read. Defaults to all.
+
+    Returns:
+        Arrays of user ids, title codes, and ratings, in file order.
+    """
+    users, titles, ratings = [], [], []
+    reader = pd.read_csv(
+        ratings_file,
+        usecols=["userId", "movieId", "rating"],
+        dtype={"userId": np.int64, "movieId": np.int64, "rating": np.float32},
+        chunksize=chunk_size,
+        nrows=max_rows,
+    )
+    for chunk in reader:
+        codes = chunk["movieId"].map(title_codes)
+        known = codes.notna().values
+        users.append(chunk["userId"].values[known])
+        titles.append(codes.values[known].astype(np.int32))
+        ratings.append(chunk["rating"].values[known])
+
+    return {
+        "users": np.concatenate(users or [np.zeros(0, dtype=np.int64)]),
+        "titles": np.concatenate(titles or [np.zeros(0, dtype=np.int32)]),
+        "ratings": np.concatenate(ratings or [np.zeros(0, dtype=np.float32)]),
+    }
+
+
+def build_rating_matrix(
+    ratings: Dict[str, np.ndarray]
+) -> Tuple[sparse.csr_matrix, np.ndarray, np.ndarray]:
+    """Builds the sparse title x user rating matrix.
+
+    Only the first rating of a user for a title is kept. Titles without
+    ratings are left out.
+
+    Args:
+        ratings: Arrays returned by `read_ratings`.
+
+    Returns:
+        Rating matrix, codes of the rated titles (one per row), and mean
+        rating of each row computed over all the ratings.
+    """
+    user_ids, users = np.unique(ratings["users"], return_inverse=True)
+    rated_titles, titles = np.unique(ratings["titles"], return_inverse=True)
+
+    rating_sums = np.bincount(
+        titles, weights=ratings["ratings"], minlength=len(rated_titles)
+    )
+    rating_means = rating_sums / np.bincount(
+        titles, minlength=len(rated_titles)
+    )
+
+    # np.unique returns the index of the first occurrence of each pair
+    _, first = np.unique(
+        users.astype(np.int64) * len(rated_titles) + titles,
+        return_index=True,
+    )
+    matrix = sparse.csr_matrix(
+        (ratings["ratings"][first], (titles[first], users[first])),
+        shape=(len(rated_titles), len(user_ids)),
+        dtype=np.float32,
+    )
+    return matrix, rated_titles, rating_means
+
+
+def compute_rating_means(
+    ratings_file: str,
+    movies_file: str,
+    titles: List[str],
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    max_rows: int = None,
+) -> np.ndarray:
+    """Computes the mean rating of titles by streaming the ratings CSV.
+
+    Args:
+        ratings_file: Path to the MovieLens ratings CSV.
+        movies_file: Path to the MovieLens movies CSV.
+        titles: Titles to compute the mean rating of.
+        chunk_size: Number of rows read at once. Defaults to
+          DEFAULT_CHUNK_SIZE.
+        max_rows: Number of rating rows to use. Defaults to all.
+
+    Returns:
+        Mean rating of each title, NaN for titles without ratings.
+    """
+    all_titles, title_codes = read_movie_titles(movies_file)
+    ratings = read_ratings(ratings_file, title_codes, chunk_size, max_rows)
+    rating_sums = np.bincount(
+        ratings["titles"], weights=ratings["ratings"], minlength=len(all_titles)
+    )
+    rating_counts = np.bincount(ratings["titles"], minlength=len(all_titles))
+    with np.errstate(invalid="ignore", divide="ignore"):
+        all_means = rating_sums / rating_counts
+
+    codes = {title: code for code, title in enumerate(all_titles)}
+    return np.array(
+        [all_means[codes[t]] if t in codes else np.nan for t in titles],
+        dtype=np.float32,
+    )
+
+
+class RatingFactors:
+    def __init__(
+        self,
+        factors: np.ndarray,
+        titles: List[str],
+        rating_means: np.ndarray = None,
+        metadata: Dict[str, Any] = None,
+    ) -> None:
+        """Initializes the rating factors.
+
+        Args:
+            factors: Normalized factors (float32), one row per title.
+            titles: Titles, aligned with the factors.
+            rating_means: Mean rating of each title. Defaults to None.
+            metadata: Metadata on how the factors were built. Defaults to
+              None.
+        """
+        self.factors = factors
+        self.titles = titles
+        self.rating_means = rating_means
+        self.metadata = metadata or {}
+
+    @classmethod
+    def build(
+        cls,
+        ratings_file: str,
+        movies_file: str,
+        n_components: int = DEFAULT_N_COMPONENTS,
+        chunk_size: int = DEFAULT_CHUNK_SIZE,
+        max_rows: int = None,
+    ) -> RatingFactors:
+        """Factorizes the MovieLens ratings.
+
+        Args:
+            ratings_file: Path to the MovieLens ratings CSV.
+            movies_file: Path to the MovieLens movies CSV.
+            n_components: Number of latent factors. Defaults to
+              DEFAULT_N_COMPONENTS.
+            chunk_size: Number of rows read at once. Defaults to
+              DEFAULT_CHUNK_SIZE.
+            max_rows: Number of rating rows to use. Defaults to all.
+
+        Returns:
+            Rating factors.
+        """
+        titles, title_codes = read_movie_titles(movies_file)
+        ratings = read_ratings(ratings_file, title_codes, chunk_size, max_rows)
+        matrix, rated_titles, rating_means = build_rating_matrix(ratings)
+        num_ratings = len(ratings["ratings"])
+        del ratings
+        logging.info(
+            f"Rating matrix of {matrix.shape[0]} titles x {matrix.shape[1]} "
+            f"users with {matrix.nnz} ratings."
+        )
+
+        svd = TruncatedSVD(
+            n_components=n_components, algorithm="randomized", random_state=42
+        )
+        factors = correlation_factors(svd.fit_transform(matrix))
+        metadata = {
+            "n_components": n_components,
+            "num_users": matrix.shape[1],
+            "num_ratings": num_ratings,
+            "max_rows": max_rows,
+        }
+        return cls(
+            factors,
+            [titles[code] for code in rated_titles],
+            rating_means.astype(np.float32),
+            metadata,
+        )
+
+    def save(self, folder: str) -> None:
+        """Saves the rating factors.
+
+        Args:
+            folder: Path to the folder to save the artifacts.
+        """
+        os.makedirs(folder, exist_ok=True)
+        np.save(os.path.join(folder, FACTORS_FILE), self.factors)
+        if self.rating_means is not None:
+            np.save(os.path.join(folder, RATING_MEANS_FILE), self.rating_means)
+        with open(os.path.join(folder, TITLES_FILE), "w") as f:
+            json.dump(list(self.titles), f)
+
+        manifest = {
+            "version": FACTORS_VERSION,
+            "shape": list(self.factors.shape),
+            "has_rating_means": self.rating_means is not None,
+            **self.metadata,
+        }
+        with open(os.path.join(folder, MANIFEST_FILE), "w") as f:
+            json.dump(manifest, f, indent=2)
+
+    @classmethod
+    def load(cls, folder: str, mmap: bool = True) -> RatingFactors:
+        """Loads the rating factors.
+
+        Args:
+            folder: Path to the folder containing the artifacts.
+            mmap: Whether to memory-map the arrays. Defaults to True.
+
+        Raises:
+            FileNotFoundError: If the manifest is not found.
+            ValueError: If the artifact version is not supported.
+
+        Returns:
+            Rating factors.
+        """
+        manifest = cls.read_manifest(folder)
+        if manifest["version"] != FACTORS_VERSION:
+            raise ValueError(
+                f"Unsupported rating factors version: {manifest['version']}"
+            )
+        mmap_mode = "r" if mmap else None
+
+        factors = np.load(
+            os.path.join(folder, FACTORS_FILE), mmap_mode=mmap_mode
+        )
+        rating_means = None
+        if manifest["has_rating_means"]:
+            rating_means = np.load(
+                os.path.join(folder, RATING_MEANS_FILE), mmap_mode=mmap_mode
+            )
+        with open(os.path.join(folder, TITLES_FILE), "r") as f:
+            titles = json.load(f)
+
+        metadata = {
+            key: value
+            for key, value in manifest.items()
+            if key not in ["version", "shape", "has_rating_means"]
+        }
+        return cls(factors, titles, rating_means, metadata)
+
+    @staticmethod
+    def read_manifest(folder: str) -> Dict[str, Any]:
+        """Reads the manifest of the rating factors.
+
+        Args:
+            folder: Path to the folder containing the artifacts.
+
+        Raises:
+            FileNotFoundError: If the manifest is not found.
+
+        Returns:
+            Manifest.
+        """
+        with open(os.path.join(folder, MANIFEST_FILE), "r") as f:
+            return json.load(f)
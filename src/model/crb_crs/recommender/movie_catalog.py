@@ -0,0 +1,148 @@
+"""Catalog of the movies mentioned in the conversations.
+
+The catalog maps the database id of each movie to its title, formatted title,
+genres, actors, and plot, so that the metadata integrated in a response is
+found with dictionary lookups instead of scans of the data frames.
+"""
+
+from __future__ import annotations
+
+import json
+import re
+from typing import Any, Dict
+
+import pandas as pd
+
+
+def _to_str(value: Any) -> str:
+    """Converts a metadata value to a string, missing values to ""."""
+    return "" if pd.isnull(value) else str(value)
+
+
+def strip_year(title: str) -> str:
+    """Removes the trailing year from a title, e.g., "Up (2009)" -> "Up".
+
+    Args:
+        title: Title.
+
+    Returns:
+        Title without year.
+    """
+    return re.sub(r"\(\d{4}\)$", "", title).strip()
+
+
+class MovieCatalog:
+    def __init__(
+        self,
+        titles: Dict[int, str],
+        formatted_titles: Dict[int, str],
+        genres: Dict[int, str],
+        actors: Dict[int, str],
+        plots: Dict[int, str],
+    ) -> None:
+        """Initializes the catalog.
+
+        Args:
+            titles: Title of each movie id.
+            formatted_titles: Lowercased title without year of each movie id.
+            genres: Genres of each movie id, separated by "|".
+            actors: Actors of each movie id.
+            plots: Plot of each movie id.
+        """
+        self.titles = titles
+        self.formatted_titles = formatted_titles
+        self.genres = genres
+        self.actors = actors
+        self.plots = plots
+
+    @classmethod
+    def from_data_frames(
+        cls, movie_mentions_df: pd.DataFrame, movie_metadata_df: pd.DataFrame
+    ) -> MovieCatalog:
+        """Builds the catalog from the movie data frames.
+
+        The plot of a movie is the overview of the first movie of the metadata
+        with the same title (without year). When a movie id or a metadata
+        title repeats, the first row is used.
+
+        Args:
+            movie_mentions_df: Movies indexed by database id.
+            movie_metadata_df: Movie metadata with title and overview.
+
+        Returns:
+            Catalog.
+        """
+        overviews: Dict[str, str] = {}
+        for title, overview in zip(
+            movie_metadata_df["title"].values,
+            movie_metadata_df["overview"].values,
+        ):
+            overviews.setdefault(title, _to_str(overview))
+
+        titles, formatted_titles, genres, actors, plots = {}, {}, {}, {}, {}
+        for movie_id, title, formatted_title, movie_genres, movie_actors in zip(
+            movie_mentions_df.index.values,
+            movie_mentions_df["title"].values,
+            movie_mentions_df["title_formatted"].values,
+            movie_mentions_df["genres"].values,
+            movie_mentions_df["actors"].values,
+        ):
+            movie_id = int(movie_id)
+            if movie_id in titles:
+                continue
+            titles[movie_id] = title
+            formatted_titles[movie_id] = formatted_title
+            genres[movie_id] = _to_str(movie_genres)
+            actors[movie_id] = _to_str(movie_actors)
+            plots[movie_id] = overviews.get(strip_year(title), "")
+
+        return cls(titles, formatted_titles, genres, actors, plots)
+
+    def __contains__(self, movie_id: int) -> bool:
+        """Returns whether the movie id is in the catalog."""
+        return movie_id in self.titles
+
+    def __len__(self) -> int:
+        """Returns the number of movies in the catalog."""
+        return len(self.titles)
+
+    def save(self, path: str) -> None:
+        """Saves the catalog as JSON.
+
+        Args:
+            path: Path to the JSON file.
+        """
+        ids = list(self.titles)
+        with open(path, "w") as f:
+            json.dump(
+                {
+                    "ids": ids,
+                    "titles": [self.titles[i] for i in ids],
+                    "formatted_titles": [self.formatted_titles[i] for i in ids],
+                    "genres": [self.genres[i] for i in ids],
+                    "actors": [self.actors[i] for i in ids],
+                    "plots": [self.plots[i] for i in ids],
+                },
+                f,
+            )
+
+    @classmethod
+    def load(cls, path: str) -> MovieCatalog:
+        """Loads a catalog saved as JSON.
+
+        Args:
+            path: Path to the JSON file.
+
+        Returns:
+            Catalog.
+        """
+        with open(path, "r") as f:
+            data = json.load(f)
+        ids = data["ids"]
+        return cls(
+            dict(zip(ids, data["titles"])),
+            dict(zip(ids, data["formatted_titles"])),
+            dict(zip(ids, data["genres"])),
+            dict(zip(ids, data["actors"])),
+            dict(zip(ids, data["plots"])),
+        )
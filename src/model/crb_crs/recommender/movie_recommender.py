@@ -11,23 +11,93 @@ TODO: Improve the code to reduce redundancy and improve efficiency.
 
 from __future__ import annotations
 
+import json
 import logging
 import os
 import pickle
 import random
 import re
-from typing import List, Tuple
+from typing import Any, Dict, List, Tuple
 
 import numpy as np
 import pandas as pd
-from sklearn.decomposition import TruncatedSVD
-from sklearn.metrics.pairwise import linear_kernel
 
-from src.model.crb_crs.recommender.recommender import Recommender
+from src.model.crb_crs.recommender.matrix_factorization import (
+    DEFAULT_CHUNK_SIZE,
+    MANIFEST_FILE,
+    RatingFactors,
+    compute_rating_means,
+    factors_from_correlation,
+)
+from src.model.crb_crs.recommender.movie_catalog import (
+    MovieCatalog,
+    strip_year,
+)
+from src.model.crb_crs.recommender.neighbour_tables import (
+    DEFAULT_NUM_NEIGHBOURS,
+    NeighbourTable,
+    rerank_candidates,
+)
+from src.model.crb_crs.recommender.recommender import (
+    ARTIFACTS_MANIFEST_FILE,
+    Recommender,
+)
+from src.model.crb_crs.recommender.title_matcher import TitleMatcher
 from src.model.crb_crs.retriever.retriever import CRS_PREFIX
 from src.model.crb_crs.utils_preprocessing import get_preference_keywords
 
 DEFAULT_MOVIELENS_DATA_FOLDER = "data/movielens"
+# Genres used in conversations mapped to the genres of the metadata
+GENRE_SYNONYMS = {
+    "scary": "Horror",
+    "romantic": "Romance",
+    "romances": "Romance",
+    "preference": "Adventure",
+    "suspense": "Thriller",
+    "funny": "Comedy",
+    "comedies": "Comedy",
+    "scifi": "Science Fiction",
+    "kids": "Comedy",
+    "mysteries": "mystery",
+}
+
+# Number of rating rows used by the dense factorization of older versions
+LEGACY_MAX_ROWS = 1500000
+
+# Layout of the folder of artifacts (see `MovieRecommender.save_artifacts`)
+ARTIFACTS_VERSION = 1
+ITEMS_FILE = "items.json"
+CATALOG_FILE = "catalog.json"
+GENRE_RANKINGS_FILE = "genre_rankings.npy"
+GENRE_RANKINGS_INDEX_FILE = "genre_rankings.json"
+CONTENT_MATRIX_FILE = "content_matrix.npy"
+RATING_FACTORS_FOLDER = "rating_factors"
+MOVIE_MENTIONS_FILE = "movie_mentions.json"
+MOVIE_METADATA_FILE = "movie_metadata.json"
+# Attributes not needed to respond, loaded on first access, and the artifact
+# part holding them
+LAZY_ARTIFACT_PARTS = {
+    "content_matrix": "content_matrix",
+    "rating_factors": "rating_factors",
+    "movielens_index": "rating_factors",
+    "movielens_rating_means": "rating_factors",
+    "rating_factors_metadata": "rating_factors",
+    "movie_mentions_df": "movie_mentions",
+    "movie_metadata_df": "movie_metadata",
+}
+TITLE_COLUMNS = ["title", "title_formatted"]
+
+
+def normalize_genre(genre: str) -> str:
+    """Converts a genre to the format used in the metadata.
+
+    Args:
+        genre: Genre mentioned in the conversation.
+
+    Returns:
+        Genre of the metadata.
+    """
+    return GENRE_SYNONYMS.get(genre.lower(), genre).title()
 
 
 class MovieRecommender(Recommender):
@@ -48,33 +118,312 @@ class MovieRecommender(Recommender):
         self.movie_metadata_df = pd.read_csv(
             os.path.join(self.movielens_data_folder, "movies_metadata.csv")
         )
+        self.build_genre_rankings()
 
         os.makedirs(matrix_factorization_folder, exist_ok=True)
         self.matrix_factorization_folder = matrix_factorization_folder
 
-        model_path = os.path.join(
+        legacy_model_path = os.path.join(
             self.matrix_factorization_folder, "matrix_factorization.npy"
         )
-        index_path = os.path.join(
+        legacy_index_path = os.path.join(
             self.matrix_factorization_folder, "movielens_index.pkl"
         )
-        if os.path.exists(model_path) and os.path.exists(index_path):
-            self.matrix_factorization = np.load(model_path)
-            self.movielens_index = pickle.load(open(index_path, "rb"))
+        if os.path.exists(
+            os.path.join(self.matrix_factorization_folder, MANIFEST_FILE)
+        ):
+            self._set_rating_factors(
+                RatingFactors.load(self.matrix_factorization_folder)
+            )
+        elif os.path.exists(legacy_model_path) and os.path.exists(
+            legacy_index_path
+        ):
+            rating_factors = RatingFactors(
+                factors_from_correlation(np.load(legacy_model_path)),
+                list(pickle.load(open(legacy_index_path, "rb"))),
+                metadata={"max_rows": LEGACY_MAX_ROWS},
+            )
+            rating_factors.save(self.matrix_factorization_folder)
+            self._set_rating_factors(rating_factors)
         else:
             self.initialize_truncated_svd(save=True)
 
-        self._create_cosine_similarity_matrix()
+        self._create_content_matrix()
+        self.build_neighbour_tables()
+
+    def _create_content_matrix(self) -> None:
+        """Creates the content matrix of the movies (float32).
+
+        Content similarities are the dot products of its rows, computed on
+        demand.
+        """
+        content_matrix, self.movie_mentions_df = self._get_content_matrix()
+        self.content_matrix = np.ascontiguousarray(
+            content_matrix, dtype=np.float32
+        )
+        self._build_title_matchers()
+        self._build_catalog()
+
+    def _build_catalog(self) -> None:
+        """Builds the catalog of the movies mentioned in the conversations."""
+        self.catalog = MovieCatalog.from_data_frames(
+            self.movie_mentions_df, self.movie_metadata_df
+        )
+
+    def _build_title_matchers(self) -> None:
+        """Builds the automata detecting raw and formatted title mentions."""
+        self.item_ids = self.movie_mentions_df.index.values
+        self.title_matchers = {
+            col: TitleMatcher(self.movie_mentions_df[col].values)
+            for col in TITLE_COLUMNS
+        }
+
+    def __getstate__(self) -> Dict[str, Any]:
+        """Returns the state to pickle, without the title automata.
+
+        The parts of a recommender loaded from artifacts that are not loaded
+        yet are loaded first.
+        """
+        if "_artifacts_folder" in self.__dict__:
+            for name in LAZY_ARTIFACT_PARTS:
+                getattr(self, name)
+        state = self.__dict__.copy()
+        state.pop("title_matchers", None)
+        state.pop("_artifacts_folder", None)
+        state.pop("_migrated", None)
+        return state
+
+    def __getattr__(self, name: str) -> Any:
+        """Loads the artifact part holding an attribute not loaded yet.
+
+        Args:
+            name: Attribute name.
+
+        Raises:
+            AttributeError: If the attribute is not a lazily loaded one.
+
+        Returns:
+            Attribute value.
+        """
+        if (
+            "_artifacts_folder" not in self.__dict__
+            or name not in LAZY_ARTIFACT_PARTS
+        ):
+            raise AttributeError(
+                f"'{type(self).__name__}' object has no attribute '{name}'"
+            )
+        self._load_artifact_part(LAZY_ARTIFACT_PARTS[name])
+        return self.__dict__[name]
+
+    def _load_artifact_part(self, part: str) -> None:
+        """Loads a part of the artifacts not needed to respond.
+
+        Args:
+            part: Name of the part (see LAZY_ARTIFACT_PARTS).
+        """
+        folder = self._artifacts_folder
+        if part == "content_matrix":
+            self.content_matrix = np.load(
+                os.path.join(folder, CONTENT_MATRIX_FILE), mmap_mode="r"
+            )
+        elif part == "rating_factors":
+            self._set_rating_factors(
+                RatingFactors.load(os.path.join(folder, RATING_FACTORS_FOLDER))
+            )
+        elif part == "movie_mentions":
+            self.movie_mentions_df = pd.read_json(
+                os.path.join(folder, MOVIE_MENTIONS_FILE), orient="table"
+            )
+        elif part == "movie_metadata":
+            self.movie_metadata_df = pd.read_json(
+                os.path.join(folder, MOVIE_METADATA_FILE), orient="table"
+            )
+        logging.info(f"Loaded {part} of the recommender from {folder}.")
+
+    def save_artifacts(self, folder: str) -> None:
+        """Saves the recommender as a folder of artifacts.
+
+        Arrays are saved as `.npy` files, memory-mapped when loaded, and
+        string tables and data frames as JSON. The manifest holds the version
+        of the layout and the settings of the recommender.
+
+        Args:
+            folder: Path to the folder to save the artifacts.
+        """
+        os.makedirs(folder, exist_ok=True)
+
+        # Parts needed to respond
+        items = {"ids": [int(item_id) for item_id in self.item_ids]}
+        for col in TITLE_COLUMNS:
+            items[col] = list(self.movie_mentions_df[col].values)
+        with open(os.path.join(folder, ITEMS_FILE), "w") as f:
+            json.dump(items, f)
+        self.catalog.save(os.path.join(folder, CATALOG_FILE))
+        self.rating_neighbours.save(folder, "rating_neighbours")
+        self.content_neighbours.save(folder, "content_neighbours")
+
+        genres = list(self.genre_rankings)
+        rankings = [self.genre_rankings[genre] for genre in genres]
+        np.save(
+            os.path.join(folder, GENRE_RANKINGS_FILE),
+            np.concatenate(rankings or [np.zeros(0)]).astype(np.int32),
+        )
+        with open(os.path.join(folder, GENRE_RANKINGS_INDEX_FILE), "w") as f:
+            json.dump(
+                {
+                    "genres": genres,
+                    "offsets": np.cumsum(
+                        [0] + [len(ranking) for ranking in rankings]
+                    ).tolist(),
+                    "titles": list(self.genre_titles),
+                },
+                f,
+            )
+
+        # Parts loaded lazily
+        np.save(
+            os.path.join(folder, CONTENT_MATRIX_FILE),
+            np.asarray(self.content_matrix),
+        )
+        RatingFactors(
+            np.asarray(self.rating_factors),
+            list(self.movielens_index),
+            self.movielens_rating_means,
+            self.rating_factors_metadata,
+        ).save(os.path.join(folder, RATING_FACTORS_FOLDER))
+        self.movie_mentions_df.to_json(
+            os.path.join(folder, MOVIE_MENTIONS_FILE), orient="table"
+        )
+        self.movie_metadata_df.to_json(
+            os.path.join(folder, MOVIE_METADATA_FILE), orient="table"
+        )
+
+        manifest = {
+            "version": ARTIFACTS_VERSION,
+            "recommender": type(self).__name__,
+            "movielens_data_folder": self.movielens_data_folder,
+            "matrix_factorization_folder": self.matrix_factorization_folder,
+            "num_items": len(self.item_ids),
+            "num_neighbours": int(self.rating_neighbours.neighbours.shape[1]),
+        }
+        with open(os.path.join(folder, ARTIFACTS_MANIFEST_FILE), "w") as f:
+            json.dump(manifest, f, indent=2)
+
+    @classmethod
+    def load_artifacts(cls, folder: str, lazy: bool = True) -> MovieRecommender:
+        """Loads the recommender from a folder of artifacts.
+
+        Only the parts needed to respond are loaded, the others are loaded on
+        first access (see LAZY_ARTIFACT_PARTS) unless lazy is False.
+
+        Args:
+            folder: Path to the folder containing the artifacts.
+            lazy: Whether to defer loading the parts not needed to respond.
+              Defaults to True.
+
+        Raises:
+            ValueError: If the artifacts version is not supported.
+
+        Returns:
+            Loaded recommender.
+        """
+        with open(os.path.join(folder, ARTIFACTS_MANIFEST_FILE), "r") as f:
+            manifest = json.load(f)
+        if manifest["version"] != ARTIFACTS_VERSION:
+            raise ValueError(
+                f"Unsupported recommender artifacts version: "
+                f"{manifest['version']}"
+            )
+
+        recommender = cls.__new__(cls)
+        recommender._artifacts_folder = folder
+        recommender.movielens_data_folder = manifest["movielens_data_folder"]
+        recommender.matrix_factorization_folder = manifest[
+            "matrix_factorization_folder"
+        ]
+
+        with open(os.path.join(folder, ITEMS_FILE), "r") as f:
+            items = json.load(f)
+        recommender.item_ids = np.array(items["ids"], dtype=np.int64)
+        recommender.title_matchers = {
+            col: TitleMatcher(items[col]) for col in TITLE_COLUMNS
+        }
+        recommender.catalog = MovieCatalog.load(
+            os.path.join(folder, CATALOG_FILE)
+        )
+        recommender.rating_neighbours = NeighbourTable.load(
+            folder, "rating_neighbours"
+        )
+        recommender.content_neighbours = NeighbourTable.load(
+            folder, "content_neighbours"
+        )
 
-    def _create_cosine_similarity_matrix(self) -> None:
-        """Creates the cosine similarity matrix."""
-        self.content_matrix, self.movie_mentions_df = (
-            self._get_content_matrix()
+        with open(os.path.join(folder, GENRE_RANKINGS_INDEX_FILE), "r") as f:
+            genre_index = json.load(f)
+        rankings = np.load(
+            os.path.join(folder, GENRE_RANKINGS_FILE), mmap_mode="r"
         )
-        self.cosine_similarity_matrix = linear_kernel(
-            self.content_matrix, self.content_matrix
+        offsets = genre_index["offsets"]
+        recommender.genre_rankings = {
+            genre: rankings[offsets[i] : offsets[i + 1]]
+            for i, genre in enumerate(genre_index["genres"])
+        }
+        recommender.genre_titles = np.array(
+            genre_index["titles"], dtype=object
+        )
+
+        if not lazy:
+            for name in LAZY_ARTIFACT_PARTS:
+                getattr(recommender, name)
+        return recommender
+
+    def __setstate__(self, state: Dict[str, Any]) -> None:
+        """Restores the pickled state and rebuilds the title automata.
+
+        The neighbour tables, genre rankings, and catalog are built if the
+        pickled recommender predates them. Such a migrated recommender is
+        flagged, so that `Recommender.load` can save it as artifacts.
+        """
+        self.__dict__.update(state)
+        self._build_title_matchers()
+        migrated = not all(
+            key in state
+            for key in [
+                "rating_factors",
+                "rating_factors_metadata",
+                "rating_neighbours",
+                "genre_rankings",
+                "catalog",
+            ]
         )
 
+        # Replace the dense similarity matrices and the rating data frames of
+        # older recommenders
+        if "rating_factors" not in state:
+            self.rating_factors = factors_from_correlation(
+                self.__dict__.pop("matrix_factorization")
+            )
+            self.movielens_index = list(self.movielens_index)
+            self.__dict__.pop("cosine_similarity_matrix", None)
+            self.content_matrix = np.ascontiguousarray(
+                self.content_matrix, dtype=np.float32
+            )
+        if "rating_factors_metadata" not in state:
+            self.movielens_rating_means = None
+            self.rating_factors_metadata = {"max_rows": LEGACY_MAX_ROWS}
+            self.__dict__.pop("user_ratings_df", None)
+            self.__dict__.pop("movie_df", None)
+
+        if "rating_neighbours" not in state:
+            logging.info("Building neighbour tables of the recommender.")
+            self.build_neighbour_tables()
+        if "genre_rankings" not in state:
+            self.build_genre_rankings()
+        if "catalog" not in state:
+            self._build_catalog()
+        if migrated:
+            self._migrated = True
+
     def _get_content_matrix(self) -> Tuple[np.ndarray, pd.DataFrame]:
         """Gets the content matrix for movies.
 
@@ -112,7 +461,7 @@ class MovieRecommender(Recommender):
         movies_with_genres = movies_with_genres.set_index("databaseId")
         movies_with_genres["title_formatted"] = movies_with_genres[
             "title"
-        ].apply(lambda x: re.sub(r"\(\d{4}\)$", "", x).lower().strip())
+        ].apply(lambda x: strip_year(x).lower())
         movies_content = movies_with_genres.drop(
             columns=[
                 "movieId",
@@ -133,58 +482,221 @@ class MovieRecommender(Recommender):
         movies_content_matrix = np.delete(movies_content_matrix, 0, 1)
         return movies_content_matrix, movies_with_genres
 
-    def initialize_truncated_svd(self, save: bool = False) -> None:
-        """Initializes the TruncatedSVD model.
+    def _get_movielens_movies(self) -> pd.DataFrame:
+        """Gets the MovieLens movies with their year and mean rating.
 
-        This model is used for matrix factorization.
+        Returns:
+            DataFrame of MovieLens movies.
         """
-        self.user_ratings_df = pd.read_csv(
-            "data/movielens/ratings_latest.csv",
-            usecols=["userId", "movieId", "rating"],
-        )[:1500000]
-        self.movie_df = pd.read_csv(
-            os.path.join(self.movielens_data_folder, "movies.csv")
+        movies_file = os.path.join(self.movielens_data_folder, "movies.csv")
+        if self.movielens_rating_means is None:
+            self.movielens_rating_means = compute_rating_means(
+                os.path.join(self.movielens_data_folder, "ratings_latest.csv"),
+                movies_file,
+                list(self.movielens_index),
+                max_rows=self.rating_factors_metadata.get("max_rows"),
+            )
+
+        movie_df = pd.read_csv(movies_file)
+        movie_df["year"] = movie_df["title"].str.extract(r"\((\d{4})\)")
+        rating_means = pd.Series(
+            np.asarray(self.movielens_rating_means),
+            index=list(self.movielens_index),
+            name="ratingMean",
         )
-        self.movie_df["year"] = self.movie_df["title"].str.extract(
-            r"\((\d{4})\)"
+        rating_means = rating_means[~rating_means.index.duplicated()]
+        return movie_df.merge(
+            rating_means, how="left", left_on="title", right_index=True
         )
 
-        movie_ratings_df = pd.merge(
-            self.user_ratings_df, self.movie_df, on="movieId"
-        ).dropna(axis=0, subset=["title"])
-        user_ratings = (
-            movie_ratings_df.groupby(by="title")["rating"]
-            .mean()
-            .reset_index()
-            .rename(columns={"rating": "ratingMean"})[["title", "ratingMean"]]
-            .merge(movie_ratings_df, on="title", how="right")
-            .drop_duplicates(["userId", "title"])
-            .pivot(index="userId", columns="title", values="rating")
-            .fillna(0)
-        )
+    def _set_rating_factors(self, rating_factors: RatingFactors) -> None:
+        """Sets the rating factors of the MovieLens titles.
 
-        x = user_ratings.values.T
+        Args:
+            rating_factors: Rating factors.
+        """
+        self.rating_factors = rating_factors.factors
+        self.movielens_index = rating_factors.titles
+        self.movielens_rating_means = rating_factors.rating_means
+        self.rating_factors_metadata = rating_factors.metadata
 
-        svd = TruncatedSVD(n_components=20, random_state=42)
-        matrix = svd.fit_transform(x)
-        self.matrix_factorization = np.corrcoef(matrix)
-        self.movielens_index = user_ratings.columns
+    def initialize_truncated_svd(
+        self,
+        save: bool = False,
+        max_rows: int = None,
+        chunk_size: int = DEFAULT_CHUNK_SIZE,
+    ) -> None:
+        """Initializes the factors with TruncatedSVD.
+
+        The ratings are streamed into a sparse matrix that is factorized with
+        randomized SVD (see `RatingFactors.build`).
+
+        Args:
+            save: Whether to save the factors in the matrix factorization
+              folder. Defaults to False.
+            max_rows: Number of rating rows to use. Defaults to all.
+            chunk_size: Number of rating rows read at once. Defaults to
+              DEFAULT_CHUNK_SIZE.
+        """
+        rating_factors = RatingFactors.build(
+            os.path.join(self.movielens_data_folder, "ratings_latest.csv"),
+            os.path.join(self.movielens_data_folder, "movies.csv"),
+            chunk_size=chunk_size,
+            max_rows=max_rows,
+        )
+        self._set_rating_factors(rating_factors)
 
         if save:
-            np.save(
-                os.path.join(
-                    self.matrix_factorization_folder,
-                    "matrix_factorization.npy",
-                ),
-                self.matrix_factorization,
+            rating_factors.save(self.matrix_factorization_folder)
+
+    def rating_similarities(self, row: int) -> np.ndarray:
+        """Computes the rating similarities of a movie with all the movies.
+
+        The similarity is the correlation between the factors of the movies.
+
+        Args:
+            row: Position of the movie in the MovieLens index.
+
+        Returns:
+            Similarities, indexed by position in the MovieLens index.
+        """
+        return self.rating_factors @ self.rating_factors[row]
+
+    def content_similarities(self, row: int) -> np.ndarray:
+        """Computes the content similarities of a movie with all the movies.
+
+        Args:
+            row: Position of the movie in the catalog.
+
+        Returns:
+            Similarities, indexed by position in the catalog.
+        """
+        return self.content_matrix @ self.content_matrix[row]
+
+    def build_neighbour_tables(
+        self, num_neighbours: int = DEFAULT_NUM_NEIGHBOURS
+    ) -> None:
+        """Builds the top-K neighbour tables of the catalog items.
+
+        The tables hold, for each item of the catalog, the neighbours based on
+        ratings and on content, with the re-ranking of
+        `get_similar_items_ratings` and `get_similar_items_content` applied.
+
+        Args:
+            num_neighbours: Number of neighbours per item. Defaults to
+              DEFAULT_NUM_NEIGHBOURS.
+        """
+        self.rating_neighbours = self._build_rating_neighbour_table(
+            num_neighbours
+        )
+        self.content_neighbours = self._build_content_neighbour_table(
+            num_neighbours
+        )
+
+    def _build_rating_neighbour_table(
+        self, num_neighbours: int
+    ) -> NeighbourTable:
+        """Builds the neighbour table based on ratings.
+
+        Neighbours are ranked by decreasing number of genres in common with
+        the item, year, mean rating, and similarity. The most similar movie
+        (i.e., the item itself) is left out.
+
+        Args:
+            num_neighbours: Number of neighbours per item.
+
+        Returns:
+            Neighbour table keyed by item id.
+        """
+        movie_df = self._get_movielens_movies()
+        titles = list(self.movielens_index)
+        movies = (
+            movie_df.drop_duplicates("title")
+            .set_index("title")
+            .reindex(titles)
+        )
+        years = pd.to_numeric(movies["year"], errors="coerce").values
+        rating_means = movies["ratingMean"].values.astype(np.float64)
+
+        genre_lists = movies["genres"].fillna("").str.split("|")
+        genre_ids = {}
+        for genres in genre_lists:
+            for genre in genres:
+                genre_ids.setdefault(genre, len(genre_ids))
+        genre_matrix = np.zeros((len(titles), len(genre_ids)), dtype=np.int32)
+        for i, genres in enumerate(genre_lists):
+            genre_matrix[i, [genre_ids[genre] for genre in genres]] = 1
+
+        title_rows = {}
+        for row, title in enumerate(titles):
+            title_rows.setdefault(title, row)
+
+        keys, rows, row_scores = [], [], []
+        for item_id, title, genres in zip(
+            self.movie_mentions_df.index.values,
+            self.movie_mentions_df["title"].values,
+            self.movie_mentions_df["genres"].values,
+        ):
+            if title not in title_rows:
+                continue
+            similarities = self.rating_similarities(title_rows[title])
+            candidates = np.argsort(-similarities, kind="stable")[1:]
+            query_genres = [
+                genre_ids[genre]
+                for genre in set(str(genres).split("|"))
+                if genre in genre_ids
+            ]
+            match_counts = genre_matrix[:, query_genres].sum(axis=1)
+            neighbours = rerank_candidates(
+                candidates,
+                [match_counts, years, rating_means],
+                num_neighbours,
             )
-            with open(
-                os.path.join(
-                    self.matrix_factorization_folder, "movielens_index.pkl"
-                ),
-                "wb",
-            ) as f:
-                pickle.dump(self.movielens_index, f)
+            keys.append(item_id)
+            rows.append(neighbours)
+            row_scores.append(similarities[neighbours])
+
+        return NeighbourTable.from_rows(
+            keys, titles, rows, row_scores, num_neighbours
+        )
+
+    def _build_content_neighbour_table(
+        self, num_neighbours: int
+    ) -> NeighbourTable:
+        """Builds the neighbour table based on content.
+
+        Neighbours are ranked by decreasing year, mean rating, and content
+        similarity. Movies with the same title as the item are left out.
+
+        Args:
+            num_neighbours: Number of neighbours per item.
+
+        Returns:
+            Neighbour table keyed by item id.
+        """
+        titles = self.movie_mentions_df["title"].values
+        years = pd.to_numeric(
+            self.movie_mentions_df["year"], errors="coerce"
+        ).values
+        rating_means = self.movie_mentions_df["rating_mean"].values.astype(
+            np.float64
+        )
+
+        keys, rows, row_scores = [], [], []
+        for row, item_id in enumerate(self.movie_mentions_df.index.values):
+            similarities = self.content_similarities(row)
+            candidates = np.argsort(-similarities, kind="stable")
+            candidates = candidates[titles[candidates] != titles[row]]
+            neighbours = rerank_candidates(
+                candidates, [years, rating_means], num_neighbours
+            )
+            keys.append(item_id)
+            rows.append(neighbours)
+            row_scores.append(similarities[neighbours])
+
+        return NeighbourTable.from_rows(
+            keys, list(titles), rows, row_scores, num_neighbours
+        )
 
     def get_similar_items_ratings(
         self,
@@ -210,50 +722,14 @@ class MovieRecommender(Recommender):
             if len(title) < 2:
                 return []
 
-            genres = (
-                self.movie_mentions_df.loc[[int(input_item_id)]]["genres"]
-                .iloc[0]
-                .split("|")
-            )
-            idx = self.movielens_index.values.tolist().index(title)
-            similarity_scores = list(enumerate(self.matrix_factorization[idx]))
-            similarity_scores = sorted(
-                similarity_scores, key=lambda x: x[1], reverse=True
-            )[1:]
-            similar_movies = pd.DataFrame(
-                [self.movielens_index[i[0]] for i in similarity_scores],
-                columns=["title"],
+            similar_movies_titles = self.rating_neighbours.get_neighbours(
+                int(input_item_id), num_recommendation, recommended_items
             )
-            similar_movies = similar_movies.merge(
-                self.movie_df[["title", "genres", "year", "ratingMean"]],
-                how="left",
-                on="title",
-            )
-            similar_movies["matchCount"] = similar_movies["genres"].apply(
-                lambda x: len(set(x.split("|")).intersection(genres))
-            )
-            similar_movies = similar_movies.sort_values(
-                by="ratingMean", ascending=False
-            ).reset_index()
-            similar_movies = similar_movies.sort_values(
-                by="year", ascending=False
-            ).reset_index()
-            similar_movies = similar_movies.sort_values(
-                by="matchCount", ascending=False
-            )
-
-            similar_movies_titles = similar_movies["title"].values.tolist()
-            similar_movies_titles = [
-                movie
-                for movie in similar_movies_titles
-                if movie not in recommended_items
-            ]
-        except ValueError:
+        except (KeyError, ValueError):
             logging.error(
                 f"Movie title not found for movie ID {input_item_id}."
             )
-            pass
-        return similar_movies_titles[:num_recommendation]
+        return similar_movies_titles
 
     def get_similar_items_content(
         self,
@@ -273,48 +749,21 @@ class MovieRecommender(Recommender):
         """
         similar_movies_titles = []
         try:
-            content_df = self.movie_mentions_df.loc[
-                :, ~self.movie_mentions_df.columns.str.contains("^Unnamed")
-            ]
-            idx = pd.Series(content_df.index, self.movie_mentions_df["title"])
             title = self.get_movie_title(input_item_id)
 
             if len(title) < 2:
                 return []
 
-            movie_index = idx[title]
-            similarity_scores = self.cosine_similarity_matrix[
-                movie_index
-            ].tolist()
-            scores = pd.DataFrame(
-                similarity_scores, columns=["scores"]
-            ).sort_values(by="scores", ascending=False)
-            similar_movies_indices = scores.index.values.tolist()
-            similar_movies = pd.DataFrame(
-                content_df[["title", "genres", "year", "rating_mean"]].iloc[
-                    similar_movies_indices
-                ]
+            similar_movies_titles = self.content_neighbours.get_neighbours(
+                int(input_item_id), num_recommendation, recommended_items
             )
-            similar_movies = similar_movies[similar_movies["title"] != title]
-            similar_movies = similar_movies.sort_values(
-                by="rating_mean", ascending=False
-            ).reset_index()
-            similar_movies = similar_movies.sort_values(
-                by="year", ascending=False
-            ).reset_index()
-            similar_movies_titles = similar_movies["title"].values.tolist()
-            similar_movies_titles = [
-                movie
-                for movie in similar_movies_titles
-                if movie not in recommended_items
-            ]
         except Exception as e:
             logging.error(
                 "An error occurred when getting similar items based on "
                 f"content:\n{e}"
             )
 
-        return similar_movies_titles[:num_recommendation]
+        return similar_movies_titles
 
     def get_similar_items_genre(
         self, genre: str, num_recommendation: int, recommended_items: List[str]
@@ -330,91 +779,57 @@ class MovieRecommender(Recommender):
             List of similar items.
         """
         similar_movies_titles = []
-        # Convert genre to the format used in the dataset
-        if genre.lower() == "scary":
-            genre = "Horror"
-        elif genre.lower() == "romantic" or genre.lower() == "romances":
-            genre = "Romance"
-        elif genre.lower() == "preference":
-            genre = "Adventure"
-        elif genre.lower() == "suspense":
-            genre = "Thriller"
-        elif genre.lower() == "funny":
-            genre = "Comedy"
-        elif genre.lower() == "comedies":
-            genre = "Comedy"
-        elif genre.lower() == "scifi":
-            genre = "Science Fiction"
-        elif genre.lower() == "kids":
-            genre = "Comedy"
-        elif genre.lower() == "mysteries":
-            genre = "mystery"
-        genre = genre.title()
-
         try:
-            # Get movies with the specified genre
-            movies_with_genre = self.movie_metadata_df[
-                self.movie_metadata_df["genre"] == genre
-            ]
-
-            vote_counts = movies_with_genre[
-                movies_with_genre["vote_count"].notnull()
-            ]["vote_count"].astype(int)
-            vote_averages = movies_with_genre[
-                movies_with_genre["vote_average"].notnull()
-            ]["vote_average"].astype(int)
-            C = vote_averages.mean()
-            m = vote_counts.quantile(0.85)
-
-            similar_movies = movies_with_genre[
-                (movies_with_genre["vote_count"] >= m)
-                & (movies_with_genre["vote_count"].notnull())
-                & (movies_with_genre["vote_average"].notnull())
-            ][
-                [
-                    "title",
-                    "year",
-                    "vote_count",
-                    "vote_average",
-                    "popularity",
-                    "genre",
-                ]
-            ]
-            similar_movies["vote_count"] = similar_movies["vote_count"].astype(
-                int
-            )
-            similar_movies["vote_average"] = similar_movies[
-                "vote_average"
-            ].astype(int)
-            similar_movies["weighted_rating"] = similar_movies.apply(
-                lambda x: (
-                    (
-                        x["vote_count"]
-                        / (x["vote_count"] + m)
-                        * x["vote_average"]
-                    )
-                    + (m / (m + x["vote_count"]) * C)
-                ),
-                axis=1,
-            )
-            similar_movies = similar_movies.sort_values(
-                by="weighted_rating", ascending=False
-            ).reset_index()
-            similar_movies = similar_movies.sort_values(
-                by="year", ascending=False
-            )
-            similar_movies_titles = similar_movies["title"].values.tolist()
-            similar_movies_titles = [
-                movie
-                for movie in similar_movies_titles
-                if movie not in recommended_items
-            ]
+            ranking = self.genre_rankings.get(normalize_genre(genre), [])
+            recommended_items = set(recommended_items)
+            for idx in ranking:
+                if len(similar_movies_titles) >= num_recommendation:
+                    break
+                title = self.genre_titles[idx]
+                if title not in recommended_items:
+                    similar_movies_titles.append(title)
         except (RuntimeError, TypeError, NameError) as e:
             logging.error(
                 "An error occurred when getting similar items based on genre:\n"
                 f"{e}"
             )
-        return similar_movies_titles[:num_recommendation]
+        return similar_movies_titles
+
+    def build_genre_rankings(self) -> None:
+        """Ranks the movies of each genre of the metadata.
+
+        Movies with at least as many votes as the 85th percentile of their
+        genre are ranked by decreasing year and weighted rating (IMDB
+        formula, with the vote counts and averages truncated to integers).
+        """
+        self.genre_titles = self.movie_metadata_df["title"].values
+        years = pd.to_numeric(
+            self.movie_metadata_df["year"], errors="coerce"
+        ).values
+
+        self.genre_rankings = {}
+        genre_rows = self.movie_metadata_df.groupby("genre", sort=False).indices
+        for genre, rows in genre_rows.items():
+            movies_with_genre = self.movie_metadata_df.iloc[rows]
+            vote_counts = movies_with_genre["vote_count"]
+            vote_averages = movies_with_genre["vote_average"]
+            C = vote_averages[vote_averages.notnull()].astype(int).mean()
+            m = vote_counts[vote_counts.notnull()].astype(int).quantile(0.85)
+
+            selected = (
+                (vote_counts >= m)
+                & vote_counts.notnull()
+                & vote_averages.notnull()
+            ).values
+            rows = rows[selected]
+            v = vote_counts.values[selected].astype(int)
+            R = vote_averages.values[selected].astype(int)
+            weighted_ratings = np.full(len(years), np.nan)
+            weighted_ratings[rows] = (v / (v + m) * R) + (m / (m + v) * C)
+
+            self.genre_rankings[genre] = rerank_candidates(
+                rows, [years, weighted_ratings], len(rows)
+            ).astype(np.int32)
 
     def detect_previous_item_mentions(
         self, context: List[str], is_user: bool
@@ -434,11 +849,11 @@ class MovieRecommender(Recommender):
             col = "title_formatted"
         else:
             col = "title"
+        title_matcher = self.title_matchers[col]
         for utterance in context:
-            for i, movie in enumerate(self.movie_mentions_df[col].values):
-                if f" {movie}" in utterance:
-                    movie_id = self.movie_mentions_df.index.values[i]
-                    mentioned_items.append(movie_id)
+            mentioned_items.extend(
+                self.item_ids[i] for i in title_matcher.find(utterance)
+            )
         return mentioned_items
 
     def get_recommendations(self, context: List[str]) -> List[str]:
@@ -542,10 +957,11 @@ class MovieRecommender(Recommender):
             Movie title.
         """
         try:
-            clean_movie_id = re.sub(r"\D", "", movie_id)
-            title = self.movie_mentions_df.loc[[int(clean_movie_id)]][
-                "title"
-            ].iloc[0]
+            try:
+                clean_movie_id = int(movie_id)
+            except (TypeError, ValueError):
+                clean_movie_id = int(re.sub(r"\D", "", str(movie_id)))
+            title = self.catalog.titles[clean_movie_id]
         except KeyError:
             title = ""
             logging.error(f"Movie title not found for movie ID {movie_id}.")
@@ -619,14 +1035,12 @@ class MovieRecommender(Recommender):
         last_user_utterance = context[-1].lower()
 
         if last_movie_mentioned is not None:
-            movie_metadata = self.movie_mentions_df.loc[
-                [int(last_movie_mentioned)]
-            ]
+            movie_id = int(last_movie_mentioned)
             if last_user_utterance.__contains__(
                 "who is"
             ) or last_user_utterance.lower().__contains__("who's"):
                 # Integrate actor information
-                actors = movie_metadata["actors"].iloc[0]
+                actors = self.catalog.actors.get(movie_id, "")
                 if len(actors) > 0:
                     return f"{CRS_PREFIX} It stars {actors}."
             if (
@@ -635,12 +1049,7 @@ class MovieRecommender(Recommender):
                 or last_user_utterance.__contains__("that about")
             ):
                 # Integrate plot information
-                movie_title = re.sub(
-                    r"\(\d{4}\)$", "", movie_metadata["title"].iloc[0]
-                ).strip()
-                plot = self.movie_metadata_df[
-                    self.movie_metadata_df["title"] == movie_title
-                ]["overview"].iloc[0]
+                plot = self.catalog.plots.get(movie_id, "")
                 if len(plot) > 0:
                     return f"{CRS_PREFIX} {plot}"
 
@@ -699,10 +1108,9 @@ class MovieRecommender(Recommender):
         ):
             return response
 
-        movie_metadata = self.movie_mentions_df[[int(movie_id)]]
-        genres = movie_metadata["genres"]
+        genres = self.catalog.genres.get(int(movie_id), "")
         if len(genres) > 0:
-            genres = genres.iloc[0].split("|")
+            genres = genres.split("|")
             for i, preference_token in enumerate(movie_preference_tokens):
                 if i > len(genres):
                     response = response.replace(preference_token, "")
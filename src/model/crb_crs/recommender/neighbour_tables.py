@@ -0,0 +1,176 @@
+"""Precomputed top-K neighbour tables for item-based recommendations.
+
+For each query item, the table holds the indices (int32) of its K best
+neighbours, with the re-ranking applied, and their similarity scores
+(float32). Getting recommendations then amounts to slicing a row of the table
+and filtering out the items already recommended. Tables are saved as `.npy`
+arrays, memory-mapped when loaded, and a JSON file with the keys and titles.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+from typing import Any, Dict, Iterable, List, Sequence
+
+import numpy as np
+
+DEFAULT_NUM_NEIGHBOURS = 100
+
+
+def rerank_candidates(
+    candidates: np.ndarray, sort_keys: Sequence[np.ndarray], k: int
+) -> np.ndarray:
+    """Re-ranks candidates by decreasing values of sort keys.
+
+    The first key is the primary one. Missing values (NaN) are ranked last.
+    Ties are kept in the order of the candidates.
+
+    Args:
+        candidates: Indices of the candidates, in order of decreasing
+          similarity.
+        sort_keys: Arrays of values to sort by, indexed by candidate index.
+        k: Number of candidates to keep.
+
+    Returns:
+        Indices of the top-k re-ranked candidates.
+    """
+    # np.lexsort uses the last key as primary key
+    keys = [np.arange(len(candidates))]
+    for sort_key in reversed(sort_keys):
+        values = np.asarray(sort_key, dtype=np.float64)[candidates]
+        keys.append(np.where(np.isnan(values), np.inf, -values))
+    order = np.lexsort(keys)
+    return candidates[order[:k]]
+
+
+class NeighbourTable:
+    def __init__(
+        self,
+        keys: Iterable[Any],
+        titles: List[str],
+        neighbours: np.ndarray,
+        scores: np.ndarray,
+    ) -> None:
+        """Initializes the table.
+
+        Args:
+            keys: Query keys (e.g., item ids), one per row of the table.
+            titles: Titles of the candidate items, indexed by neighbour index.
+            neighbours: Neighbour indices per query, padded with -1.
+            scores: Similarity scores of the neighbours.
+        """
+        self.keys = list(keys)
+        self.key_to_row: Dict[Any, int] = {}
+        for row, key in enumerate(self.keys):
+            self.key_to_row.setdefault(key, row)
+        self.titles = titles
+        self.neighbours = neighbours.astype(np.int32, copy=False)
+        self.scores = scores.astype(np.float32, copy=False)
+
+    @classmethod
+    def from_rows(
+        cls,
+        keys: List[Any],
+        titles: List[str],
+        rows: List[np.ndarray],
+        row_scores: List[np.ndarray],
+        k: int,
+    ) -> NeighbourTable:
+        """Creates a table from the ranked neighbours of each query.
+
+        Args:
+            keys: Query keys.
+            titles: Titles of the candidate items.
+            rows: Ranked neighbour indices per query (at most k).
+            row_scores: Similarity scores aligned with the neighbours.
+            k: Number of neighbours per query.
+
+        Returns:
+            Neighbour table.
+        """
+        neighbours = np.full((len(keys), k), -1, dtype=np.int32)
+        scores = np.zeros((len(keys), k), dtype=np.float32)
+        for i, (row, row_score) in enumerate(zip(rows, row_scores)):
+            neighbours[i, : len(row)] = row
+            scores[i, : len(row)] = row_score
+        return cls(keys, titles, neighbours, scores)
+
+    def __contains__(self, key: Any) -> bool:
+        """Returns whether the table has neighbours for the query key."""
+        return key in self.key_to_row
+
+    def get_neighbours(
+        self, key: Any, num_neighbours: int, excluded: Iterable[str] = ()
+    ) -> List[str]:
+        """Gets the titles of the best neighbours of a query.
+
+        Args:
+            key: Query key.
+            num_neighbours: Number of neighbours to return.
+            excluded: Titles to leave out. Defaults to none.
+
+        Raises:
+            KeyError: If the query key is not in the table.
+
+        Returns:
+            Titles of the neighbours, best first.
+        """
+        excluded = set(excluded)
+        neighbours = []
+        for idx in self.neighbours[self.key_to_row[key]]:
+            if len(neighbours) >= num_neighbours or idx < 0:
+                break
+            title = self.titles[idx]
+            if title not in excluded:
+                neighbours.append(title)
+        return neighbours
+
+    def save(self, folder: str, name: str) -> None:
+        """Saves the table.
+
+        Args:
+            folder: Path to the folder to save the table.
+            name: Name of the table, used as prefix of the file names.
+        """
+        os.makedirs(folder, exist_ok=True)
+        np.save(os.path.join(folder, f"{name}_neighbours.npy"), self.neighbours)
+        np.save(os.path.join(folder, f"{name}_scores.npy"), self.scores)
+        with open(os.path.join(folder, f"{name}.json"), "w") as f:
+            json.dump(
+                {
+                    "keys": [
+                        key.item() if isinstance(key, np.generic) else key
+                        for key in self.keys
+                    ],
+                    "titles": list(self.titles),
+                },
+                f,
+            )
+
+    @classmethod
+    def load(cls, folder: str, name: str, mmap: bool = True) -> NeighbourTable:
+        """Loads a table.
+
+        Args:
+            folder: Path to the folder containing the table.
+            name: Name of the table.
+            mmap: Whether to memory-map the arrays. Defaults to True.
+
+        Returns:
+            Neighbour table.
+        """
+        mmap_mode = "r" if mmap else None
+        with open(os.path.join(folder, f"{name}.json"), "r") as f:
+            data = json.load(f)
+        return cls(
+            data["keys"],
+            data["titles"],
+            np.load(
+                os.path.join(folder, f"{name}_neighbours.npy"),
+                mmap_mode=mmap_mode,
+            ),
+            np.load(
+                os.path.join(folder, f"{name}_scores.npy"), mmap_mode=mmap_mode
+            ),
+        )
@@ -2,15 +2,24 @@
 
 This component is responsible for replacing placeholders, if any, in the
 retrieved response with appropriate movie information.
+
+A recommender is saved either as a pickle file or as a folder of artifacts
+described by a manifest (see `save_artifacts`), which loads faster. A pickle
+in a legacy layout, which has to be migrated on load, is saved as artifacts
+next to it the first time it is loaded, and these are loaded instead later on.
 """
 
 from __future__ import annotations
 
+import json
+import logging
 import os
 import pickle
 from abc import ABC, abstractmethod
 from typing import List
 
+ARTIFACTS_MANIFEST_FILE = "manifest.json"
+
 
 class Recommender(ABC):
     def __init__(self) -> None:
@@ -79,8 +88,13 @@ class Recommender(ABC):
     def load(cls, path: str) -> Recommender:
         """Loads the recommender from the given path.
 
+        If the pickle file has been saved as artifacts, in a folder with the
+        same name without extension, the artifacts are loaded instead as long
+        as they are more recent than the pickle file.
+
         Args:
-            path: Path to the recommender.
+            path: Path to the recommender, either a pickle file or a folder of
+              artifacts.
 
         Raises:
             FileNotFoundError: If the recommender file is not found.
@@ -91,7 +105,69 @@ class Recommender(ABC):
         if not os.path.exists(path):
             raise FileNotFoundError(f"Recommender file not found: {path}")
 
-        return pickle.load(open(path, "rb"))
+        if os.path.isdir(path):
+            with open(os.path.join(path, ARTIFACTS_MANIFEST_FILE), "r") as f:
+                manifest = json.load(f)
+            recommender_classes = {
+                recommender_class.__name__: recommender_class
+                for recommender_class in [cls, *Recommender.__subclasses__()]
+            }
+            return recommender_classes[manifest["recommender"]].load_artifacts(
+                path
+            )
+
+        artifacts_folder = os.path.splitext(path)[0]
+        manifest_path = os.path.join(artifacts_folder, ARTIFACTS_MANIFEST_FILE)
+        if os.path.exists(manifest_path) and os.path.getmtime(
+            manifest_path
+        ) >= os.path.getmtime(path):
+            return cls.load(artifacts_folder)
+
+        recommender = pickle.load(open(path, "rb"))
+        if recommender.__dict__.pop("_migrated", False):
+            # Save the migrated recommender, so that the migration is not
+            # repeated at each load
+            logging.warning(
+                f"Recommender {path} has a legacy layout and was migrated on "
+                f"load, saving it as artifacts in {artifacts_folder}."
+            )
+            try:
+                recommender.save_artifacts(artifacts_folder)
+            except (OSError, NotImplementedError) as e:
+                logging.warning(
+                    f"Could not save the recommender as artifacts: {e}. Use "
+                    "`script/crb_crs/convert_recommender.py` to avoid "
+                    "migrating it at each load."
+                )
+        return recommender
+
+    @classmethod
+    def load_artifacts(cls, folder: str) -> Recommender:
+        """Loads the recommender from a folder of artifacts.
+
+        Args:
+            folder: Path to the folder containing the artifacts.
+
+        Raises:
+            NotImplementedError: If the method is not implemented in the
+              subclass.
+
+        Returns:
+            Loaded recommender.
+        """
+        raise NotImplementedError
+
+    def save_artifacts(self, folder: str) -> None:
+        """Saves the recommender as a folder of artifacts.
+
+        Args:
+            folder: Path to the folder to save the artifacts.
+
+        Raises:
+            NotImplementedError: If the method is not implemented in the
+              subclass.
+        """
+        raise NotImplementedError
 
     def save(self, path: str) -> None:
         """Saves the recommender to the given path.
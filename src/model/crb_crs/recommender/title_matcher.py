@@ -0,0 +1,102 @@
+"""Aho-Corasick automaton to detect item titles mentioned in utterances.
+
+A title is mentioned in an utterance if the title preceded by a space is a
+substring of the utterance. The automaton is built once over all the titles
+of the catalog and finds all the mentioned titles in a single pass over the
+utterance.
+"""
+
+from typing import Dict, Iterable, List
+
+
+class TitleMatcher:
+    def __init__(self, titles: Iterable[str]) -> None:
+        """Builds the automaton over the titles.
+
+        Args:
+            titles: Titles of the catalog, in catalog order. Titles may
+              repeat.
+        """
+        # Rows of the catalog sharing the same pattern
+        pattern_ids: Dict[str, int] = {}
+        self.pattern_rows: List[List[int]] = []
+        for row, title in enumerate(titles):
+            pattern = f" {title}"
+            if pattern not in pattern_ids:
+                pattern_ids[pattern] = len(self.pattern_rows)
+                self.pattern_rows.append([])
+            self.pattern_rows[pattern_ids[pattern]].append(row)
+
+        self._build(list(pattern_ids))
+
+    def _build(self, patterns: List[str]) -> None:
+        """Builds the trie, failure links, and output links.
+
+        Args:
+            patterns: Distinct patterns, indexed by pattern id.
+        """
+        self.goto: List[Dict[str, int]] = [{}]
+        self.outputs: List[List[int]] = [[]]
+        for pattern_id, pattern in enumerate(patterns):
+            node = 0
+            for char in pattern:
+                next_node = self.goto[node].get(char)
+                if next_node is None:
+                    next_node = len(self.goto)
+                    self.goto[node][char] = next_node
+                    self.goto.append({})
+                    self.outputs.append([])
+                node = next_node
+            self.outputs[node].append(pattern_id)
+
+        # Breadth-first computation of the failure links and of the links to
+        # the closest node on the failure chain with an output.
+        self.fail = [0] * len(self.goto)
+        self.output_link = [0] * len(self.goto)
+        queue = list(self.goto[0].values())
+        for node in queue:
+            for char, next_node in self.goto[node].items():
+                fail = self.fail[node]
+                while fail and char not in self.goto[fail]:
+                    fail = self.fail[fail]
+                fail = self.goto[fail].get(char, 0)
+                self.fail[next_node] = fail if fail != next_node else 0
+                self.output_link[next_node] = (
+                    self.fail[next_node]
+                    if self.outputs[self.fail[next_node]]
+                    else self.output_link[self.fail[next_node]]
+                )
+                queue.append(next_node)
+
+    def find(self, utterance: str) -> List[int]:
+        """Finds the titles mentioned in an utterance.
+
+        Args:
+            utterance: Utterance.
+
+        Returns:
+            Catalog rows of the mentioned titles, in catalog order.
+        """
+        goto = self.goto
+        fail = self.fail
+        matched_patterns = set()
+        visited = set()
+        node = 0
+        for char in utterance:
+            while node and char not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(char, 0)
+
+            # Collect the outputs of the node and of its failure chain, a
+            # chain already collected is not walked again.
+            output_node = node if self.outputs[node] else self.output_link[node]
+            while output_node and output_node not in visited:
+                visited.add(output_node)
+                matched_patterns.update(self.outputs[output_node])
+                output_node = self.output_link[output_node]
+
+        return sorted(
+            row
+            for pattern_id in matched_patterns
+            for row in self.pattern_rows[pattern_id]
+        )
@@ -0,0 +1,585 @@
+"""Inverted BM25 index for the retriever component of CRB-CRS.
+
+Alternative to the TF-IDF index: each preprocessed corpus is indexed as
+postings lists (term -> corpus lines and term frequencies, in CSR layout)
+scored with BM25. Queries are evaluated term at a time with MaxScore early
+termination: terms are processed by decreasing score upper bound and, once
+the k-th best partial score exceeds the sum of the upper bounds of the
+remaining terms, no new line can enter the top-k. The remaining postings
+lists are then only probed for the lines already scored, and the lines that
+cannot reach the top-k are dropped.
+
+Lines can be added to an index without rebuilding it. They are kept in
+separate postings, appended after the base postings, until the index is
+compacted (which happens when it is saved).
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+import os
+import re
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from src.model.crb_crs.retriever.corpus import (
+    CORPUS_FILES,
+    hash_corpus,
+    read_corpus,
+)
+
+BM25_VERSION = 1
+MANIFEST_FILE = "manifest.json"
+DEFAULT_K1 = 1.2
+DEFAULT_B = 0.75
+
+# Same tokenization as the default analyzer of the TF-IDF vectorizers
+TOKEN_PATTERN = re.compile(r"(?u)\b\w\w+\b")
+
+
+def tokenize(text: str) -> List[str]:
+    """Splits a text into lowercased tokens.
+
+    Args:
+        text: Text.
+
+    Returns:
+        List of tokens.
+    """
+    return TOKEN_PATTERN.findall(text.lower())
+
+
+def _segment_reduce(
+    ufunc: np.ufunc, values: np.ndarray, indptr: np.ndarray
+) -> np.ndarray:
+    """Reduces the values of each segment of a CSR layout.
+
+    Args:
+        ufunc: Reduction, e.g., `np.maximum`.
+        values: Values of all the segments.
+        indptr: Segment boundaries.
+
+    Returns:
+        Reduced value of each segment, 0 for empty segments.
+    """
+    result = np.zeros(len(indptr) - 1, dtype=np.float64)
+    non_empty = np.diff(indptr) > 0
+    if non_empty.any():
+        # Empty segments have no length, so the segment of each non-empty
+        # start ends at the next non-empty start.
+        result[non_empty] = ufunc.reduceat(
+            values, indptr[:-1][non_empty].astype(np.int64)
+        )
+    return result
+
+
+class InvertedIndex:
+    def __init__(
+        self,
+        vocabulary: Dict[str, int],
+        indptr: np.ndarray,
+        line_ids: np.ndarray,
+        term_freqs: np.ndarray,
+        line_lengths: np.ndarray,
+        k1: float = DEFAULT_K1,
+        b: float = DEFAULT_B,
+    ) -> None:
+        """Initializes the index of a corpus.
+
+        Args:
+            vocabulary: Mapping from term to term id.
+            indptr: Boundaries of the postings list of each term id.
+            line_ids: Corpus lines of the postings, ascending within a list.
+            term_freqs: Term frequencies of the postings.
+            line_lengths: Number of tokens of each corpus line.
+            k1: BM25 term frequency saturation. Defaults to DEFAULT_K1.
+            b: BM25 length normalization. Defaults to DEFAULT_B.
+        """
+        self.vocabulary = vocabulary
+        self.indptr = indptr
+        self.line_ids = line_ids
+        self.term_freqs = term_freqs
+        self.line_lengths = np.asarray(line_lengths, dtype=np.float32)
+        self.k1 = k1
+        self.b = b
+        self.total_length = float(self.line_lengths.sum())
+
+        # Statistics per term used by the IDF and the score upper bounds
+        self.doc_freqs = np.diff(indptr).astype(np.int64)
+        self.max_term_freqs = _segment_reduce(np.maximum, term_freqs, indptr)
+        self.min_line_lengths = _segment_reduce(
+            np.minimum, self.line_lengths[line_ids], indptr
+        )
+        # Postings of the added lines, per term id
+        self.added_postings: Dict[int, Tuple[List[int], List[float]]] = {}
+
+    @property
+    def num_lines(self) -> int:
+        """Number of indexed corpus lines."""
+        return len(self.line_lengths)
+
+    @classmethod
+    def build(
+        cls, corpus: List[str], k1: float = DEFAULT_K1, b: float = DEFAULT_B
+    ) -> InvertedIndex:
+        """Indexes the lines of a corpus.
+
+        Args:
+            corpus: Corpus lines.
+            k1: BM25 term frequency saturation. Defaults to DEFAULT_K1.
+            b: BM25 length normalization. Defaults to DEFAULT_B.
+
+        Returns:
+            Built index.
+        """
+        vocabulary: Dict[str, int] = {}
+        terms, lines, freqs = [], [], []
+        line_lengths = np.zeros(len(corpus), dtype=np.float32)
+        for line_id, line in enumerate(corpus):
+            tokens = tokenize(line)
+            line_lengths[line_id] = len(tokens)
+            for term, freq in Counter(tokens).items():
+                terms.append(vocabulary.setdefault(term, len(vocabulary)))
+                lines.append(line_id)
+                freqs.append(freq)
+
+        terms = np.array(terms, dtype=np.int64)
+        lines = np.array(lines, dtype=np.int32)
+        order = np.lexsort((lines, terms))
+        indptr = np.zeros(len(vocabulary) + 1, dtype=np.int64)
+        indptr[1:] = np.cumsum(np.bincount(terms, minlength=len(vocabulary)))
+        return cls(
+            vocabulary,
+            indptr,
+            lines[order],
+            np.array(freqs, dtype=np.float32)[order],
+            line_lengths,
+            k1,
+            b,
+        )
+
+    def add_lines(self, lines: List[str]) -> None:
+        """Adds lines at the end of the indexed corpus.
+
+        Args:
+            lines: Corpus lines.
+        """
+        first_line_id = self.num_lines
+        num_terms = len(self.vocabulary)
+        line_lengths = np.zeros(len(lines), dtype=np.float32)
+        postings = []
+        for offset, line in enumerate(lines):
+            tokens = tokenize(line)
+            line_lengths[offset] = len(tokens)
+            for term, freq in Counter(tokens).items():
+                term_id = self.vocabulary.setdefault(term, len(self.vocabulary))
+                postings.append((term_id, first_line_id + offset, float(freq)))
+
+        # New terms have empty base postings lists
+        num_new_terms = len(self.vocabulary) - num_terms
+        self.indptr = np.concatenate(
+            [self.indptr, np.full(num_new_terms, self.indptr[-1])]
+        )
+        self.doc_freqs = np.concatenate(
+            [self.doc_freqs, np.zeros(num_new_terms, dtype=np.int64)]
+        )
+        self.max_term_freqs = np.concatenate(
+            [self.max_term_freqs, np.zeros(num_new_terms)]
+        )
+        self.min_line_lengths = np.concatenate(
+            [self.min_line_lengths, np.full(num_new_terms, np.inf)]
+        )
+        self.line_lengths = np.concatenate([self.line_lengths, line_lengths])
+        self.total_length += float(line_lengths.sum())
+
+        for term_id, line_id, freq in postings:
+            added_lines, added_freqs = self.added_postings.setdefault(
+                term_id, ([], [])
+            )
+            added_lines.append(line_id)
+            added_freqs.append(freq)
+            self.doc_freqs[term_id] += 1
+            self.max_term_freqs[term_id] = max(
+                self.max_term_freqs[term_id], freq
+            )
+            self.min_line_lengths[term_id] = min(
+                self.min_line_lengths[term_id], self.line_lengths[line_id]
+            )
+
+    def compact(self) -> None:
+        """Merges the postings of the added lines into the base postings."""
+        if not self.added_postings:
+            return
+        base_terms = np.repeat(
+            np.arange(len(self.indptr) - 1), np.diff(self.indptr)
+        )
+        terms = [base_terms]
+        line_ids = [np.asarray(self.line_ids)]
+        term_freqs = [np.asarray(self.term_freqs)]
+        for term_id, (added_lines, added_freqs) in self.added_postings.items():
+            terms.append(np.full(len(added_lines), term_id))
+            line_ids.append(np.array(added_lines, dtype=np.int32))
+            term_freqs.append(np.array(added_freqs, dtype=np.float32))
+
+        terms = np.concatenate(terms)
+        line_ids = np.concatenate(line_ids)
+        order = np.lexsort((line_ids, terms))
+        self.indptr = np.zeros(len(self.vocabulary) + 1, dtype=np.int64)
+        self.indptr[1:] = np.cumsum(
+            np.bincount(terms, minlength=len(self.vocabulary))
+        )
+        self.line_ids = line_ids[order]
+        self.term_freqs = np.concatenate(term_freqs)[order]
+        self.added_postings = {}
+
+    def _postings(self, term_id: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Returns the postings list of a term, sorted by corpus line."""
+        start, end = self.indptr[term_id], self.indptr[term_id + 1]
+        line_ids = self.line_ids[start:end]
+        term_freqs = self.term_freqs[start:end]
+        if term_id in self.added_postings:
+            added_lines, added_freqs = self.added_postings[term_id]
+            # Added lines come after all the base lines
+            line_ids = np.concatenate([line_ids, added_lines])
+            term_freqs = np.concatenate([term_freqs, added_freqs])
+        return line_ids, term_freqs
+
+    def _idf(self, term_id: int) -> float:
+        """Computes the (non-negative) BM25 IDF of a term."""
+        doc_freq = self.doc_freqs[term_id]
+        return float(
+            np.log(1 + (self.num_lines - doc_freq + 0.5) / (doc_freq + 0.5))
+        )
+
+    def _term_scores(
+        self, line_ids: np.ndarray, term_freqs: np.ndarray, weight: float
+    ) -> np.ndarray:
+        """Computes the BM25 scores of a term for corpus lines.
+
+        Args:
+            line_ids: Corpus lines containing the term.
+            term_freqs: Frequency of the term in these lines.
+            weight: IDF of the term times its frequency in the query.
+
+        Returns:
+            Scores of the lines.
+        """
+        avg_length = self.total_length / max(self.num_lines, 1)
+        term_freqs = np.asarray(term_freqs, dtype=np.float64)
+        norms = self.k1 * (
+            1 - self.b + self.b * self.line_lengths[line_ids] / avg_length
+        )
+        return weight * term_freqs * (self.k1 + 1) / (term_freqs + norms)
+
+    def _upper_bound(self, term_id: int, weight: float) -> float:
+        """Computes an upper bound of the BM25 scores of a term.
+
+        The score increases with the term frequency and decreases with the
+        line length, so it is bounded by the score of the maximum frequency
+        of the term in a line of the minimum length.
+
+        Args:
+            term_id: Term id.
+            weight: IDF of the term times its frequency in the query.
+
+        Returns:
+            Upper bound of the scores.
+        """
+        avg_length = self.total_length / max(self.num_lines, 1)
+        term_freq = self.max_term_freqs[term_id]
+        norm = self.k1 * (
+            1 - self.b + self.b * self.min_line_lengths[term_id] / avg_length
+        )
+        return float(weight * term_freq * (self.k1 + 1) / (term_freq + norm))
+
+    def search(
+        self,
+        query: str,
+        k: int,
+        candidate_mask: Optional[np.ndarray] = None,
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """Finds the corpus lines with the highest BM25 scores for a query.
+
+        Args:
+            query: Query.
+            k: Number of lines to return.
+            candidate_mask: Boolean mask of the corpus lines that can be
+              returned. Defaults to all lines.
+
+        Returns:
+            Corpus lines, by decreasing score (ties by line), and scores.
+        """
+        query_terms = Counter(
+            self.vocabulary[token]
+            for token in tokenize(query)
+            if token in self.vocabulary
+        )
+        weights = {
+            term_id: freq * self._idf(term_id)
+            for term_id, freq in query_terms.items()
+            if self.doc_freqs[term_id] > 0
+        }
+        # Terms by decreasing upper bound, with the sum of the upper bounds of
+        # the terms that follow each of them
+        bounds = {
+            term_id: self._upper_bound(term_id, weight)
+            for term_id, weight in weights.items()
+        }
+        terms = sorted(bounds, key=lambda term_id: -bounds[term_id])
+        remaining_bounds = np.cumsum([bounds[t] for t in terms][::-1])[::-1]
+        remaining_bounds = np.append(remaining_bounds, 0.0)[1:]
+
+        scored_lines = np.zeros(0, dtype=np.int64)
+        scores = np.zeros(0, dtype=np.float64)
+        closed = False
+        for term_id, remaining_bound in zip(terms, remaining_bounds):
+            line_ids, term_freqs = self._postings(term_id)
+            if closed:
+                # Only the lines already scored can enter the top-k, the
+                # postings list is probed for them.
+                positions = np.minimum(
+                    np.searchsorted(line_ids, scored_lines), len(line_ids) - 1
+                )
+                found = line_ids[positions] == scored_lines
+                scores[found] += self._term_scores(
+                    scored_lines[found],
+                    term_freqs[positions[found]],
+                    weights[term_id],
+                )
+            else:
+                if candidate_mask is not None:
+                    kept = candidate_mask[line_ids]
+                    line_ids, term_freqs = line_ids[kept], term_freqs[kept]
+                scored_lines, inverse = np.unique(
+                    np.concatenate([scored_lines, line_ids]),
+                    return_inverse=True,
+                )
+                scores = np.bincount(
+                    inverse,
+                    weights=np.concatenate(
+                        [
+                            scores,
+                            self._term_scores(
+                                line_ids, term_freqs, weights[term_id]
+                            ),
+                        ]
+                    ),
+                    minlength=len(scored_lines),
+                )
+
+            if len(scores) < k or remaining_bound == 0:
+                continue
+            # Partial scores only increase, the k-th best one is a lower
+            # bound of the k-th best final score. Ties are broken by line, so
+            # the lines not scored yet are only excluded if they cannot reach
+            # the threshold, and the scored lines that can reach it are kept.
+            threshold = np.partition(scores, len(scores) - k)[len(scores) - k]
+            if threshold > remaining_bound:
+                closed = True
+                kept = scores + remaining_bound >= threshold
+                scored_lines, scores = scored_lines[kept], scores[kept]
+
+        order = np.lexsort((scored_lines, -scores))[:k]
+        return scored_lines[order], scores[order]
+
+    def save(self, index_folder: str, name: str) -> None:
+        """Saves the index, after merging the postings of the added lines.
+
+        Args:
+            index_folder: Path to the folder to save the index.
+            name: Name of the corpus, used as prefix of the file names.
+        """
+        self.compact()
+        os.makedirs(index_folder, exist_ok=True)
+        with open(
+            os.path.join(index_folder, f"{name}_vocabulary.json"), "w"
+        ) as f:
+            json.dump(self.vocabulary, f)
+        for component in ["indptr", "line_ids", "term_freqs", "line_lengths"]:
+            np.save(
+                os.path.join(index_folder, f"{name}_{component}.npy"),
+                getattr(self, component),
+            )
+
+    @classmethod
+    def load(
+        cls,
+        index_folder: str,
+        name: str,
+        k1: float = DEFAULT_K1,
+        b: float = DEFAULT_B,
+        mmap: bool = True,
+    ) -> InvertedIndex:
+        """Loads the index of a corpus.
+
+        Args:
+            index_folder: Path to the folder containing the index.
+            name: Name of the corpus.
+            k1: BM25 term frequency saturation. Defaults to DEFAULT_K1.
+            b: BM25 length normalization. Defaults to DEFAULT_B.
+            mmap: Whether to memory-map the postings. Defaults to True.
+
+        Returns:
+            Loaded index.
+        """
+        mmap_mode = "r" if mmap else None
+        with open(
+            os.path.join(index_folder, f"{name}_vocabulary.json"), "r"
+        ) as f:
+            vocabulary = json.load(f)
+        components = ["indptr", "line_ids", "term_freqs", "line_lengths"]
+        indptr, line_ids, term_freqs, line_lengths = [
+            np.load(
+                os.path.join(index_folder, f"{name}_{component}.npy"),
+                mmap_mode=mmap_mode,
+            )
+            for component in components
+        ]
+        return cls(
+            vocabulary, indptr, line_ids, term_freqs, line_lengths, k1, b
+        )
+
+
+class BM25Index:
+    def __init__(
+        self,
+        indices: Dict[str, InvertedIndex],
+        corpus_hash: str,
+        k1: float = DEFAULT_K1,
+        b: float = DEFAULT_B,
+    ) -> None:
+        """Initializes the BM25 index of the preprocessed corpora.
+
+        Args:
+            indices: Inverted index per corpus (see CORPUS_FILES).
+            corpus_hash: Hash of the corpus files the index is built from.
+            k1: BM25 term frequency saturation. Defaults to DEFAULT_K1.
+            b: BM25 length normalization. Defaults to DEFAULT_B.
+        """
+        self.indices = indices
+        self.corpus_hash = corpus_hash
+        self.k1 = k1
+        self.b = b
+
+    @classmethod
+    def build(
+        cls, corpus_folder: str, k1: float = DEFAULT_K1, b: float = DEFAULT_B
+    ) -> BM25Index:
+        """Indexes the preprocessed corpora.
+
+        Args:
+            corpus_folder: Path to the folder containing the corpus files.
+            k1: BM25 term frequency saturation. Defaults to DEFAULT_K1.
+            b: BM25 length normalization. Defaults to DEFAULT_B.
+
+        Returns:
+            Built index.
+        """
+        indices = {
+            name: InvertedIndex.build(
+                read_corpus(corpus_folder, filename), k1, b
+            )
+            for name, filename in CORPUS_FILES.items()
+        }
+        return cls(indices, hash_corpus(corpus_folder), k1, b)
+
+    def add_lines(self, lines: Dict[str, List[str]]) -> None:
+        """Adds lines at the end of the preprocessed corpora.
+
+        Args:
+            lines: Lines to add per corpus.
+        """
+        for name, index in self.indices.items():
+            index.add_lines(lines[name])
+
+    def save(self, index_folder: str) -> None:
+        """Saves the index.
+
+        Args:
+            index_folder: Path to the folder to save the index.
+        """
+        os.makedirs(index_folder, exist_ok=True)
+        for name, index in self.indices.items():
+            index.save(index_folder, name)
+
+        manifest = {
+            "version": BM25_VERSION,
+            "corpus_hash": self.corpus_hash,
+            "k1": self.k1,
+            "b": self.b,
+            "num_lines": {
+                name: index.num_lines for name, index in self.indices.items()
+            },
+        }
+        with open(os.path.join(index_folder, MANIFEST_FILE), "w") as f:
+            json.dump(manifest, f, indent=2)
+
+    @classmethod
+    def load(cls, index_folder: str, mmap: bool = True) -> BM25Index:
+        """Loads the index.
+
+        Args:
+            index_folder: Path to the folder containing the index.
+            mmap: Whether to memory-map the postings. Defaults to True.
+
+        Raises:
+            FileNotFoundError: If the index manifest is not found.
+
+        Returns:
+            Loaded index.
+        """
+        manifest = cls.read_manifest(index_folder)
+        k1, b = manifest["k1"], manifest["b"]
+        indices = {
+            name: InvertedIndex.load(index_folder, name, k1, b, mmap)
+            for name in CORPUS_FILES
+        }
+        return cls(indices, manifest["corpus_hash"], k1, b)
+
+    @staticmethod
+    def read_manifest(index_folder: str) -> Dict:
+        """Reads the manifest of an index.
+
+        Args:
+            index_folder: Path to the folder containing the index.
+
+        Raises:
+            FileNotFoundError: If the index manifest is not found.
+
+        Returns:
+            Manifest of the index.
+        """
+        with open(os.path.join(index_folder, MANIFEST_FILE), "r") as f:
+            return json.load(f)
+
+    @classmethod
+    def load_or_build(cls, corpus_folder: str, index_folder: str) -> BM25Index:
+        """Loads the index if it is up to date, otherwise builds and saves it.
+
+        Args:
+            corpus_folder: Path to the folder containing the corpus files.
+            index_folder: Path to the folder containing the index.
+
+        Returns:
+            Up to date index.
+        """
+        try:
+            manifest = cls.read_manifest(index_folder)
+        except FileNotFoundError:
+            manifest = {}
+
+        if (
+            manifest.get("version") == BM25_VERSION
+            and manifest.get("corpus_hash") == hash_corpus(corpus_folder)
+        ):
+            return cls.load(index_folder)
+
+        logging.info(
+            f"BM25 index in {index_folder} is missing or outdated, building it."
+        )
+        index = cls.build(corpus_folder)
+        index.save(index_folder)
+        return index
@@ -0,0 +1,240 @@
+"""Precomputed sentence embeddings of the CRB-CRS candidate responses.
+
+Candidate responses are always lines of the original corpus that follow a
+valid match (see `build_candidate_mask`). These lines are preprocessed and
+embedded once with the BERT vectorizer, L2-normalized, and stored as a float16
+matrix that is memory-mapped when the retriever is initialized. The outlier
+filter then only needs row lookups and dot products.
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+import os
+from typing import Dict, List
+
+import numpy as np
+from sent2vec.vectorizer import Vectorizer
+from tqdm import tqdm
+
+from src.model.crb_crs.utils_preprocessing import preprocess_utterance
+
+EMBEDDINGS_VERSION = 1
+MANIFEST_FILE = "manifest.json"
+EMBEDDINGS_FILE = "embeddings.npy"
+LINE_ROWS_FILE = "line_rows.npy"
+
+
+def preprocess_candidate(candidate: str, dataset: str) -> str:
+    """Preprocesses a candidate response before embedding it.
+
+    Args:
+        candidate: Line of the original corpus, prefixed with the participant.
+        dataset: Dataset name.
+
+    Returns:
+        Preprocessed candidate.
+    """
+    return preprocess_utterance(
+        {"text": candidate.split("~")[1].strip()},
+        dataset=dataset,
+        no_stopwords=False,
+    )
+
+
+def embed_sentences(
+    vectorizer: Vectorizer, sentences: List[str], batch_size: int = 256
+) -> np.ndarray:
+    """Embeds sentences with the BERT vectorizer and L2-normalizes them.
+
+    Args:
+        vectorizer: BERT vectorizer.
+        sentences: Sentences to embed.
+        batch_size: Number of sentences embedded per forward pass. Defaults to
+          256.
+
+    Returns:
+        Matrix of normalized embeddings (float32).
+    """
+    vectors = []
+    for start in range(0, len(sentences), batch_size):
+        vectorizer.run(sentences[start : start + batch_size])
+        vectors.extend(vectorizer.vectors)
+        vectorizer.vectors = []
+
+    vectors = np.asarray(vectors, dtype=np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors
+
+
+class CandidateEmbeddings:
+    def __init__(
+        self,
+        embeddings: np.ndarray,
+        line_rows: np.ndarray,
+        corpus_hash: str,
+        dataset: str,
+    ) -> None:
+        """Initializes the candidate embeddings.
+
+        Args:
+            embeddings: Normalized embeddings of the candidate lines.
+            line_rows: Row of each corpus line in the embedding matrix, -1 for
+              lines that cannot be retrieved.
+            corpus_hash: Hash of the corpus files the embeddings are built
+              from.
+            dataset: Dataset name used for preprocessing.
+        """
+        self.embeddings = embeddings
+        self.line_rows = line_rows
+        self.corpus_hash = corpus_hash
+        self.dataset = dataset
+
+    @classmethod
+    def build(
+        cls,
+        original_corpus: List[str],
+        candidate_mask: np.ndarray,
+        corpus_hash: str,
+        dataset: str,
+        batch_size: int = 256,
+    ) -> CandidateEmbeddings:
+        """Embeds the lines of the corpus that can be retrieved.
+
+        Args:
+            original_corpus: Lines of the original corpus.
+            candidate_mask: Mask of the corpus lines that are valid matches.
+            corpus_hash: Hash of the corpus files.
+            dataset: Dataset name.
+            batch_size: Number of sentences embedded per forward pass.
+              Defaults to 256.
+
+        Returns:
+            Built candidate embeddings.
+        """
+        line_ids = np.flatnonzero(candidate_mask) + 1
+        line_rows = np.full(len(original_corpus), -1, dtype=np.int32)
+        line_rows[line_ids] = np.arange(len(line_ids), dtype=np.int32)
+
+        sentences = [
+            preprocess_candidate(original_corpus[idx], dataset)
+            for idx in tqdm(line_ids, desc="Preprocessing candidates")
+        ]
+        embeddings = embed_sentences(Vectorizer(), sentences, batch_size)
+        return cls(
+            embeddings.astype(np.float16), line_rows, corpus_hash, dataset
+        )
+
+    def save(self, embeddings_folder: str) -> None:
+        """Saves the candidate embeddings.
+
+        Args:
+            embeddings_folder: Path to the folder to save the embeddings.
+        """
+        os.makedirs(embeddings_folder, exist_ok=True)
+        np.save(
+            os.path.join(embeddings_folder, EMBEDDINGS_FILE), self.embeddings
+        )
+        np.save(os.path.join(embeddings_folder, LINE_ROWS_FILE), self.line_rows)
+
+        manifest = {
+            "version": EMBEDDINGS_VERSION,
+            "corpus_hash": self.corpus_hash,
+            "dataset": self.dataset,
+            "shape": list(self.embeddings.shape),
+        }
+        with open(os.path.join(embeddings_folder, MANIFEST_FILE), "w") as f:
+            json.dump(manifest, f, indent=2)
+
+    @classmethod
+    def load(
+        cls, embeddings_folder: str, mmap: bool = True
+    ) -> CandidateEmbeddings:
+        """Loads the candidate embeddings.
+
+        Args:
+            embeddings_folder: Path to the folder containing the embeddings.
+            mmap: Whether to memory-map the embedding matrix. Defaults to True.
+
+        Raises:
+            FileNotFoundError: If the embeddings manifest is not found.
+
+        Returns:
+            Loaded candidate embeddings.
+        """
+        manifest = cls.read_manifest(embeddings_folder)
+        embeddings = np.load(
+            os.path.join(embeddings_folder, EMBEDDINGS_FILE),
+            mmap_mode="r" if mmap else None,
+        )
+        line_rows = np.load(os.path.join(embeddings_folder, LINE_ROWS_FILE))
+        return cls(
+            embeddings, line_rows, manifest["corpus_hash"], manifest["dataset"]
+        )
+
+    @staticmethod
+    def read_manifest(embeddings_folder: str) -> Dict:
+        """Reads the manifest of the candidate embeddings.
+
+        Args:
+            embeddings_folder: Path to the folder containing the embeddings.
+
+        Raises:
+            FileNotFoundError: If the embeddings manifest is not found.
+
+        Returns:
+            Manifest of the embeddings.
+        """
+        with open(os.path.join(embeddings_folder, MANIFEST_FILE), "r") as f:
+            return json.load(f)
+
+    @classmethod
+    def load_if_valid(
+        cls, embeddings_folder: str, corpus_hash: str, dataset: str
+    ) -> CandidateEmbeddings:
+        """Loads the candidate embeddings if they match the corpus.
+
+        Args:
+            embeddings_folder: Path to the folder containing the embeddings.
+            corpus_hash: Hash of the current corpus files.
+            dataset: Dataset name.
+
+        Returns:
+            Loaded candidate embeddings, None if they are missing or outdated.
+        """
+        try:
+            manifest = cls.read_manifest(embeddings_folder)
+        except FileNotFoundError:
+            manifest = {}
+
+        if (
+            manifest.get("version") == EMBEDDINGS_VERSION
+            and manifest.get("corpus_hash") == corpus_hash
+            and manifest.get("dataset") == dataset
+        ):
+            return cls.load(embeddings_folder)
+
+        logging.warning(
+            f"Candidate embeddings in {embeddings_folder} are missing or "
+            "outdated, candidates will be embedded online. Build them with "
+            "script.crb_crs.build_candidate_embeddings."
+        )
+        return None
+
+    def lookup(self, line_ids: List[int]) -> np.ndarray:
+        """Returns the normalized embeddings of corpus lines.
+
+        Args:
+            line_ids: Indices of the lines in the original corpus.
+
+        Raises:
+            KeyError: If a line has no precomputed embedding.
+
+        Returns:
+            Matrix of embeddings (float32).
+        """
+        rows = self.line_rows[line_ids]
+        if (rows < 0).any():
+            raise KeyError("Some lines have no precomputed embedding.")
+        return np.asarray(self.embeddings[rows], dtype=np.float32)
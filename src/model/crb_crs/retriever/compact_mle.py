@@ -0,0 +1,428 @@
+"""Compact array-backed n-gram Maximum Likelihood Probabilistic Language Model.
+
+The corpus words are mapped to vocabulary ids. The n-grams of each order are
+encoded as 64-bit keys (mixed radix of the word ids, so that distinct n-grams
+have distinct keys; an error is raised if `vocab_size ** order` does not fit
+in 64 bits) stored sorted in NumPy arrays, with their counts in a parallel
+integer array. The arrays are saved as `.npy` files and memory-mapped when the
+model is loaded.
+
+The model computes the same probabilities as `NGramMLE`, including the lookup
+of string keys in the tables of order 2 and above (which never match, as
+these tables are keyed by tuples of words).
+"""
+
+from __future__ import annotations
+
+import json
+import os
+from typing import Any, Dict, List, Sequence, Tuple, Union
+
+import numpy as np
+
+from src.model.crb_crs.retriever.mle_model import NGramMLE
+
+MODEL_VERSION = 1
+MANIFEST_FILE = "manifest.json"
+VOCABULARY_FILE = "vocabulary.json"
+UNIGRAM_COUNTS_FILE = "unigram_counts.npy"
+
+NGramKey = Union[str, Sequence[str]]
+
+
+def check_ngram_order(vocab_size: int, order: int) -> None:
+    """Checks that the n-grams of an order can be encoded as 64-bit keys.
+
+    Args:
+        vocab_size: Size of the vocabulary.
+        order: n-gram order.
+
+    Raises:
+        ValueError: If `vocab_size ** order` does not fit in 64 bits, i.e.,
+          distinct n-grams could have the same key.
+    """
+    if vocab_size**order >= 2**64:
+        raise ValueError(
+            f"Cannot encode n-grams of order {order} with a vocabulary of "
+            f"{vocab_size} words as 64-bit keys."
+        )
+
+
+def encode_ngrams(ids: np.ndarray, vocab_size: int) -> np.ndarray:
+    """Encodes n-grams of word ids as 64-bit keys.
+
+    The key is the mixed radix number of the word ids, so that distinct
+    n-grams have distinct keys.
+
+    Args:
+        ids: Matrix of word ids, one n-gram per row.
+        vocab_size: Size of the vocabulary.
+
+    Raises:
+        ValueError: If the keys do not fit in 64 bits.
+
+    Returns:
+        Array of keys.
+    """
+    check_ngram_order(vocab_size, ids.shape[1])
+    keys = np.zeros(len(ids), dtype=np.uint64)
+    radix = np.uint64(vocab_size)
+    for column in range(ids.shape[1]):
+        keys = keys * radix + ids[:, column].astype(np.uint64)
+    return keys
+
+
+def merge_ngram_counts(
+    keys: np.ndarray, counts: np.ndarray
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Sorts n-gram keys and sums the counts of identical keys.
+
+    Args:
+        keys: Array of n-gram keys.
+        counts: Counts aligned with the keys.
+
+    Returns:
+        Unique sorted keys and their counts.
+    """
+    unique_keys, inverse = np.unique(keys, return_inverse=True)
+    unique_counts = np.bincount(
+        inverse, weights=counts, minlength=len(unique_keys)
+    ).astype(np.int64)
+    return unique_keys, unique_counts
+
+
+class CompactNGramMLE:
+    def __init__(
+        self,
+        n: int,
+        total_words: int,
+        vocabulary: List[str],
+        unigram_counts: np.ndarray,
+        ngram_keys: Dict[int, np.ndarray],
+        ngram_counts: Dict[int, np.ndarray],
+    ) -> None:
+        """Initializes the model.
+
+        Args:
+            n: n-gram order.
+            total_words: Number of words in the corpus.
+            vocabulary: Words of the corpus, in id order.
+            unigram_counts: Count of each word, indexed by id.
+            ngram_keys: Sorted n-gram keys per order (2 to n).
+            ngram_counts: Counts of the n-grams per order, aligned with the
+              keys.
+        """
+        self.n = n
+        self.total_words = total_words
+        self.vocabulary = vocabulary
+        self.word_ids = {word: idx for idx, word in enumerate(vocabulary)}
+        self.unigram_counts = unigram_counts
+        self.ngram_keys = ngram_keys
+        self.ngram_counts = ngram_counts
+
+    @property
+    def vocab_size(self) -> int:
+        """Number of distinct words in the corpus."""
+        return len(self.vocabulary)
+
+    @classmethod
+    def from_ngram_mle(cls, model: NGramMLE) -> CompactNGramMLE:
+        """Converts an `NGramMLE` model to the compact representation.
+
+        Args:
+            model: Model with n-gram counters.
+
+        Returns:
+            Compact model.
+        """
+        vocabulary = list(model.ngrams[1].keys())
+        word_ids = {word: idx for idx, word in enumerate(vocabulary)}
+        unigram_counts = np.array(
+            [model.ngrams[1][word] for word in vocabulary], dtype=np.int64
+        )
+
+        ngram_keys = {}
+        ngram_counts = {}
+        for order in range(2, model.n + 1):
+            counter = model.ngrams[order]
+            ids = np.array(
+                [[word_ids[word] for word in ngram] for ngram in counter],
+                dtype=np.int64,
+            ).reshape(-1, order)
+            keys = encode_ngrams(ids, len(vocabulary))
+            counts = np.fromiter(
+                counter.values(), dtype=np.int64, count=len(counter)
+            )
+            ngram_keys[order], ngram_counts[order] = merge_ngram_counts(
+                keys, counts
+            )
+
+        return cls(
+            model.n,
+            model.total_words,
+            vocabulary,
+            unigram_counts,
+            ngram_keys,
+            ngram_counts,
+        )
+
+    def _counts(self, order: int, ngrams: List[NGramKey]) -> np.ndarray:
+        """Looks up the counts of n-grams.
+
+        Args:
+            order: n-gram order of the table.
+            ngrams: Words (order 1) or tuples of words (order 2 and above).
+
+        Returns:
+            Array of counts, 0 for unseen n-grams.
+        """
+        counts = np.zeros(len(ngrams), dtype=np.int64)
+        if order == 1:
+            ids = np.array(
+                [self.word_ids.get(ngram, -1) for ngram in ngrams],
+                dtype=np.int64,
+            ).reshape(-1)
+            found = ids >= 0
+            counts[found] = self.unigram_counts[ids[found]]
+            return counts
+
+        if order not in self.ngram_keys or len(self.ngram_keys[order]) == 0:
+            return counts
+
+        # Only tuples of `order` known words can be in the table
+        positions = []
+        ids = []
+        for i, ngram in enumerate(ngrams):
+            if isinstance(ngram, str) or len(ngram) != order:
+                continue
+            ngram_ids = [self.word_ids.get(word, -1) for word in ngram]
+            if min(ngram_ids) < 0:
+                continue
+            positions.append(i)
+            ids.append(ngram_ids)
+        if not positions:
+            return counts
+
+        keys = encode_ngrams(
+            np.array(ids, dtype=np.int64), self.vocab_size
+        )
+        table_keys = self.ngram_keys[order]
+        indices = np.searchsorted(table_keys, keys)
+        indices = np.minimum(indices, len(table_keys) - 1)
+        found = table_keys[indices] == keys
+        positions = np.array(positions)
+        counts[positions[found]] = self.ngram_counts[order][indices[found]]
+        return counts
+
+    def probability(
+        self, ngram: NGramKey, higher_order_ngram: NGramKey = "", n: int = 1
+    ) -> float:
+        """Computes maximum likelihood probability.
+
+        Args:
+            ngram: n-gram.
+            higher_order_ngram: Higher order n-gram. Defaults to "".
+            n: n-gram order. Defaults to 1.
+
+        Returns:
+            Maximum likelihood probability.
+        """
+        return float(
+            self.probability_batch([ngram], [higher_order_ngram], n)[0]
+        )
+
+    def probability_batch(
+        self,
+        ngrams: List[NGramKey],
+        higher_order_ngrams: List[NGramKey] = None,
+        n: int = 1,
+    ) -> np.ndarray:
+        """Computes maximum likelihood probabilities of several n-grams.
+
+        Args:
+            ngrams: List of n-grams.
+            higher_order_ngrams: List of higher order n-grams. Defaults to
+              empty strings.
+            n: n-gram order. Defaults to 1.
+
+        Returns:
+            Array of maximum likelihood probabilities.
+        """
+        if n == 1:
+            return np.log(
+                (self._counts(1, ngrams) + 1)
+                / (self.total_words + self.vocab_size)
+            )
+
+        assert n <= self.n, f"n must be less than or equal to {self.n}"
+        if higher_order_ngrams is None:
+            higher_order_ngrams = [""] * len(ngrams)
+        return np.log(
+            (self._counts(n, higher_order_ngrams) + 1)
+            / (self._counts(n - 1, ngrams) + self.vocab_size)
+        )
+
+    def sentence_probability(self, sentence: str, n: int = 1) -> float:
+        """Computes cumulative n-gram ML probability of a sentence.
+
+        Args:
+            sentence: Sentence.
+            n: n-gram order. Defaults to 1.
+
+        Returns:
+            Cumulative n-gram maximum likelihood probability.
+        """
+        return float(self.sentence_probability_batch([sentence], n)[0])
+
+    def sentence_probability_batch(
+        self, sentences: List[str], n: int = 1
+    ) -> np.ndarray:
+        """Computes cumulative n-gram ML probabilities of several sentences.
+
+        The terms of all the sentences are scored together and summed per
+        sentence.
+
+        Args:
+            sentences: List of sentences.
+            n: n-gram order. Defaults to 1.
+
+        Returns:
+            Array of cumulative n-gram maximum likelihood probabilities.
+        """
+        ngrams = []
+        higher_order_ngrams = []
+        sentence_ids = []
+        for sentence_id, sentence in enumerate(sentences):
+            words = sentence.lower().split()
+            if n == 1:
+                ngrams.extend(words)
+                sentence_ids.extend([sentence_id] * len(words))
+                continue
+
+            for i in range(max(len(words) - n - 1, 0)):
+                ngrams.append(" ".join(words[i : i + n - 2]))
+                higher_order_ngrams.append(" ".join(words[i : i + n - 1]))
+                sentence_ids.append(sentence_id)
+
+        if not ngrams:
+            return np.zeros(len(sentences))
+
+        probabilities = self.probability_batch(
+            ngrams, higher_order_ngrams if n > 1 else None, n
+        )
+        return np.bincount(
+            sentence_ids, weights=probabilities, minlength=len(sentences)
+        )
+
+    @classmethod
+    def load(cls, model_folder: str, mmap: bool = True) -> CompactNGramMLE:
+        """Loads the model from a folder.
+
+        Args:
+            model_folder: Folder containing the model.
+            mmap: Whether to memory-map the arrays. Defaults to True.
+
+        Raises:
+            FileNotFoundError: If the model manifest is not found.
+            ValueError: If the model version is not supported.
+
+        Returns:
+            Loaded model.
+        """
+        manifest = cls.read_manifest(model_folder)
+        if manifest["version"] != MODEL_VERSION:
+            raise ValueError(
+                f"Unsupported MLE model version: {manifest['version']}"
+            )
+        mmap_mode = "r" if mmap else None
+
+        with open(os.path.join(model_folder, VOCABULARY_FILE), "r") as f:
+            vocabulary = json.load(f)
+        unigram_counts = np.load(
+            os.path.join(model_folder, UNIGRAM_COUNTS_FILE), mmap_mode=mmap_mode
+        )
+        ngram_keys = {}
+        ngram_counts = {}
+        for order in range(2, manifest["n"] + 1):
+            ngram_keys[order] = np.load(
+                os.path.join(model_folder, f"order_{order}_keys.npy"),
+                mmap_mode=mmap_mode,
+            )
+            ngram_counts[order] = np.load(
+                os.path.join(model_folder, f"order_{order}_counts.npy"),
+                mmap_mode=mmap_mode,
+            )
+
+        return cls(
+            manifest["n"],
+            manifest["total_words"],
+            vocabulary,
+            unigram_counts,
+            ngram_keys,
+            ngram_counts,
+        )
+
+    @staticmethod
+    def read_manifest(model_folder: str) -> Dict[str, Any]:
+        """Reads the manifest of a model.
+
+        Args:
+            model_folder: Folder containing the model.
+
+        Raises:
+            FileNotFoundError: If the model manifest is not found.
+
+        Returns:
+            Manifest of the model.
+        """
+        with open(os.path.join(model_folder, MANIFEST_FILE), "r") as f:
+            return json.load(f)
+
+    def save(self, model_folder: str) -> None:
+        """Saves the model to a folder.
+
+        Args:
+            model_folder: Folder to save the model.
+        """
+        os.makedirs(model_folder, exist_ok=True)
+        with open(os.path.join(model_folder, VOCABULARY_FILE), "w") as f:
+            json.dump(self.vocabulary, f)
+        np.save(
+            os.path.join(model_folder, UNIGRAM_COUNTS_FILE),
+            self.unigram_counts,
+        )
+        for order in range(2, self.n + 1):
+            np.save(
+                os.path.join(model_folder, f"order_{order}_keys.npy"),
+                self.ngram_keys[order],
+            )
+            np.save(
+                os.path.join(model_folder, f"order_{order}_counts.npy"),
+                self.ngram_counts[order],
+            )
+
+        manifest = {
+            "version": MODEL_VERSION,
+            "n": self.n,
+            "total_words": self.total_words,
+            "vocab_size": self.vocab_size,
+            "num_ngrams": {
+                order: len(keys) for order, keys in self.ngram_keys.items()
+            },
+        }
+        with open(os.path.join(model_folder, MANIFEST_FILE), "w") as f:
+            json.dump(manifest, f, indent=2)
+
+
+def load_mle_model(model_path: str) -> Union[NGramMLE, CompactNGramMLE]:
+    """Loads an MLE model, compact (folder) or pickled (file).
+
+    Args:
+        model_path: Path to the model folder or pickle file.
+
+    Returns:
+        Loaded model.
+    """
+    if os.path.isdir(model_path):
+        return CompactNGramMLE.load(model_path)
+    return NGramMLE.load(model_path)
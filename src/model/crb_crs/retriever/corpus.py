@@ -0,0 +1,109 @@
+"""Retrieval corpus of the CRB-CRS model.
+
+The corpus comprises the original dialogue utterances, one per line, prefixed
+with the participant (or conversation) they belong to, and two preprocessed
+versions of these utterances (with and without stopwords).
+"""
+
+import hashlib
+import os
+import re
+from typing import Dict, List
+
+import numpy as np
+from nltk.tokenize import word_tokenize
+
+CRS_PREFIX = "CRS~"
+USER_PREFIX = "USER~"
+CONV_PREFIX = "CONVERSATION~"
+
+ORIGINAL_CORPUS_FILE = "original_corpus.txt"
+CORPUS_FILES = {
+    "stopwords": "preprocessed_corpus.txt",
+    "no_stopwords": "preprocessed_corpus_no_stopwords.txt",
+}
+
+
+def read_corpus(corpus_folder: str, filename: str) -> List[str]:
+    """Reads the lines of a corpus file.
+
+    Args:
+        corpus_folder: Path to the folder containing the corpus files.
+        filename: Name of the corpus file.
+
+    Raises:
+        FileNotFoundError: If the corpus file is not found.
+
+    Returns:
+        List of corpus lines.
+    """
+    with open(os.path.join(corpus_folder, filename), "r") as f:
+        return f.read().splitlines()
+
+
+def hash_corpus(corpus_folder: str) -> str:
+    """Computes a hash of the corpus files.
+
+    Args:
+        corpus_folder: Path to the folder containing the corpus files.
+
+    Returns:
+        Hexadecimal SHA-256 digest of the corpus files.
+    """
+    digest = hashlib.sha256()
+    for filename in [ORIGINAL_CORPUS_FILE, *CORPUS_FILES.values()]:
+        digest.update(filename.encode("utf-8"))
+        with open(os.path.join(corpus_folder, filename), "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                digest.update(chunk)
+    return digest.hexdigest()
+
+
+def build_line_metadata(original_corpus: List[str]) -> Dict[str, np.ndarray]:
+    """Computes the static properties of the line following each corpus line.
+
+    A corpus line is matched against a query, the line that follows it is the
+    candidate response. The properties are the token length of the cleaned
+    candidate response and whether it is a CRS utterance replying to a user
+    utterance.
+
+    Args:
+        original_corpus: Lines of the original corpus.
+
+    Returns:
+        Dictionary with the `next_length` and `is_crs_reply` arrays.
+    """
+    num_lines = len(original_corpus)
+    next_length = np.zeros(num_lines, dtype=np.int32)
+    is_crs_reply = np.zeros(num_lines, dtype=bool)
+
+    for idx in range(num_lines - 1):
+        next_utterance = re.sub(
+            r"[^A-Za-z0-9~]+", " ", original_corpus[idx + 1]
+        ).strip()
+        next_length[idx] = len(
+            word_tokenize(next_utterance.split("~")[-1].strip())
+        )
+        is_crs_reply[idx] = (
+            CRS_PREFIX in next_utterance and USER_PREFIX in original_corpus[idx]
+        )
+
+    return {"next_length": next_length, "is_crs_reply": is_crs_reply}
+
+
+def build_candidate_mask(line_metadata: Dict[str, np.ndarray]) -> np.ndarray:
+    """Computes which corpus lines are valid matches for a query.
+
+    A corpus line is a valid match if the following line is a CRS reply to it
+    of 4 to 20 tokens.
+
+    Args:
+        line_metadata: Arrays returned by `build_line_metadata`.
+
+    Returns:
+        Boolean mask over the corpus lines.
+    """
+    next_length = line_metadata["next_length"]
+    return (
+        line_metadata["is_crs_reply"] & (next_length > 3) & (next_length <= 20)
+    )
@@ -76,6 +76,30 @@ class NGramMLE:
             / (self.ngrams[n - 1][ngram] + len(self.ngrams[1]))
         )
 
+    def probability_batch(
+        self,
+        ngrams: List[str],
+        higher_order_ngrams: List[str] = None,
+        n: int = 1,
+    ) -> List[float]:
+        """Computes maximum likelihood probabilities of several n-grams.
+
+        Args:
+            ngrams: List of n-grams.
+            higher_order_ngrams: List of higher order n-grams. Defaults to
+              empty strings.
+            n: n-gram order. Defaults to 1.
+
+        Returns:
+            List of maximum likelihood probabilities.
+        """
+        if higher_order_ngrams is None:
+            higher_order_ngrams = [""] * len(ngrams)
+        return [
+            self.probability(ngram, higher_order_ngram, n)
+            for ngram, higher_order_ngram in zip(ngrams, higher_order_ngrams)
+        ]
+
     def sentence_probability(self, sentence: str, n: int = 1) -> float:
         """Computes cumulative n-gram ML probability of a sentence.
 
@@ -105,6 +129,22 @@ class NGramMLE:
 
         return cumulative_prob
 
+    def sentence_probability_batch(
+        self, sentences: List[str], n: int = 1
+    ) -> List[float]:
+        """Computes cumulative n-gram ML probabilities of several sentences.
+
+        Args:
+            sentences: List of sentences.
+            n: n-gram order. Defaults to 1.
+
+        Returns:
+            List of cumulative n-gram maximum likelihood probabilities.
+        """
+        return [
+            self.sentence_probability(sentence, n) for sentence in sentences
+        ]
+
     @classmethod
     def load(cls, model_file: str) -> NGramMLE:
         """Loads the model from a file.
@@ -0,0 +1,273 @@
+"""Streaming n-gram counting for the MLE model of CRB-CRS.
+
+The corpus file (one word per line) is read in chunks that are counted in
+parallel by a pool of processes. A first pass counts the words to build the
+vocabulary, a second pass encodes the n-grams of each chunk as keys (see
+`encode_ngrams`) and counts them. Partial counts are merged as they arrive,
+so that memory is bounded by the number of distinct n-grams rather than by
+the size of the corpus. The result is a `CompactNGramMLE`.
+
+The words are the lines of the corpus file, exactly as returned by
+`NGramMLE._read_corpus`, i.e., including the empty word following a trailing
+newline.
+"""
+
+import logging
+import multiprocessing
+from collections import Counter, deque
+from multiprocessing.pool import Pool
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Tuple
+
+import numpy as np
+
+from src.model.crb_crs.retriever.compact_mle import (
+    CompactNGramMLE,
+    check_ngram_order,
+    encode_ngrams,
+    merge_ngram_counts,
+)
+
+Chunk = Tuple[List[str], List[str]]
+
+# Vocabulary and maximum order of the worker processes, set by
+# `_init_ngram_worker`.
+_worker_word_ids: Dict[str, int] = {}
+_worker_n: int = 1
+
+
+def read_word_chunks(corpus_file: str, chunk_size: int) -> Iterator[List[str]]:
+    """Reads the words of a corpus file in chunks.
+
+    Args:
+        corpus_file: File containing the corpus words, one per line.
+        chunk_size: Number of words per chunk.
+
+    Yields:
+        Chunks of consecutive words.
+    """
+    chunk = []
+    ends_with_newline = True
+    with open(corpus_file, "r") as f:
+        for line in f:
+            ends_with_newline = line.endswith("\n")
+            chunk.append(line[:-1] if ends_with_newline else line)
+            if len(chunk) == chunk_size:
+                yield chunk
+                chunk = []
+
+    # `str.split("\n")` yields an empty word after a trailing newline
+    if ends_with_newline:
+        chunk.append("")
+    if chunk:
+        yield chunk
+
+
+def _with_prefix(
+    chunks: Iterable[List[str]], prefix_length: int
+) -> Iterator[Chunk]:
+    """Pairs each chunk with the last words of the preceding chunks.
+
+    Args:
+        chunks: Chunks of consecutive words.
+        prefix_length: Number of preceding words to keep.
+
+    Yields:
+        Tuples of preceding words and chunk.
+    """
+    prefix = []
+    for chunk in chunks:
+        yield prefix, chunk
+        prefix = (prefix + chunk[-prefix_length:])[-prefix_length:]
+
+
+def _imap_bounded(
+    pool: Pool,
+    func: Callable,
+    iterable: Iterable,
+    max_pending: int,
+) -> Iterator[Any]:
+    """Maps a function over an iterable with a bounded number of pending tasks.
+
+    Unlike `Pool.imap`, the iterable is consumed lazily so that only
+    `max_pending` chunks are held in memory at once.
+
+    Args:
+        pool: Process pool.
+        func: Function to apply.
+        iterable: Inputs.
+        max_pending: Maximum number of submitted tasks without result.
+
+    Yields:
+        Results, in input order.
+    """
+    pending = deque()
+    for item in iterable:
+        pending.append(pool.apply_async(func, (item,)))
+        if len(pending) >= max_pending:
+            yield pending.popleft().get()
+    while pending:
+        yield pending.popleft().get()
+
+
+def _count_words(words: List[str]) -> Counter:
+    """Counts the words of a chunk."""
+    return Counter(words)
+
+
+def _init_ngram_worker(word_ids: Dict[str, int], n: int) -> None:
+    """Sets the vocabulary and maximum order of a worker process."""
+    global _worker_word_ids, _worker_n
+    _worker_word_ids = word_ids
+    _worker_n = n
+
+
+def _count_chunk_ngrams(
+    chunk: Chunk,
+) -> Dict[int, Tuple[np.ndarray, np.ndarray]]:
+    """Counts the n-grams (order 2 to n) ending in a chunk.
+
+    Args:
+        chunk: Preceding words and chunk.
+
+    Returns:
+        Sorted keys and counts per order.
+    """
+    prefix, words = chunk
+    ids = np.array(
+        [_worker_word_ids[word] for word in prefix + words], dtype=np.int64
+    )
+    vocab_size = len(_worker_word_ids)
+
+    counts = {}
+    for order in range(2, _worker_n + 1):
+        window_ids = ids[max(len(prefix) - order + 1, 0) :]
+        if len(window_ids) < order:
+            counts[order] = (
+                np.zeros(0, dtype=np.uint64),
+                np.zeros(0, dtype=np.int64),
+            )
+            continue
+        windows = np.lib.stride_tricks.sliding_window_view(window_ids, order)
+        counts[order] = np.unique(
+            encode_ngrams(windows, vocab_size), return_counts=True
+        )
+    return counts
+
+
+class _NGramCountMerger:
+    def __init__(self, merge_threshold: int) -> None:
+        """Initializes the merger of partial counts.
+
+        Args:
+            merge_threshold: Number of pending partial entries that triggers
+              a merge.
+        """
+        self.merge_threshold = merge_threshold
+        self.keys = []
+        self.counts = []
+        self.num_pending = 0
+
+    def add(self, keys: np.ndarray, counts: np.ndarray) -> None:
+        """Adds partial counts, merging them if needed."""
+        self.keys.append(keys)
+        self.counts.append(counts)
+        self.num_pending += len(keys)
+        if self.num_pending >= self.merge_threshold:
+            self.merge()
+
+    def merge(self) -> Tuple[np.ndarray, np.ndarray]:
+        """Merges all the counts added so far.
+
+        Returns:
+            Unique sorted keys and their counts.
+        """
+        keys, counts = merge_ngram_counts(
+            np.concatenate(self.keys or [np.zeros(0, dtype=np.uint64)]),
+            np.concatenate(self.counts or [np.zeros(0, dtype=np.int64)]),
+        )
+        self.keys = [keys]
+        self.counts = [counts]
+        # Merge again once at least as many new entries as merged ones are
+        # pending, which keeps the total merging cost linear.
+        self.num_pending = 0
+        self.merge_threshold = max(self.merge_threshold, len(keys))
+        return keys, counts
+
+
+def count_ngrams(
+    corpus_file: str,
+    n: int,
+    num_workers: int = None,
+    chunk_size: int = 1_000_000,
+    merge_threshold: int = 10_000_000,
+) -> CompactNGramMLE:
+    """Counts the n-grams of a corpus file with a pool of processes.
+
+    Args:
+        corpus_file: File containing the corpus words, one per line.
+        n: Maximum n-gram order.
+        num_workers: Number of worker processes. Defaults to the number of
+          CPUs.
+        chunk_size: Number of words per chunk. Defaults to 1,000,000.
+        merge_threshold: Number of pending partial entries per order that
+          triggers a merge. Defaults to 10,000,000.
+
+    Raises:
+        ValueError: If the n-grams cannot be encoded as 64-bit keys.
+
+    Returns:
+        Compact model with the n-gram counts.
+    """
+    num_workers = num_workers or multiprocessing.cpu_count()
+    max_pending = 2 * num_workers
+
+    # First pass: vocabulary (in order of first occurrence) and word counts
+    word_counts = Counter()
+    with multiprocessing.Pool(num_workers) as pool:
+        for chunk_counts in _imap_bounded(
+            pool,
+            _count_words,
+            read_word_chunks(corpus_file, chunk_size),
+            max_pending,
+        ):
+            word_counts.update(chunk_counts)
+    vocabulary = list(word_counts.keys())
+    word_ids = {word: idx for idx, word in enumerate(vocabulary)}
+    unigram_counts = np.array(
+        [word_counts[word] for word in vocabulary], dtype=np.int64
+    )
+    total_words = int(unigram_counts.sum())
+    logging.info(
+        f"Counted {total_words} words, vocabulary of {len(vocabulary)} words."
+    )
+    del word_counts
+
+    # Second pass: higher order n-grams
+    check_ngram_order(len(vocabulary), n)
+    mergers = {
+        order: _NGramCountMerger(merge_threshold) for order in range(2, n + 1)
+    }
+    if n > 1:
+        with multiprocessing.Pool(
+            num_workers,
+            initializer=_init_ngram_worker,
+            initargs=(word_ids, n),
+        ) as pool:
+            for chunk_counts in _imap_bounded(
+                pool,
+                _count_chunk_ngrams,
+                _with_prefix(read_word_chunks(corpus_file, chunk_size), n - 1),
+                max_pending,
+            ):
+                for order, (keys, counts) in chunk_counts.items():
+                    mergers[order].add(keys, counts)
+
+    ngram_keys = {}
+    ngram_counts = {}
+    for order, merger in mergers.items():
+        ngram_keys[order], ngram_counts[order] = merger.merge()
+        logging.info(f"Counted {len(ngram_keys[order])} {order}-grams.")
+
+    return CompactNGramMLE(
+        n, total_words, vocabulary, unigram_counts, ngram_keys, ngram_counts
+    )
@@ -2,39 +2,57 @@
 
 This component is responsible for retrieving the most relevant utterance from
 a set of pre-defined responses given a user query and a conversation history.
+Corpus lines are matched against the query either with the cosine similarity
+of their TF-IDF vectors (default) or with BM25 on an inverted index.
 """
 
 import itertools
 import math
 import os
-import re
-from typing import List
+import threading
+from typing import Dict, List, Optional, Union
 
+import numpy as np
 from nltk.tokenize import word_tokenize
-from nltk.util import ngrams
-from scipy import spatial
 from sent2vec.vectorizer import Vectorizer
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
 
+from src.model.crb_crs.retriever.bm25_index import BM25Index
+from src.model.crb_crs.retriever.candidate_embeddings import (
+    CandidateEmbeddings,
+    preprocess_candidate,
+)
+from src.model.crb_crs.retriever.compact_mle import CompactNGramMLE
+from src.model.crb_crs.retriever.corpus import (
+    CONV_PREFIX,
+    CORPUS_FILES,
+    CRS_PREFIX,
+    ORIGINAL_CORPUS_FILE,
+    USER_PREFIX,
+    build_candidate_mask,
+    build_line_metadata,
+    read_corpus,
+)
 from src.model.crb_crs.retriever.mle_model import NGramMLE
+from src.model.crb_crs.retriever.tfidf_index import TfidfIndex
 from src.model.crb_crs.utils_preprocessing import (
     get_preference_keywords,
-    preprocess_utterance,
+    get_preprocessor,
 )
 
-CRS_PREFIX = "CRS~"
-USER_PREFIX = "USER~"
-CONV_PREFIX = "CONVERSATION~"
+RETRIEVAL_BACKENDS = ["tfidf", "bm25"]
+CHIT_CHAT_TOKENS = frozenset(["thanks", "bye", "goodbye", "thank"])
 
 
 class Retriever:
     def __init__(
         self,
         corpus_folder: str,
-        mle_model: NGramMLE,
+        mle_model: Union[NGramMLE, CompactNGramMLE],
         dataset: str,
         domain: str,
+        index_folder: str = None,
+        embeddings_folder: str = None,
+        retrieval_backend: str = "tfidf",
     ) -> None:
         """Initializes the retriever.
 
@@ -43,72 +61,102 @@ class Retriever:
             mle_model: Maximum Likelihood Estimation (MLE) model.
             dataset: Dataset name.
             domain: Domain of the CRS.
+            index_folder: Path to the folder containing the retrieval index.
+              Defaults to the `index` subfolder of the corpus folder.
+            embeddings_folder: Path to the folder containing the precomputed
+              candidate embeddings. Defaults to the `embeddings` subfolder of
+              the corpus folder.
+            retrieval_backend: Scoring of the corpus lines, "tfidf" (cosine
+              similarity) or "bm25" (inverted index, stored in the `bm25`
+              subfolder of the index folder). Defaults to "tfidf".
 
         Raises:
             FileNotFoundError: If the corpus folder is not found.
+            ValueError: If the retrieval backend or the dataset is not
+              supported.
         """
         if not os.path.exists(corpus_folder):
             raise FileNotFoundError(
                 f"Corpus folder not found: {corpus_folder}"
             )
+        if retrieval_backend not in RETRIEVAL_BACKENDS:
+            raise ValueError(
+                f"Retrieval backend not supported: {retrieval_backend}"
+            )
 
         self.corpus_folder = corpus_folder
+        self.index_folder = index_folder or os.path.join(
+            corpus_folder, "index"
+        )
+        self.retrieval_backend = retrieval_backend
         self._create_vectorizers_and_vocabs()
         self.mle_model = mle_model
         self.dataset = dataset
         self.domain = domain
-        self.bert_vectorizer = Vectorizer()
+        # Keyword sets used to boost the rank of the candidates
+        self.item_context_tokens = frozenset(self._item_context())
+        self.preference_keywords = frozenset(get_preference_keywords(domain))
+        # The BERT vectorizer is only created if candidates have to be
+        # embedded online, i.e., without valid precomputed embeddings
+        self.bert_vectorizer = None
+        self._bert_vectorizer_lock = threading.Lock()
+        self.embeddings_folder = embeddings_folder or os.path.join(
+            corpus_folder, "embeddings"
+        )
+        self._load_candidate_embeddings()
 
-    def _load_original_corpus(self):
-        """Loads the original corpus.
+    def _load_candidate_embeddings(self) -> None:
+        """Loads the precomputed embeddings of the candidate responses.
 
-        Raises:
-            FileNotFoundError: If the original corpus file is not found.
+        The embeddings are only used if they were built from the current
+        corpus. Candidates are then mapped to their line in the corpus.
         """
-        with open(
-            os.path.join(self.corpus_folder, "original_corpus.txt"), "r"
-        ) as f:
-            self.original_corpus = f.read().splitlines()
+        self.candidate_embeddings = CandidateEmbeddings.load_if_valid(
+            self.embeddings_folder, self.index.corpus_hash, self.dataset
+        )
+        self.candidate_line_ids = {}
+        if self.candidate_embeddings is None:
+            return
 
-    def _load_preprocessed_corpora(self):
-        """Loads the preprocessed corpora (w/o stopwords).
+        for idx in np.flatnonzero(self.candidate_mask) + 1:
+            self.candidate_line_ids.setdefault(
+                self.original_corpus[idx], int(idx)
+            )
+
+    def _load_original_corpus(self):
+        """Loads the original corpus.
 
         Raises:
-            FileNotFoundError: If a preprocessed corpus file is not found.
+            FileNotFoundError: If the original corpus file is not found.
         """
-        with open(
-            os.path.join(self.corpus_folder, "preprocessed_corpus.txt"), "r"
-        ) as f:
-            self.preprocessed_corpus = f.read().splitlines()
-
-        with open(
-            os.path.join(
-                self.corpus_folder, "preprocessed_corpus_no_stopwords.txt"
-            ),
-            "r",
-        ) as f:
-            self.preprocessed_corpus_no_stopwords = f.read().splitlines()
+        self.original_corpus = read_corpus(
+            self.corpus_folder, ORIGINAL_CORPUS_FILE
+        )
 
     def _create_vectorizers_and_vocabs(self) -> None:
-        """Creates vectorizers for the retriever and builds the vocabularies.
+        """Loads the vectorizers for the retriever and the vocabularies.
 
-        The vectorizers are based on TF-IDF. Two vectorizers are created: one
-        with stopwords and one without stopwords.
+        The vectorizers are based on TF-IDF. Two vectorizers are used: one
+        with stopwords and one without stopwords. They are loaded from the
+        persisted index, which is (re)built if it does not match the corpus.
         """
-        # Load the original and preprocessed corpora
         self._load_original_corpus()
-        self._load_preprocessed_corpora()
 
-        self.vectorizer = TfidfVectorizer()
-        self.corpus_vocab = self.vectorizer.fit_transform(
-            self.preprocessed_corpus
+        self.index = TfidfIndex.load_or_build(
+            self.corpus_folder, self.index_folder
         )
-        self.vectorizer_no_stopwords = TfidfVectorizer()
-        self.corpus_no_stopwords_vocab = (
-            self.vectorizer_no_stopwords.fit_transform(
-                self.preprocessed_corpus_no_stopwords
+        self.vectorizer = self.index.vectorizers["stopwords"]
+        self.corpus_vocab = self.index.matrices["stopwords"]
+        self.vectorizer_no_stopwords = self.index.vectorizers["no_stopwords"]
+        self.corpus_no_stopwords_vocab = self.index.matrices["no_stopwords"]
+
+        self.candidate_mask = build_candidate_mask(self.index.line_metadata)
+
+        self.bm25_index = None
+        if self.retrieval_backend == "bm25":
+            self.bm25_index = BM25Index.load_or_build(
+                self.corpus_folder, os.path.join(self.index_folder, "bm25")
             )
-        )
 
     def retrieve_candidates(
         self, context: str, num_candidates: int = 5
@@ -122,52 +170,170 @@ class Retriever:
         Returns:
             List of retrieved candidates.
         """
-        candidates = []
-        if len(word_tokenize(context)) > 2:
-            context_vector = self.vectorizer_no_stopwords.transform([context])
-            cosine_matrix = cosine_similarity(
-                context_vector, self.corpus_no_stopwords_vocab
-            ).flatten()
-        else:
-            context_vector = self.vectorizer.transform([context])
-            cosine_matrix = cosine_similarity(
-                context_vector, self.corpus_vocab
-            ).flatten()
-
-        similar_utterances_indices = cosine_matrix.argsort()[:-100:-1]
-
-        for idx in similar_utterances_indices:
-            if idx < len(self.original_corpus) - 1:
-                try:
-                    retrieved_utterance = self.original_corpus[idx + 1]
-                    retrieved_utterance = re.sub(
-                        r"[^A-Za-z0-9~]+", " ", retrieved_utterance
+        return self.retrieve_candidates_batch([context], num_candidates)[0]
+
+    def retrieve_candidates_batch(
+        self, contexts: List[str], num_candidates: int = 5
+    ) -> List[List[str]]:
+        """Retrieves the most relevant candidates for several contexts.
+
+        Contexts with more than two tokens are matched against the corpus
+        without stopwords, the others against the corpus with stopwords. With
+        the TF-IDF backend, the queries of each group are stacked in a single
+        sparse matrix and scored with one multiplication against the corpus
+        matrix. With the BM25 backend, each query is evaluated on the inverted
+        index, among the corpus lines that are valid matches. As BM25 matches
+        no line when none of the query tokens is in the vocabulary, such
+        queries are scored with TF-IDF instead, which always retrieves
+        candidates.
+
+        Args:
+            contexts: Conversational contexts.
+            num_candidates: Number of candidates to retrieve per context.
+              Defaults to 5.
+
+        Returns:
+            List of retrieved candidates for each context.
+        """
+        candidates = [[] for _ in contexts]
+        groups = {True: [], False: []}
+        for i, context in enumerate(contexts):
+            groups[len(word_tokenize(context)) > 2].append(i)
+
+        for no_stopwords, indices in groups.items():
+            if not indices:
+                continue
+            if self.retrieval_backend == "bm25":
+                index = self.bm25_index.indices[
+                    "no_stopwords" if no_stopwords else "stopwords"
+                ]
+                for i in indices:
+                    matches, _ = index.search(
+                        contexts[i], num_candidates, self.candidate_mask
                     )
-                    retrieved_utterance = retrieved_utterance.strip()
-                except IndexError:
+                    candidates[i] = [
+                        self.original_corpus[idx + 1] for idx in matches
+                    ]
+                # Queries without BM25 matches fall back to TF-IDF
+                indices = [i for i in indices if not candidates[i]]
+                if not indices:
                     continue
+
+            if no_stopwords:
+                vectorizer = self.vectorizer_no_stopwords
+                corpus_matrix = self.corpus_no_stopwords_vocab
             else:
-                retrieved_utterance = self.original_corpus[idx]
+                vectorizer = self.vectorizer
+                corpus_matrix = self.corpus_vocab
 
-            len_retrieved_utterance = len(
-                word_tokenize(retrieved_utterance.split("~")[-1].strip())
+            context_vectors = vectorizer.transform(
+                [contexts[i] for i in indices]
             )
-
-            if (
-                not retrieved_utterance.__contains__(CRS_PREFIX)
-                or len_retrieved_utterance <= 3
-                or len_retrieved_utterance > 20
-            ):
-                continue
-            elif not self.original_corpus[idx].__contains__(USER_PREFIX):
-                continue
-            else:
-                candidates.append(self.original_corpus[idx + 1])
-                if len(candidates) == num_candidates:
-                    break
+            # Rows of the TF-IDF matrices are L2-normalized, the dot product
+            # is the cosine similarity.
+            cosine_matrix = (corpus_matrix @ context_vectors.T).toarray()
+            for column, i in enumerate(indices):
+                candidates[i] = self._select_candidates(
+                    cosine_matrix[:, column], num_candidates
+                )
 
         return candidates
 
+    def _select_candidates(
+        self, cosine_matrix: np.ndarray, num_candidates: int
+    ) -> List[str]:
+        """Selects the candidates following the most similar corpus lines.
+
+        Args:
+            cosine_matrix: Similarity between the query and each corpus line.
+            num_candidates: Number of candidates to retrieve.
+
+        Returns:
+            List of retrieved candidates.
+        """
+        # Only the 99 most similar lines are considered
+        num_similar = min(99, len(cosine_matrix))
+        similar_utterances_indices = np.argpartition(
+            -cosine_matrix, num_similar - 1
+        )[:num_similar]
+        similar_utterances_indices = similar_utterances_indices[
+            np.argsort(-cosine_matrix[similar_utterances_indices])
+        ]
+
+        matches = similar_utterances_indices[
+            self.candidate_mask[similar_utterances_indices]
+        ][:num_candidates]
+        return [self.original_corpus[idx + 1] for idx in matches]
+
+    def add_corpus_lines(
+        self,
+        lines: List[str],
+        preprocessed_lines: Dict[str, List[str]] = None,
+    ) -> None:
+        """Adds lines at the end of the corpus without rebuilding the index.
+
+        Only supported by the BM25 backend. The added lines are kept in
+        memory, they are not written to the corpus files.
+
+        Args:
+            lines: Original lines, with their participant (or conversation)
+              prefix.
+            preprocessed_lines: Preprocessed lines per corpus (see
+              CORPUS_FILES). Defaults to the lines preprocessed as in the
+              data preparation.
+
+        Raises:
+            ValueError: If the retrieval backend is not BM25.
+        """
+        if self.retrieval_backend != "bm25":
+            raise ValueError(
+                "Adding corpus lines is only supported by the BM25 backend."
+            )
+        if preprocessed_lines is None:
+            preprocessed_lines = self._preprocess_corpus_lines(lines)
+        self.bm25_index.add_lines(preprocessed_lines)
+
+        # The metadata of the last line depends on the line that follows it
+        num_lines = len(self.original_corpus)
+        self.original_corpus.extend(lines)
+        line_metadata = build_line_metadata(
+            self.original_corpus[max(num_lines - 1, 0) :]
+        )
+        self.candidate_mask = np.concatenate(
+            [
+                self.candidate_mask[: max(num_lines - 1, 0)],
+                build_candidate_mask(line_metadata),
+            ]
+        )
+
+    def _preprocess_corpus_lines(
+        self, lines: List[str]
+    ) -> Dict[str, List[str]]:
+        """Preprocesses original lines as in the data preparation.
+
+        Args:
+            lines: Original lines, with their participant (or conversation)
+              prefix.
+
+        Returns:
+            Preprocessed lines per corpus.
+        """
+        utterances = [
+            {"text": line.split("~", 1)[-1].strip()} for line in lines
+        ]
+        preprocessor = get_preprocessor()
+        preprocessed_lines = {}
+        for name in CORPUS_FILES:
+            preprocessed = preprocessor.preprocess_batch(
+                utterances, self.dataset, no_stopwords=name == "no_stopwords"
+            )
+            # Conversation headers are kept as is
+            preprocessed_lines[name] = [
+                line if line.startswith(CONV_PREFIX) else preprocessed_line
+                for line, preprocessed_line in zip(lines, preprocessed)
+            ]
+        return preprocessed_lines
+
     def build_query(self, context: List[str]) -> str:
         """Builds a query from the context.
 
@@ -206,24 +372,17 @@ class Retriever:
         num_valid_candidates = math.floor(
             len(candidate_pairs) / num_candidates
         )
-        candidate_pairs = list(map(list, candidate_pairs))
-        for i, (cand1, cand2) in enumerate(candidate_pairs):
-            processed_cand1 = preprocess_utterance(
-                {"text": cand1.split("~")[1].strip()},
-                dataset=self.dataset,
-                no_stopwords=False,
-            )
-            processed_cand2 = preprocess_utterance(
-                {"text": cand2.split("~")[1].strip()},
-                dataset=self.dataset,
-                no_stopwords=False,
+        if not candidate_pairs:
+            return []
+
+        distances = self._pairwise_cosine_distances(candidates)
+        rows, columns = np.triu_indices(len(candidates), k=1)
+        candidate_pairs = [
+            [cand1, cand2, round(float(distance), 4)]
+            for (cand1, cand2), distance in zip(
+                candidate_pairs, distances[rows, columns]
             )
-
-            self.bert_vectorizer.run([processed_cand1, processed_cand2])
-            vectors = self.bert_vectorizer.vectors
-            self.bert_vectorizer.vectors = []
-            distance = spatial.distance.cosine(vectors[0], vectors[1])
-            candidate_pairs[i].append(round(distance, 4))
+        ]
 
         # Sort the candidate pairs based on the similarity score
         candidate_pairs.sort(key=lambda x: x[-1], reverse=True)
@@ -234,6 +393,80 @@ class Retriever:
 
         return filtered_candidates
 
+    def _pairwise_cosine_distances(self, candidates: List[str]) -> np.ndarray:
+        """Computes the cosine distances between all pairs of candidates.
+
+        The precomputed candidate embeddings are used when available.
+        Otherwise, each unique candidate is preprocessed and embedded once, in
+        a single batch.
+
+        Args:
+            candidates: List of candidates.
+
+        Returns:
+            Matrix of cosine distances between candidates.
+        """
+        vectors = self._lookup_candidate_embeddings(candidates)
+        if vectors is None:
+            vectors = self._embed_candidates(candidates)
+        return 1.0 - vectors @ vectors.T
+
+    def _lookup_candidate_embeddings(
+        self, candidates: List[str]
+    ) -> Optional[np.ndarray]:
+        """Looks up the precomputed embeddings of candidates.
+
+        Args:
+            candidates: List of candidates.
+
+        Returns:
+            Normalized embeddings, None if any candidate has no precomputed
+            embedding.
+        """
+        if self.candidate_embeddings is None:
+            return None
+        try:
+            line_ids = [self.candidate_line_ids[c] for c in candidates]
+        except KeyError:
+            return None
+        return self.candidate_embeddings.lookup(line_ids)
+
+    def _embed_candidates(self, candidates: List[str]) -> np.ndarray:
+        """Embeds candidates online with the BERT vectorizer.
+
+        The vectorizer is created on first use.
+
+        Args:
+            candidates: List of candidates.
+
+        Returns:
+            Normalized embeddings.
+        """
+        processed_candidates = [
+            preprocess_candidate(candidate, self.dataset)
+            for candidate in candidates
+        ]
+        unique_positions = {
+            candidate: i
+            for i, candidate in enumerate(dict.fromkeys(processed_candidates))
+        }
+
+        # The vectorizer accumulates its vectors, it is used by one thread
+        # at a time
+        with self._bert_vectorizer_lock:
+            if self.bert_vectorizer is None:
+                self.bert_vectorizer = Vectorizer()
+            self.bert_vectorizer.run(list(unique_positions))
+            vectors = np.asarray(
+                self.bert_vectorizer.vectors, dtype=np.float64
+            )
+            self.bert_vectorizer.vectors = []
+
+        vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors[
+            [unique_positions[candidate] for candidate in processed_candidates]
+        ]
+
     def _item_context(self) -> List[str]:
         """Returns a list of words related to the item context.
 
@@ -252,7 +485,8 @@ class Retriever:
         """Ranks the candidates based on fluency score.
 
         The fluency score is computed with n-Gram (1-5) Maximum Likelihood
-        Probabilistic Language Model.
+        Probabilistic Language Model. Identical candidates are preprocessed,
+        tokenized, and scored once, in a single batch.
 
         Args:
             user_utterance_tokens: List of tokens from the user utterance.
@@ -261,93 +495,90 @@ class Retriever:
         Returns:
             Ranked list of candidates.
         """
-        ranked_candidates = []
+        if not candidates:
+            return []
+
+        texts = [candidate.split("~")[1].strip() for candidate in candidates]
+        unique_positions = {
+            text: i for i, text in enumerate(dict.fromkeys(texts))
+        }
+        processed_candidates = get_preprocessor().preprocess_batch(
+            [{"text": text} for text in unique_positions],
+            self.dataset,
+            no_stopwords=False,
+        )
+        candidate_tokens = [
+            word_tokenize(processed_candidate)
+            for processed_candidate in processed_candidates
+        ]
 
-        for candidate in candidates:
-            processed_candidate = preprocess_utterance(
-                {"text": candidate.split("~")[1].strip()},
-                dataset=self.dataset,
-                no_stopwords=False,
-            )
-            candidate_tokens = word_tokenize(processed_candidate)
-            bigrams = list(ngrams(candidate_tokens, 2))
-            probability = self.mle_model.probability(processed_candidate, n=2)
-            avg_score = probability / len(bigrams)
-            avg_score = self._update_candidate_rank_score(
-                avg_score, user_utterance_tokens, candidate_tokens
-            )
-            ranked_candidates.append((candidate, avg_score))
+        probabilities = np.asarray(
+            self.mle_model.probability_batch(processed_candidates, n=2),
+            dtype=np.float64,
+        )
+        num_bigrams = np.array(
+            [max(len(tokens) - 1, 0) for tokens in candidate_tokens]
+        )
+        with np.errstate(divide="ignore", invalid="ignore"):
+            avg_scores = probabilities / num_bigrams
+        avg_scores += self._candidate_rank_boosts(
+            user_utterance_tokens, candidate_tokens
+        )
 
-        ranked_candidates.sort(key=lambda x: x[1], reverse=True)
-        return [candidate[0] for candidate in ranked_candidates]
+        scores = avg_scores[[unique_positions[text] for text in texts]]
+        # Stable sort, candidates with equal scores keep their order
+        order = np.argsort(-scores, kind="stable")
+        return [candidates[i] for i in order]
 
-    def _update_candidate_rank_score(
+    def _candidate_rank_boosts(
         self,
-        avg_score: float,
         user_utterance_tokens: List[str],
-        candidate_tokens: List[str],
-    ):
-        """Updates the candidate rank score.
+        candidate_tokens: List[List[str]],
+    ) -> np.ndarray:
+        """Computes the boosts of the candidate rank scores.
 
-        The score is updated based on the presence of item context tokens,
+        The scores are boosted based on the presence of item context tokens,
         preference keywords, and chit-chat context tokens.
 
         Args:
-            avg_score: Average score from MLE.
             user_utterance_tokens: List of tokens from the user utterance.
-            candidate_tokens: List of tokens from the candidate utterance.
+            candidate_tokens: List of tokens of each candidate.
 
         Returns:
-            Updated average score.
+            Boost of each candidate.
         """
-        chit_chat_context = ["thanks", "bye", "goodbye", "thank"]
+        user_tokens = set(user_utterance_tokens)
+        if not CHIT_CHAT_TOKENS.isdisjoint(user_tokens):
+            return np.full(len(candidate_tokens), 2.0)
 
-        common_tokens_user_utterance = list(
-            set(user_utterance_tokens).intersection(self._item_context())
+        user_has_item_context = not self.item_context_tokens.isdisjoint(
+            user_tokens
         )
-        common_tokens_candidate = list(
-            set(candidate_tokens).intersection(self._item_context())
+        user_has_preference = not self.preference_keywords.isdisjoint(
+            user_tokens
         )
-        common_preference_tokens_user_utterance = list(
-            set(user_utterance_tokens).intersection(
-                get_preference_keywords(self.domain)
-            )
-        )
-        common_preference_tokens_candidate = list(
-            set(candidate_tokens).intersection(
-                get_preference_keywords(self.domain)
-            )
+        has_item_context = np.array(
+            [
+                not self.item_context_tokens.isdisjoint(tokens)
+                for tokens in candidate_tokens
+            ],
+            dtype=bool,
         )
-        common_chit_chat_tokens_user_utterance = list(
-            set(chit_chat_context).intersection(user_utterance_tokens)
+        has_preference = np.array(
+            [
+                not self.preference_keywords.isdisjoint(tokens)
+                for tokens in candidate_tokens
+            ],
+            dtype=bool,
         )
 
-        if len(common_chit_chat_tokens_user_utterance) > 0:
-            avg_score = avg_score + 2.0
-        else:
-            if (
-                len(common_tokens_user_utterance) > 0
-                and len(common_tokens_candidate) > 0
-            ):
-                # Item context tokens are present in both user and candidate
-                # utterances
-                avg_score = avg_score + 1.0
-            if (
-                len(common_tokens_user_utterance)
-                == len(common_tokens_candidate)
-                == 0
-            ):
-                # No item context tokens in both user and candidate utterances
-                avg_score = avg_score + 1.0
-
-            if (
-                len(common_preference_tokens_candidate) > 0
-                and len(common_preference_tokens_user_utterance) > 0
-            ):
-                # User and candidate utterances have common preference keywords
-                avg_score = avg_score + 5.0
-
-        return avg_score
+        # Item context tokens are present in both user and candidate
+        # utterances, or in none of them
+        boosts = (has_item_context == user_has_item_context).astype(float)
+        # User and candidate utterances have common preference keywords
+        if user_has_preference:
+            boosts += 5.0 * has_preference
+        return boosts
 
     def remove_utterance_prefix(self, utterance: str) -> str:
         """Removes the utterance prefix from the utterance.
@@ -0,0 +1,233 @@
+"""Persisted TF-IDF index for the retriever component of CRB-CRS.
+
+The index holds the fitted vocabularies, the IDF weights, and the sparse
+document matrices of the preprocessed corpora (with and without stopwords).
+It also holds the static metadata of the line following each corpus line,
+i.e., the candidate response. It is built once and saved to disk, the arrays
+are then memory-mapped when the retriever is initialized. The index is rebuilt
+if the corpus files changed since it was built.
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+import os
+from typing import Dict
+
+import numpy as np
+from scipy import sparse
+from sklearn.feature_extraction.text import TfidfVectorizer
+
+from src.model.crb_crs.retriever.corpus import (
+    CORPUS_FILES,
+    ORIGINAL_CORPUS_FILE,
+    build_line_metadata,
+    hash_corpus,
+    read_corpus,
+)
+
+INDEX_VERSION = 2
+MANIFEST_FILE = "manifest.json"
+
+
+def _restore_vectorizer(
+    vocabulary: Dict[str, int], idf: np.ndarray
+) -> TfidfVectorizer:
+    """Restores a fitted TF-IDF vectorizer from its vocabulary and IDF."""
+    vectorizer = TfidfVectorizer()
+    vectorizer.vocabulary_ = vocabulary
+    vectorizer.idf_ = idf
+    return vectorizer
+
+
+class TfidfIndex:
+    def __init__(
+        self,
+        vectorizers: Dict[str, TfidfVectorizer],
+        matrices: Dict[str, sparse.csr_matrix],
+        line_metadata: Dict[str, np.ndarray],
+        corpus_hash: str,
+    ) -> None:
+        """Initializes the index.
+
+        Args:
+            vectorizers: Fitted TF-IDF vectorizers per corpus.
+            matrices: TF-IDF document matrices per corpus.
+            line_metadata: Arrays with the metadata of the line following
+              each corpus line (see `build_line_metadata`).
+            corpus_hash: Hash of the corpus files the index is built from.
+        """
+        self.vectorizers = vectorizers
+        self.matrices = matrices
+        self.line_metadata = line_metadata
+        self.corpus_hash = corpus_hash
+        self.num_lines = len(line_metadata["next_length"])
+
+    @classmethod
+    def build(cls, corpus_folder: str) -> TfidfIndex:
+        """Fits the TF-IDF vectorizers on the preprocessed corpora.
+
+        Args:
+            corpus_folder: Path to the folder containing the corpus files.
+
+        Returns:
+            Built index.
+        """
+        vectorizers = {}
+        matrices = {}
+        for name, filename in CORPUS_FILES.items():
+            vectorizers[name] = TfidfVectorizer()
+            matrices[name] = sparse.csr_matrix(
+                vectorizers[name].fit_transform(
+                    read_corpus(corpus_folder, filename)
+                )
+            )
+
+        line_metadata = build_line_metadata(
+            read_corpus(corpus_folder, ORIGINAL_CORPUS_FILE)
+        )
+        return cls(
+            vectorizers, matrices, line_metadata, hash_corpus(corpus_folder)
+        )
+
+    def save(self, index_folder: str) -> None:
+        """Saves the index.
+
+        The CSR components of the document matrices are saved as separate
+        arrays so that they can be memory-mapped.
+
+        Args:
+            index_folder: Path to the folder to save the index.
+        """
+        os.makedirs(index_folder, exist_ok=True)
+        for name, vectorizer in self.vectorizers.items():
+            vocabulary = {
+                term: int(idx) for term, idx in vectorizer.vocabulary_.items()
+            }
+            with open(
+                os.path.join(index_folder, f"{name}_vocabulary.json"), "w"
+            ) as f:
+                json.dump(vocabulary, f)
+            np.save(
+                os.path.join(index_folder, f"{name}_idf.npy"), vectorizer.idf_
+            )
+
+            matrix = self.matrices[name]
+            for component in ["data", "indices", "indptr"]:
+                np.save(
+                    os.path.join(index_folder, f"{name}_{component}.npy"),
+                    getattr(matrix, component),
+                )
+
+        for name, array in self.line_metadata.items():
+            np.save(os.path.join(index_folder, f"{name}.npy"), array)
+
+        manifest = {
+            "version": INDEX_VERSION,
+            "corpus_hash": self.corpus_hash,
+            "num_lines": self.num_lines,
+            "shapes": {
+                name: list(matrix.shape)
+                for name, matrix in self.matrices.items()
+            },
+        }
+        with open(os.path.join(index_folder, MANIFEST_FILE), "w") as f:
+            json.dump(manifest, f, indent=2)
+
+    @classmethod
+    def load(cls, index_folder: str, mmap: bool = True) -> TfidfIndex:
+        """Loads the index.
+
+        Args:
+            index_folder: Path to the folder containing the index.
+            mmap: Whether to memory-map the arrays. Defaults to True.
+
+        Raises:
+            FileNotFoundError: If the index manifest is not found.
+
+        Returns:
+            Loaded index.
+        """
+        manifest = cls.read_manifest(index_folder)
+        mmap_mode = "r" if mmap else None
+
+        vectorizers = {}
+        matrices = {}
+        for name in CORPUS_FILES:
+            with open(
+                os.path.join(index_folder, f"{name}_vocabulary.json"), "r"
+            ) as f:
+                vocabulary = json.load(f)
+            idf = np.load(os.path.join(index_folder, f"{name}_idf.npy"))
+            vectorizers[name] = _restore_vectorizer(vocabulary, idf)
+
+            data, indices, indptr = [
+                np.load(
+                    os.path.join(index_folder, f"{name}_{component}.npy"),
+                    mmap_mode=mmap_mode,
+                )
+                for component in ["data", "indices", "indptr"]
+            ]
+            matrices[name] = sparse.csr_matrix(
+                (data, indices, indptr),
+                shape=tuple(manifest["shapes"][name]),
+                copy=False,
+            )
+
+        line_metadata = {
+            name: np.load(
+                os.path.join(index_folder, f"{name}.npy"), mmap_mode=mmap_mode
+            )
+            for name in ["next_length", "is_crs_reply"]
+        }
+
+        return cls(
+            vectorizers, matrices, line_metadata, manifest["corpus_hash"]
+        )
+
+    @staticmethod
+    def read_manifest(index_folder: str) -> Dict:
+        """Reads the manifest of an index.
+
+        Args:
+            index_folder: Path to the folder containing the index.
+
+        Raises:
+            FileNotFoundError: If the index manifest is not found.
+
+        Returns:
+            Manifest of the index.
+        """
+        with open(os.path.join(index_folder, MANIFEST_FILE), "r") as f:
+            return json.load(f)
+
+    @classmethod
+    def load_or_build(cls, corpus_folder: str, index_folder: str) -> TfidfIndex:
+        """Loads the index if it is up to date, otherwise builds and saves it.
+
+        Args:
+            corpus_folder: Path to the folder containing the corpus files.
+            index_folder: Path to the folder containing the index.
+
+        Returns:
+            Up to date index.
+        """
+        try:
+            manifest = cls.read_manifest(index_folder)
+        except FileNotFoundError:
+            manifest = {}
+
+        if (
+            manifest.get("version") == INDEX_VERSION
+            and manifest.get("corpus_hash") == hash_corpus(corpus_folder)
+        ):
+            return cls.load(index_folder)
+
+        logging.info(
+            f"Retrieval index in {index_folder} is missing or outdated, "
+            "building it."
+        )
+        index = cls.build(corpus_folder)
+        index.save(index_folder)
+        return index
@@ -1,5 +1,6 @@
 """Utility functions for data preprocessing."""
 
+import functools
 import json
 import re
 from typing import Any, Dict, List
@@ -11,6 +12,164 @@ from nltk.tokenize import word_tokenize
 nltk.download("stopwords")
 
 DEFAULT_ITEM_PLACEHOLDER = "ITEM_ID"
+CONTRACTIONS_PATH = "data/crb_crs/contractions.json"
+
+
+class UtterancePreprocessor:
+    def __init__(self, contractions_path: str = CONTRACTIONS_PATH) -> None:
+        """Initializes the preprocessor.
+
+        The contractions, the stopwords, and the regular expressions are
+        loaded and compiled once.
+
+        Args:
+            contractions_path: Path to the JSON file mapping contractions to
+              their full form. Defaults to CONTRACTIONS_PATH.
+        """
+        with open(contractions_path, "r") as f:
+            self.contractions = json.load(f)
+        # Stopwords of all the languages, as used to build the corpus.
+        self.stopwords = frozenset(stopwords.words())
+
+        # Whitespace-delimited words that are contractions, the longest
+        # contractions are tried first.
+        alternatives = "|".join(
+            re.escape(contraction)
+            for contraction in sorted(self.contractions, key=len, reverse=True)
+        )
+        self.contraction_pattern = re.compile(
+            rf"(?<!\S)(?:{alternatives})(?!\S)", re.IGNORECASE
+        )
+        self.movie_id_pattern = re.compile(r"@\S+")
+
+    def remove_stopwords(self, utterance: str) -> str:
+        """Removes stopwords from an utterance.
+
+        Args:
+            utterance: Input utterance.
+
+        Returns:
+            Utterance without stopwords.
+        """
+        return " ".join(
+            token
+            for token in word_tokenize(utterance)
+            if token not in self.stopwords
+        )
+
+    def expand_contractions(self, utterance: str) -> str:
+        """Expands contractions in an utterance.
+
+        Matching words are replaced one after the other, in order of
+        appearance.
+
+        Args:
+            utterance: Input utterance.
+
+        Returns:
+            Utterance with expanded contractions.
+        """
+        for word in self.contraction_pattern.findall(utterance):
+            utterance = utterance.replace(
+                word, self.contractions[word.lower()]
+            )
+        return utterance
+
+    def redial_replace_movie_ids(
+        self, utterance: str, movie_placeholder: str = DEFAULT_ITEM_PLACEHOLDER
+    ) -> str:
+        """Replaces movie ids with a placeholder in a ReDial utterance.
+
+        Args:
+            utterance: Input utterance.
+            movie_placeholder: Placeholder for movie id.
+
+        Returns:
+            Utterance with movie ids replaced by placeholder.
+        """
+        if "@" in utterance:
+            for movie_id in self.movie_id_pattern.findall(utterance):
+                utterance = utterance.replace(movie_id, movie_placeholder)
+        return utterance
+
+    def preprocess(
+        self,
+        utterance: Dict[str, Any],
+        dataset: str,
+        item_placeholder: str = DEFAULT_ITEM_PLACEHOLDER,
+        no_stopwords: bool = True,
+    ) -> str:
+        """Preprocesses an utterance.
+
+        See `preprocess_utterance` for details.
+
+        Args:
+            utterance: Input utterance.
+            dataset: Name of the origin dataset.
+            item_placeholder: Placeholder for item id.
+            no_stopwords: Whether to remove stopwords.
+
+        Raises:
+            ValueError: If dataset is not supported.
+
+        Returns:
+            Preprocessed utterance.
+        """
+        processed_utterance = utterance.get("text").lower().strip()
+
+        if dataset == "redial":
+            processed_utterance = self.redial_replace_movie_ids(
+                processed_utterance, item_placeholder
+            )
+        elif dataset == "opendialkg":
+            processed_utterance = opendialkg_replace_items(
+                processed_utterance,
+                utterance.get("items", []),
+                item_placeholder,
+            )
+        else:
+            raise ValueError(f"Dataset {dataset} not supported.")
+
+        processed_utterance = self.expand_contractions(processed_utterance)
+        if no_stopwords:
+            processed_utterance = self.remove_stopwords(processed_utterance)
+
+        if processed_utterance == "":
+            processed_utterance = "**"
+
+        return processed_utterance
+
+    def preprocess_batch(
+        self,
+        utterances: List[Dict[str, Any]],
+        dataset: str,
+        item_placeholder: str = DEFAULT_ITEM_PLACEHOLDER,
+        no_stopwords: bool = True,
+    ) -> List[str]:
+        """Preprocesses a batch of utterances.
+
+        Args:
+            utterances: Input utterances.
+            dataset: Name of the origin dataset.
+            item_placeholder: Placeholder for item id.
+            no_stopwords: Whether to remove stopwords.
+
+        Raises:
+            ValueError: If dataset is not supported.
+
+        Returns:
+            Preprocessed utterances.
+        """
+        return [
+            self.preprocess(utterance, dataset, item_placeholder, no_stopwords)
+            for utterance in utterances
+        ]
+
+
+@functools.lru_cache(maxsize=None)
+def get_preprocessor() -> UtterancePreprocessor:
+    """Returns the preprocessor shared within the process."""
+    return UtterancePreprocessor()
 
 
 def remove_stopwords(utterance: str) -> str:
@@ -22,11 +181,7 @@ def remove_stopwords(utterance: str) -> str:
     Returns:
         Utterance without stopwords.
     """
-    tokens = word_tokenize(utterance)
-    filtered_tokens = [
-        token for token in tokens if token not in stopwords.words()
-    ]
-    return " ".join(filtered_tokens)
+    return get_preprocessor().remove_stopwords(utterance)
 
 
 def expand_contractions(utterance: str) -> str:
@@ -38,11 +193,7 @@ def expand_contractions(utterance: str) -> str:
     Returns:
         Utterance with expanded contractions.
     """
-    contractions = json.load(open("data/crb_crs/contractions.json", "r"))
-    for word in utterance.split():
-        if word.lower() in contractions:
-            utterance = utterance.replace(word, contractions[word.lower()])
-    return utterance
+    return get_preprocessor().expand_contractions(utterance)
 
 
 def redial_replace_movie_ids(
@@ -57,12 +208,9 @@ def redial_replace_movie_ids(
     Returns:
         Utterance with movie ids replaced by placeholder.
     """
-    if "@" in utterance:
-        movie_ids = re.findall(r"@\S+", utterance)
-        if movie_ids:
-            for movie_id in movie_ids:
-                utterance = utterance.replace(movie_id, movie_placeholder)
-    return utterance
+    return get_preprocessor().redial_replace_movie_ids(
+        utterance, movie_placeholder
+    )
 
 
 def opendialkg_replace_items(
@@ -108,27 +256,9 @@ def preprocess_utterance(
     Returns:
         Preprocessed utterance.
     """
-    processed_utterance = utterance.get("text").lower().strip()
-
-    if dataset == "redial":
-        processed_utterance = redial_replace_movie_ids(
-            processed_utterance, item_placeholder
-        )
-    elif dataset == "opendialkg":
-        processed_utterance = opendialkg_replace_items(
-            processed_utterance, utterance.get("items", []), item_placeholder
-        )
-    else:
-        raise ValueError(f"Dataset {dataset} not supported.")
-
-    processed_utterance = expand_contractions(processed_utterance)
-    if no_stopwords:
-        processed_utterance = remove_stopwords(processed_utterance)
-
-    if processed_utterance == "":
-        processed_utterance = "**"
-
-    return processed_utterance
+    return get_preprocessor().preprocess(
+        utterance, dataset, item_placeholder, no_stopwords
+    )
 
 
 def get_preference_keywords(domain: str) -> List[str]:
@@ -1,5 +1,7 @@
+import logging
 import sys
-from typing import Any, Dict, List, Tuple
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Tuple, Union
 
 sys.path.append("..")
 
@@ -17,11 +19,19 @@ name2class = {
     "crbcrs": CRBCRSModel,
 }
 
+# Number of threads generating the responses of a batch for the models
+# without a batched entry point
+MAX_RESPONSE_WORKERS = 8
+
 
 class CRSModel:
     def __init__(self, crs_model, *args, **kwargs) -> None:
         model_class = name2class[crs_model]
         self.crs_model = model_class(*args, **kwargs)
+        # Threads are only started by the first batch
+        self._executor = ThreadPoolExecutor(
+            max_workers=MAX_RESPONSE_WORKERS, thread_name_prefix="crs-model"
+        )
 
     def get_rec(self, conv_dict: Dict[str, Any]):
         """Generates recommendations given a conversation context."""
@@ -54,6 +64,55 @@ class CRSModel:
             conv_dict, id2entity, options, state, **kwargs
         )
 
+    def get_response_batch(
+        self,
+        conv_dicts: List[Dict[str, Any]],
+        id2entity: Dict[int, str],
+        options: Tuple[str, Dict[str, str]],
+        states: List[List[float]],
+        **kwargs
+    ) -> List[Union[Tuple[str, List[float]], Exception]]:
+        """Generates responses for several conversation contexts.
+
+        Models without a batched entry point generate the responses on a pool
+        of threads, which overlaps the requests of I/O-bound models (e.g.,
+        ChatGPT) as the threaded Flask server does. The error raised for a
+        conversation is returned in place of its response, the other
+        conversations are not affected.
+
+        Args:
+            conv_dicts: Conversation contexts.
+            id2entity: Mapping from entity id to entity name.
+            options: Prompt with options and dictionary of options.
+            states: State of the option choices per conversation.
+
+        Returns:
+            Generated response and updated state, or error, per conversation.
+        """
+        if hasattr(self.crs_model, "get_response_batch"):
+            return self.crs_model.get_response_batch(
+                conv_dicts, id2entity, options, states, **kwargs
+            )
+        futures = [
+            self._executor.submit(
+                self.crs_model.get_response,
+                conv_dict,
+                id2entity,
+                options,
+                state,
+                **kwargs,
+            )
+            for conv_dict, state in zip(conv_dicts, states)
+        ]
+        responses = []
+        for future in futures:
+            try:
+                responses.append(future.result())
+            except Exception as e:
+                logging.error(f"Error while generating a response: {e}")
+                responses.append(e)
+        return responses
+
     def get_choice(self, gen_inputs, option, state, conv_dict=None):
         """Generates a choice between options given a conversation context."""
         return self.crs_model.get_choice(gen_inputs, option, state, conv_dict)
@@ -665,30 +665,78 @@ class PromptGPT2forCRS(GPT2PreTrainedModel):
     def set_output_embeddings(self, new_embeddings):
         self.lm_head = new_embeddings
 
+    def generate(self, *args, prompt_embeds=None, fold_prompt=True, **kwargs):
+        """Generates sequences conditioned on the soft prompt.
+
+        The projected prompt key/values (layer_num, 2, batch_size, head_num,
+        prompt_len, head_dim) do not depend on the generated tokens. When
+        `fold_prompt` is set, they are inserted once into `past_key_values`
+        before decoding so that every step only attends over the cache.
+        Otherwise, the prompt is passed to every decoding step.
+        """
+        if prompt_embeds is not None:
+            if fold_prompt:
+                kwargs["past_key_values"] = tuple(
+                    (layer_prompt[0], layer_prompt[1])
+                    for layer_prompt in prompt_embeds
+                )
+                kwargs["prompt_len"] = prompt_embeds.shape[-2]
+                kwargs["use_cache"] = True
+            else:
+                kwargs["prompt_embeds"] = prompt_embeds
+        return super().generate(*args, **kwargs)
+
     def prepare_inputs_for_generation(
-        self, input_ids, past=None, prompt_embeds=None, **kwargs
+        self,
+        input_ids,
+        past_key_values=None,
+        prompt_embeds=None,
+        prompt_len=0,
+        **kwargs,
     ):
-        token_type_ids = kwargs.get("token_type_ids", None)
-        # only last token for inputs_ids if past is defined in kwargs
-        if past:
-            input_ids = input_ids[:, -1].unsqueeze(-1)
-            if token_type_ids is not None:
-                token_type_ids = token_type_ids[:, -1].unsqueeze(-1)
+        # Older versions of transformers name the cache `past`
+        if past_key_values is None:
+            past_key_values = kwargs.get("past", None)
+        if prompt_embeds is not None:
+            prompt_len = prompt_embeds.shape[-2]
 
+        token_type_ids = kwargs.get("token_type_ids", None)
         attention_mask = kwargs.get("attention_mask", None)
         position_ids = kwargs.get("position_ids", None)
+        fold_prompt = prompt_embeds is None and prompt_len > 0
+        if fold_prompt and attention_mask is None:
+            attention_mask = input_ids.new_ones(input_ids.shape)
 
         if attention_mask is not None and position_ids is None:
             # create position_ids on the fly for batch generation
             position_ids = attention_mask.long().cumsum(-1) - 1
             position_ids.masked_fill_(attention_mask == 0, 1)
-            if past:
-                position_ids = position_ids[:, -1].unsqueeze(-1)
         else:
-            position_ids = None
+            # positions are counted over the context only, not the prompt
+            position_ids = torch.arange(
+                input_ids.shape[-1], dtype=torch.long, device=input_ids.device
+            ).expand(input_ids.shape[0], -1)
+
+        # only the tokens that are not in the cache yet are fed to the model
+        if past_key_values is not None:
+            past_length = past_key_values[0][0].shape[-2] - prompt_len
+            input_ids = input_ids[:, past_length:]
+            position_ids = position_ids[:, past_length:]
+            if token_type_ids is not None:
+                token_type_ids = token_type_ids[:, past_length:]
+
+        if fold_prompt:
+            # the prompt is in the cache, its key/values are always attended
+            prompt_attention_mask = attention_mask.new_ones(
+                (attention_mask.shape[0], prompt_len)
+            )
+            attention_mask = torch.cat(
+                [prompt_attention_mask, attention_mask], dim=-1
+            )
+
         return {
             "input_ids": input_ids,
-            "past_key_values": past,
+            "past_key_values": past_key_values,
             "prompt_embeds": prompt_embeds,
             "use_cache": kwargs.get("use_cache"),
             "position_ids": position_ids,
@@ -0,0 +1,420 @@
+"""Asynchronous ASGI server to interact with CRS models.
+
+The server follows the protocol of the Flask server of `script/serve_model.py`
+(GET to check that the model is running, POST with a message to get a
+response) but handles concurrent sessions: the requests are micro-batched and
+the models run on a worker thread, see `MicroBatcher`. A request names the
+model to route it to, among the models of a `ModelPool`, or is served by the
+default model.
+
+Each response carries a session id, also set as a cookie, that the client
+sends back (in the JSON body or as cookie). The conversation is kept in a
+server-side session store, so the requests of a session only need to carry
+the new message. Models that are not loaded are loaded on a separate thread,
+so that only the requests of the model being loaded wait for it. The app is a
+plain ASGI callable, it can be run by any ASGI
+server, e.g., `uvicorn.run(CRSAsyncServer(...), ...)`.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from http.cookies import SimpleCookie
+from typing import Any, Awaitable, Callable, Dict, List, Tuple
+
+from src.serving.conversation import (
+    add_response,
+    get_dataset_resources,
+    update_session,
+)
+from src.serving.micro_batcher import (
+    DEFAULT_MAX_BATCH_SIZE,
+    DEFAULT_MAX_DELAY,
+    MicroBatcher,
+)
+from src.serving.model_pool import ModelPool, PooledModel
+from src.serving.session_store import InMemorySessionStore, SessionStore
+
+SESSION_COOKIE = "crs_session"
+
+logger = logging.getLogger(__name__)
+
+Scope = Dict[str, Any]
+Receive = Callable[[], Awaitable[Dict[str, Any]]]
+Send = Callable[[Dict[str, Any]], Awaitable[None]]
+
+
+class CRSAsyncServer:
+    def __init__(
+        self,
+        model_pool: ModelPool,
+        default_model: str = None,
+        max_batch_size: int = DEFAULT_MAX_BATCH_SIZE,
+        max_batch_delay: float = DEFAULT_MAX_DELAY,
+        session_store: SessionStore = None,
+    ) -> None:
+        """Initializes CRS ASGI server.
+
+        Args:
+            model_pool: Pool of the CRS models to serve.
+            default_model: Name of the model serving the requests that do not
+              name one. Defaults to None, i.e., requests must name a model.
+            max_batch_size: Maximum number of requests per batch. Defaults to
+              DEFAULT_MAX_BATCH_SIZE.
+            max_batch_delay: Maximum time in seconds a request waits for a
+              batch to fill. Defaults to DEFAULT_MAX_DELAY.
+            session_store: Store of the conversation sessions. Defaults to
+              None, i.e., an in-memory store.
+        """
+        self.model_pool = model_pool
+        self.default_model = default_model
+
+        # Conversation sessions
+        if session_store is None:
+            session_store = InMemorySessionStore()
+        self.session_store = session_store
+
+        self.batcher = MicroBatcher(
+            self._get_responses, max_batch_size, max_batch_delay
+        )
+        self._loader: ThreadPoolExecutor = None
+
+    async def startup(self) -> None:
+        """Starts the micro-batcher and the model loader."""
+        if self._loader is None:
+            self._loader = ThreadPoolExecutor(
+                max_workers=1, thread_name_prefix="model-loader"
+            )
+        await self.batcher.start()
+
+    async def shutdown(self) -> None:
+        """Stops the micro-batcher and the model loader."""
+        await self.batcher.stop()
+        if self._loader is not None:
+            self._loader.shutdown(wait=True)
+            self._loader = None
+
+    async def __call__(
+        self, scope: Scope, receive: Receive, send: Send
+    ) -> None:
+        """Handles an ASGI connection.
+
+        Args:
+            scope: Connection scope.
+            receive: Awaitable to receive events.
+            send: Awaitable to send events.
+        """
+        if scope["type"] == "lifespan":
+            await self._handle_lifespan(receive, send)
+        elif scope["type"] == "http":
+            status, headers, body = await self.receive_message(scope, receive)
+            await send(
+                {
+                    "type": "http.response.start",
+                    "status": status,
+                    "headers": headers,
+                }
+            )
+            await send({"type": "http.response.body", "body": body})
+
+    async def _handle_lifespan(self, receive: Receive, send: Send) -> None:
+        """Handles the startup and shutdown events of the ASGI server.
+
+        Args:
+            receive: Awaitable to receive events.
+            send: Awaitable to send events.
+        """
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                await self.startup()
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                await self.shutdown()
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    async def receive_message(
+        self, scope: Scope, receive: Receive
+    ) -> Tuple[int, List[Tuple[bytes, bytes]], bytes]:
+        """Receives a message and returns a response.
+
+        Args:
+            scope: Connection scope.
+            receive: Awaitable to receive events.
+
+        Returns:
+            Status code, headers, and body of the response.
+        """
+        if scope["method"] == "GET":
+            return _text_response("Model is running.", 200)
+        if scope["method"] != "POST":
+            return _text_response("Method not allowed.", 405)
+
+        try:
+            sender_data = json.loads(await _read_body(receive))
+            if not isinstance(sender_data, dict):
+                raise ValueError("Invalid sender data. Expected an object.")
+        except ValueError as e:
+            logger.error(f"Error occurred: {e}")
+            return _text_response(
+                "The request body must be a JSON object.", 400
+            )
+        logger.debug(f"Received user request:\n{sender_data}")
+
+        session_id = sender_data.get("session_id") or _get_cookie(
+            scope, SESSION_COOKIE
+        )
+        if not session_id:
+            session_id = uuid.uuid4().hex
+
+        try:
+            model = await self._get_model(sender_data)
+            response = await self.batcher.submit(
+                (session_id, sender_data, model)
+            )
+        except ValueError as e:
+            logger.error(f"Error occurred: {e}")
+            return _text_response(
+                "An error occurred, make sure you have provided the message"
+                " and the name of a served model.",
+                400,
+            )
+        except Exception as e:
+            logger.error(f"Error occurred: {e}")
+            return _text_response("An internal error occurred.", 500)
+
+        logger.debug(f"Generated response: {response}")
+        status, headers, body = _json_response(
+            {"response": response, "session_id": session_id}, 200
+        )
+        headers.append(
+            (
+                b"set-cookie",
+                f"{SESSION_COOKIE}={session_id}; Path=/; HttpOnly".encode(),
+            )
+        )
+        return status, headers, body
+
+    async def _get_model(self, sender_data: Dict[str, Any]) -> PooledModel:
+        """Gets the model of a request, loading it if needed.
+
+        Models are loaded on the loader thread rather than on the worker
+        thread of the micro-batcher, which keeps serving the loaded models
+        in the meantime.
+
+        Args:
+            sender_data: Data sent by the sender.
+
+        Raises:
+            ValueError: If the request names no model and there is no default
+              model, or the model is not available.
+
+        Returns:
+            Model.
+        """
+        model_name = sender_data.get("model") or self.default_model
+        if model_name is None:
+            raise ValueError("Invalid sender data. Missing model.")
+        model = self.model_pool.get_loaded(model_name)
+        if model is None:
+            model = await asyncio.get_running_loop().run_in_executor(
+                self._loader, self.model_pool.get, model_name
+            )
+        return model
+
+    def _get_responses(
+        self, requests: List[Tuple[str, Dict[str, Any], PooledModel]]
+    ) -> List[Any]:
+        """Generates the responses of a batch of requests.
+
+        Runs on the worker thread of the micro-batcher. Entity linking is
+        done here, rather than in the event loop, as it is blocking. Requests
+        of the same session are processed one after the other, in order of
+        arrival, so that each sees the response to the previous one. The
+        requests are grouped by model.
+
+        Args:
+            requests: Session id, sender data, and model of each request.
+
+        Returns:
+            Response of each request, or the error raised while processing
+            it. The errors raised by the models are wrapped in a
+            RuntimeError, so that they are not reported as invalid requests.
+        """
+        results: List[Any] = [None] * len(requests)
+        remaining = list(range(len(requests)))
+        while remaining:
+            indices_per_model: Dict[PooledModel, List[int]] = {}
+            postponed, session_keys = [], set()
+            for i in remaining:
+                session_id, _, model = requests[i]
+                session_key = f"{model.name}/{session_id}"
+                if session_key in session_keys:
+                    postponed.append(i)
+                    continue
+                session_keys.add(session_key)
+                indices_per_model.setdefault(model, []).append(i)
+
+            for model, indices in indices_per_model.items():
+                # An error only fails the requests of this model
+                try:
+                    self._get_session_responses(
+                        model, requests, indices, results
+                    )
+                except Exception as e:
+                    logger.error(
+                        f"Error while processing requests of model "
+                        f"{model.name}: {e}"
+                    )
+                    for i in indices:
+                        if results[i] is None:
+                            results[i] = _model_error(model.name, e)
+            remaining = postponed
+        return results
+
+    def _get_session_responses(
+        self,
+        model: PooledModel,
+        requests: List[Tuple[str, Dict[str, Any], PooledModel]],
+        indices: List[int],
+        results: List[Any],
+    ) -> None:
+        """Generates the responses of a model to requests of distinct sessions.
+
+        The sessions are stored only for the requests that get a response,
+        i.e., not if generating the responses raises an error.
+
+        Args:
+            model: Model of the requests.
+            requests: Session id, sender data, and model of each request.
+            indices: Indices of the requests to process.
+            results: Results of the requests, updated in place.
+        """
+        dataset = get_dataset_resources(model.kg_dataset)
+        sessions, conversation_dicts, states = {}, [], []
+        for i in indices:
+            session_id, sender_data, _ = requests[i]
+            session = self.session_store.get_or_create(
+                f"{model.name}/{session_id}"
+            )
+            try:
+                conversation_dict = update_session(
+                    session,
+                    sender_data,
+                    dataset.entity_list,
+                    len(dataset.options[1]),
+                )
+            except ValueError as e:
+                results[i] = e
+                continue
+            sessions[i] = session
+            states.append(conversation_dict.pop("state"))
+            conversation_dicts.append(conversation_dict)
+
+        if not conversation_dicts:
+            return
+        responses = model.crs_model.get_response_batch(
+            conversation_dicts,
+            dataset.id2entity,
+            dataset.options,
+            states,
+            **model.response_generation_args,
+        )
+        for (i, session), result in zip(sessions.items(), responses):
+            if isinstance(result, Exception):
+                results[i] = _model_error(model.name, result)
+                continue
+            response, new_state = result
+            add_response(session, response, new_state, dataset.entity_list)
+            self.session_store.put(session)
+            results[i] = response
+
+
+async def _read_body(receive: Receive) -> bytes:
+    """Reads the body of an HTTP request.
+
+    Args:
+        receive: Awaitable to receive events.
+
+    Returns:
+        Body of the request.
+    """
+    body = b""
+    more_body = True
+    while more_body:
+        message = await receive()
+        body += message.get("body", b"")
+        more_body = message.get("more_body", False)
+    return body
+
+
+def _get_cookie(scope: Scope, name: str) -> str:
+    """Gets the value of a cookie of an HTTP request.
+
+    Args:
+        scope: Connection scope.
+        name: Name of the cookie.
+
+    Returns:
+        Value of the cookie, None if it is not set.
+    """
+    for header, value in scope.get("headers", []):
+        if header == b"cookie":
+            cookie = SimpleCookie(value.decode("latin-1"))
+            if name in cookie:
+                return cookie[name].value
+    return None
+
+
+def _model_error(model_name: str, error: Exception) -> RuntimeError:
+    """Wraps an error raised by a model while generating a response.
+
+    Args:
+        model_name: Model name.
+        error: Error raised by the model.
+
+    Returns:
+        Error to report for the request.
+    """
+    model_error = RuntimeError(f"Error of model {model_name}: {error}")
+    model_error.__cause__ = error
+    return model_error
+
+
+def _text_response(
+    text: str, status: int
+) -> Tuple[int, List[Tuple[bytes, bytes]], bytes]:
+    """Creates a plain text response.
+
+    Args:
+        text: Text of the response.
+        status: Status code.
+
+    Returns:
+        Status code, headers, and body of the response.
+    """
+    return status, [(b"content-type", b"text/plain; charset=utf-8")], (
+        text.encode()
+    )
+
+
+def _json_response(
+    data: Dict[str, Any], status: int
+) -> Tuple[int, List[Tuple[bytes, bytes]], bytes]:
+    """Creates a JSON response.
+
+    Args:
+        data: Data of the response.
+        status: Status code.
+
+    Returns:
+        Status code, headers, and body of the response.
+    """
+    return status, [(b"content-type", b"application/json")], (
+        json.dumps(data).encode()
+    )
@@ -0,0 +1,149 @@
+"""Conversation dictionaries built from the requests sent to a CRS server.
+
+The conversation is kept server-side in a session (see `session_store.py`),
+so a request only needs to carry the new message. Entities are linked once
+per utterance, when the utterance is added to the session.
+"""
+
+import json
+from functools import lru_cache
+from typing import Any, Dict, List
+
+from src.model.utils import get_entity, get_options
+from src.serving.session_store import ConversationSession
+
+
+class DatasetResources:
+    def __init__(self, kg_dataset: str) -> None:
+        """Loads the entities and options of a dataset.
+
+        Args:
+            kg_dataset: Name of knowledge graph dataset.
+        """
+        self.kg_dataset = kg_dataset
+
+        # Load entity data
+        with open(
+            f"data/{kg_dataset}/entity2id.json", "r", encoding="utf-8"
+        ) as f:
+            self.entity2id = json.load(f)
+
+        self.id2entity = {int(v): k for k, v in self.entity2id.items()}
+        self.entity_list = list(self.entity2id.keys())
+
+        # Get options
+        self.options = get_options(kg_dataset)
+
+
+@lru_cache(maxsize=None)
+def get_dataset_resources(kg_dataset: str) -> DatasetResources:
+    """Returns the entities and options of a dataset, loaded once.
+
+    Args:
+        kg_dataset: Name of knowledge graph dataset.
+
+    Returns:
+        Dataset resources.
+    """
+    return DatasetResources(kg_dataset)
+
+
+def add_utterance(
+    session: ConversationSession, utterance: str, entity_list: List[str]
+) -> None:
+    """Adds an utterance to a session and links its entities.
+
+    Args:
+        session: Session.
+        utterance: Utterance.
+        entity_list: Names of the entities to link.
+    """
+    session.context.append(utterance)
+    session.entities.append(get_entity(utterance, entity_list))
+
+
+def update_session(
+    session: ConversationSession,
+    sender_data: Dict[str, Any],
+    entity_list: List[str],
+    num_options: int,
+) -> Dict[str, Any]:
+    """Adds the new message to a session and creates conversation dictionary.
+
+    The sender data contains the new message and, optionally, the context.
+    The context is only needed for clients that do not rely on the session:
+    if the context of the session is a prefix of it, only the utterances
+    after the prefix are added; otherwise, the conversation of the session is
+    replaced.
+
+    The conversation dictionary contains the following keys: context,
+    entity, rec, resp, template, and state. Context is a list of the
+    previous utterances, entity is a list of entities mentioned in the
+    conversation, rec is the recommended items, resp is the response
+    generated by the model, and state is the state of the options.
+    Note that rec, resp, and template are empty as the model is used for
+    inference only, they are kept for compatibility with the models.
+
+    Args:
+        session: Session.
+        sender_data: Data sent by the sender.
+        entity_list: Names of the entities to link.
+        num_options: Number of options.
+
+    Raises:
+        ValueError: If message is not present in sender data or context is
+          not a list.
+
+    Returns:
+        Conversation dictionary.
+    """
+    if "message" not in sender_data:
+        raise ValueError("Invalid sender data. Missing message.")
+    context = sender_data.get("context")
+    if context is not None and not isinstance(context, list):
+        raise ValueError("Invalid sender data. Context must be a list.")
+
+    new_utterances = [sender_data["message"]]
+    if context is not None:
+        num_known = len(session.context)
+        if context[:num_known] != session.context:
+            session.reset()
+            num_known = 0
+        new_utterances = context[num_known:] + new_utterances
+
+    for utterance in new_utterances:
+        add_utterance(session, utterance, entity_list)
+
+    if session.state is None or len(session.state) != num_options:
+        session.state = [0.0] * num_options
+
+    return {
+        "context": list(session.context),
+        "entity": [
+            entity
+            for utterance_entities in session.entities
+            for entity in utterance_entities
+        ],
+        "rec": [],
+        "resp": "",
+        "template": [],
+        "state": session.state,
+    }
+
+
+def add_response(
+    session: ConversationSession,
+    response: str,
+    state: List[float],
+    entity_list: List[str],
+) -> None:
+    """Adds the response of the model to a session.
+
+    Args:
+        session: Session.
+        response: Generated response.
+        state: Updated state of the options.
+        entity_list: Names of the entities to link.
+    """
+    add_utterance(session, response, entity_list)
+    session.state = state
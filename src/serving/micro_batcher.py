@@ -0,0 +1,174 @@
+"""Micro-batching of concurrent requests.
+
+Requests submitted from the event loop are queued and dispatched in batches
+to a batch function that runs on a single worker thread, so that the event
+loop keeps accepting requests while the model runs. A batch is dispatched as
+soon as it holds `max_batch_size` items or its oldest item has waited
+`max_delay` seconds.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Deque, List, Sequence, Tuple
+
+DEFAULT_MAX_BATCH_SIZE = 8
+DEFAULT_MAX_DELAY = 0.005
+
+logger = logging.getLogger(__name__)
+
+
+class MicroBatcher:
+    def __init__(
+        self,
+        batch_fn: Callable[[List[Any]], Sequence[Any]],
+        max_batch_size: int = DEFAULT_MAX_BATCH_SIZE,
+        max_delay: float = DEFAULT_MAX_DELAY,
+    ) -> None:
+        """Initializes the micro-batcher.
+
+        Args:
+            batch_fn: Function that takes a list of items and returns one
+              result per item. A result that is an exception is raised to the
+              submitter of the item instead of being returned.
+            max_batch_size: Maximum number of items per batch. Defaults to
+              DEFAULT_MAX_BATCH_SIZE.
+            max_delay: Maximum time in seconds an item waits for a batch to
+              fill. Defaults to DEFAULT_MAX_DELAY.
+
+        Raises:
+            ValueError: If the batch size is not positive or the delay is
+              negative.
+        """
+        if max_batch_size < 1:
+            raise ValueError("The maximum batch size must be positive.")
+        if max_delay < 0:
+            raise ValueError("The maximum delay must not be negative.")
+        self.batch_fn = batch_fn
+        self.max_batch_size = max_batch_size
+        self.max_delay = max_delay
+
+        self._pending: Deque[Tuple[Any, asyncio.Future, float]] = deque()
+        self._has_pending: asyncio.Event = None
+        self._executor: ThreadPoolExecutor = None
+        self._worker: asyncio.Task = None
+
+    @property
+    def running(self) -> bool:
+        """Whether the micro-batcher is started."""
+        return self._worker is not None
+
+    async def start(self) -> None:
+        """Starts dispatching batches on the running event loop."""
+        if self.running:
+            return
+        self._has_pending = asyncio.Event()
+        self._executor = ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix="micro-batcher"
+        )
+        self._worker = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self) -> None:
+        """Stops dispatching batches.
+
+        Queued items and the items of the batch being processed are
+        cancelled. The batch function is left to complete.
+        """
+        if not self.running:
+            return
+        self._worker.cancel()
+        try:
+            await self._worker
+        except asyncio.CancelledError:
+            pass
+        self._worker = None
+        while self._pending:
+            _, future, _ = self._pending.popleft()
+            future.cancel()
+        self._executor.shutdown(wait=True)
+        self._executor = None
+
+    async def submit(self, item: Any) -> Any:
+        """Submits an item and waits for its result.
+
+        Args:
+            item: Item to process.
+
+        Raises:
+            RuntimeError: If the micro-batcher is not started.
+
+        Returns:
+            Result of the item.
+        """
+        if not self.running:
+            raise RuntimeError("The micro-batcher is not started.")
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((item, future, time.monotonic()))
+        self._has_pending.set()
+        return await future
+
+    async def _next_batch(self) -> List[Tuple[Any, asyncio.Future, float]]:
+        """Waits for the next batch to be complete.
+
+        Returns:
+            Queued items of the batch, with their future and arrival time.
+        """
+        while not self._pending:
+            self._has_pending.clear()
+            await self._has_pending.wait()
+
+        # The delay counts from the arrival of the oldest item, which may have
+        # been queued while the previous batch was processed
+        deadline = self._pending[0][2] + self.max_delay
+        while len(self._pending) < self.max_batch_size:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            self._has_pending.clear()
+            try:
+                await asyncio.wait_for(self._has_pending.wait(), timeout)
+            except asyncio.TimeoutError:
+                break
+
+        batch_size = min(len(self._pending), self.max_batch_size)
+        return [self._pending.popleft() for _ in range(batch_size)]
+
+    async def _run(self) -> None:
+        """Dispatches batches to the batch function until cancelled."""
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = await self._next_batch()
+            # Items whose submitter gave up are not processed
+            batch = [entry for entry in batch if not entry[1].done()]
+            if not batch:
+                continue
+
+            items = [item for item, _, _ in batch]
+            try:
+                results = await loop.run_in_executor(
+                    self._executor, self.batch_fn, items
+                )
+                if len(results) != len(items):
+                    raise RuntimeError(
+                        f"Batch function returned {len(results)} results for "
+                        f"{len(items)} items."
+                    )
+            except asyncio.CancelledError:
+                for _, future, _ in batch:
+                    future.cancel()
+                raise
+            except Exception as e:
+                logger.error(f"Error while processing a batch: {e}")
+                results = [e] * len(items)
+
+            for (_, future, _), result in zip(batch, results):
+                if future.done():
+                    continue
+                if isinstance(result, Exception):
+                    future.set_exception(result)
+                else:
+                    future.set_result(result)
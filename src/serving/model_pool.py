@@ -0,0 +1,388 @@
+"""Pool of CRS models served by one process.
+
+The pool knows the configuration files of the models (by default, the CRS
+Arena configurations in `data/arena/crs_config/`) and loads a model on first
+use. The memory of each model is measured when it is loaded, as the growth of
+the resident memory of the process (and of the allocated GPU memory, if any).
+As a reload may reuse memory freed by the process, the estimate of a model is
+the largest of its measurements.
+When the models exceed the memory budget, the least recently used ones are
+evicted, except the pinned models. The loaded models can be used while
+another model is loading.
+"""
+
+from __future__ import annotations
+
+import gc
+import glob
+import logging
+import os
+import sys
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List
+
+import yaml
+
+from src.model.crs_model import CRSModel
+
+DEFAULT_CONFIG_FOLDER = "data/arena/crs_config"
+DEFAULT_MEMORY_BUDGET_GB = 16.0
+
+logger = logging.getLogger(__name__)
+
+
+def get_resident_memory() -> int:
+    """Returns the memory used by the process, in bytes.
+
+    The resident set size is read from `/proc`, so it is only available on
+    Linux. The GPU memory allocated by PyTorch is added if PyTorch is used.
+
+    Returns:
+        Memory used, 0 if it cannot be measured.
+    """
+    memory = 0
+    try:
+        with open("/proc/self/statm", "r") as f:
+            memory = int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        pass
+
+    torch = sys.modules.get("torch")
+    if torch is not None and torch.cuda.is_available():
+        memory += torch.cuda.memory_allocated()
+    return memory
+
+
+def get_response_generation_args(
+    model_name: str, kg_dataset: str
+) -> Dict[str, Any]:
+    """Returns the arguments for response generation of a model.
+
+    Args:
+        model_name: Model name, e.g., "unicrs" or "unicrs_redial".
+        kg_dataset: Name of knowledge graph dataset.
+
+    Returns:
+        Arguments for response generation.
+    """
+    if model_name.split("_")[0] == "unicrs":
+        return {
+            "movie_token": (
+                "<movie>" if kg_dataset.startswith("redial") else "<mask>"
+            ),
+        }
+    return {}
+
+
+def find_model_configs(
+    config_folder: str = DEFAULT_CONFIG_FOLDER,
+) -> Dict[str, str]:
+    """Finds the configuration files of the models.
+
+    The name of a model is derived from its configuration file name, e.g.,
+    "crbcrs_redial" for `CRB_CRS/crb_crs_redial.yaml`, as in CRS Arena.
+
+    Args:
+        config_folder: Folder with a subfolder of configuration files per
+          CRS. Defaults to DEFAULT_CONFIG_FOLDER.
+
+    Returns:
+        Configuration file of each model.
+    """
+    configs = {}
+    for path in sorted(glob.glob(os.path.join(config_folder, "*", "*.yaml"))):
+        crs_name, _, dataset = (
+            os.path.splitext(os.path.basename(path))[0].rpartition("_")
+        )
+        configs[f"{crs_name.replace('_', '')}_{dataset}"] = path
+    return configs
+
+
+class PooledModel:
+    def __init__(
+        self, name: str, crs_model: CRSModel, memory: int, pinned: bool = False
+    ) -> None:
+        """Initializes a model of the pool.
+
+        Args:
+            name: Model name.
+            crs_model: CRS model.
+            memory: Memory used by the model, in bytes.
+            pinned: Whether the model is never evicted. Defaults to False.
+        """
+        self.name = name
+        self.crs_model = crs_model
+        self.memory = memory
+        self.pinned = pinned
+        self.kg_dataset = crs_model.crs_model.kg_dataset
+        self.response_generation_args = get_response_generation_args(
+            name, self.kg_dataset
+        )
+
+
+class ModelPool:
+    def __init__(
+        self,
+        configs: Dict[str, str],
+        memory_budget: int,
+        pinned: Iterable[str] = (),
+    ) -> None:
+        """Initializes the model pool.
+
+        Args:
+            configs: Configuration file of each model.
+            memory_budget: Memory the models may use, in bytes. Pinned models
+              are kept even if they exceed it.
+            pinned: Names of the models that are never evicted, they are
+              loaded on first use like the others. Defaults to none.
+
+        Raises:
+            ValueError: If a pinned model has no configuration.
+        """
+        self.configs = dict(configs)
+        self.memory_budget = memory_budget
+        self.pinned = set(pinned)
+        unknown = self.pinned - set(self.configs)
+        if unknown:
+            raise ValueError(f"Unknown pinned models: {sorted(unknown)}.")
+
+        self._models: OrderedDict[str, PooledModel] = OrderedDict()
+        # Largest memory measured at the loads of each model, used to make
+        # room before reloading it
+        self._memory_estimates: Dict[str, int] = {}
+        # Protects the loaded models, it is not held while a model is loading
+        self._lock = threading.RLock()
+        # Loads are serialized, so that the memory growth of the process is
+        # attributable to the model being loaded
+        self._load_lock = threading.Lock()
+
+    @classmethod
+    def from_config_folder(
+        cls,
+        config_folder: str = DEFAULT_CONFIG_FOLDER,
+        memory_budget: int = int(DEFAULT_MEMORY_BUDGET_GB * 1024**3),
+        pinned: Iterable[str] = (),
+    ) -> ModelPool:
+        """Creates a pool of the models configured in a folder.
+
+        Args:
+            config_folder: Folder with a subfolder of configuration files per
+              CRS. Defaults to DEFAULT_CONFIG_FOLDER.
+            memory_budget: Memory the models may use, in bytes. Defaults to
+              DEFAULT_MEMORY_BUDGET_GB.
+            pinned: Names of the models that are never evicted. Defaults to
+              none.
+
+        Returns:
+            Model pool.
+        """
+        return cls(find_model_configs(config_folder), memory_budget, pinned)
+
+    @property
+    def model_names(self) -> List[str]:
+        """Names of the models that can be served."""
+        return list(self.configs) + [
+            name for name in self._models if name not in self.configs
+        ]
+
+    @property
+    def memory_usage(self) -> int:
+        """Memory used by the loaded models, in bytes."""
+        return sum(model.memory for model in self._models.values())
+
+    def is_loaded(self, name: str) -> bool:
+        """Returns whether a model is loaded.
+
+        Args:
+            name: Model name.
+        """
+        return name in self._models
+
+    def add(self, name: str, crs_model: CRSModel) -> PooledModel:
+        """Adds a model that is already loaded.
+
+        The model is pinned, as it cannot be reloaded without configuration.
+        Its memory is not known, so it does not count towards the budget.
+
+        Args:
+            name: Model name.
+            crs_model: CRS model.
+
+        Returns:
+            Model.
+        """
+        model = PooledModel(name, crs_model, 0, pinned=True)
+        with self._lock:
+            self._models[name] = model
+            self.pinned.add(name)
+        return model
+
+    def get_loaded(self, name: str) -> PooledModel:
+        """Gets a model if it is loaded, without loading it.
+
+        Args:
+            name: Model name.
+
+        Returns:
+            Model, None if it is not loaded.
+        """
+        with self._lock:
+            model = self._models.get(name)
+            if model is not None:
+                self._models.move_to_end(name)
+            return model
+
+    def get(self, name: str) -> PooledModel:
+        """Gets a model, loading it if needed.
+
+        Args:
+            name: Model name.
+
+        Raises:
+            ValueError: If the model is neither loaded nor configured.
+
+        Returns:
+            Model.
+        """
+        model = self.get_loaded(name)
+        if model is not None:
+            return model
+        if name not in self.configs:
+            raise ValueError(
+                f"Model {name} is not available, choose from "
+                f"{self.model_names}."
+            )
+
+        with self._load_lock:
+            # The model may have been loaded while waiting for the lock
+            model = self.get_loaded(name)
+            if model is not None:
+                return model
+            with self._lock:
+                self._make_room(
+                    self._memory_estimates.get(name, 0), keep=name
+                )
+            model = self._load(name)
+            with self._lock:
+                self._models[name] = model
+                self._make_room(0, keep=name)
+            return model
+
+    def pin(self, name: str) -> PooledModel:
+        """Pins a model, loading it if needed.
+
+        Args:
+            name: Model name.
+
+        Returns:
+            Model.
+        """
+        model = self.get(name)
+        with self._lock:
+            model.pinned = True
+            self.pinned.add(name)
+        return model
+
+    def unpin(self, name: str) -> None:
+        """Unpins a model, it may be evicted again.
+
+        Models added without configuration stay pinned.
+
+        Args:
+            name: Model name.
+        """
+        if name not in self.configs:
+            return
+        with self._lock:
+            self.pinned.discard(name)
+            if name in self._models:
+                self._models[name].pinned = False
+            self._make_room(0)
+
+    def evict(self, name: str) -> None:
+        """Evicts a model, if it is loaded.
+
+        The memory is released once the requests using the model complete.
+
+        Args:
+            name: Model name.
+        """
+        with self._lock:
+            model = self._models.pop(name, None)
+            if model is None:
+                return
+            logger.info(
+                f"Evicting model {name} ({model.memory / 1024**2:.0f} MB)."
+            )
+            del model
+            gc.collect()
+            torch = sys.modules.get("torch")
+            if torch is not None and torch.cuda.is_available():
+                torch.cuda.empty_cache()
+
+    def stats(self) -> List[Dict[str, Any]]:
+        """Returns the loaded models, least recently used first.
+
+        Returns:
+            Name, memory (bytes), and pinning of each loaded model.
+        """
+        with self._lock:
+            return [
+                {
+                    "name": model.name,
+                    "memory": model.memory,
+                    "pinned": model.pinned,
+                }
+                for model in self._models.values()
+            ]
+
+    def _load(self, name: str) -> PooledModel:
+        """Loads a model and measures its memory, the load lock must be held.
+
+        Args:
+            name: Model name.
+
+        Returns:
+            Model.
+        """
+        with open(self.configs[name], "r") as f:
+            model_args = yaml.safe_load(f)
+
+        logger.info(f"Loading model {name}.")
+        memory_before = get_resident_memory()
+        crs_model = CRSModel(name.split("_")[0], **model_args)
+        memory = max(get_resident_memory() - memory_before, 0)
+        logger.info(f"Loaded model {name} ({memory / 1024**2:.0f} MB).")
+
+        # The growth may under-count the model, e.g., if memory released by
+        # an evicted model is reused
+        memory = max(memory, self._memory_estimates.get(name, 0))
+        self._memory_estimates[name] = memory
+        return PooledModel(name, crs_model, memory, name in self.pinned)
+
+    def _make_room(self, memory: int, keep: str = None) -> None:
+        """Evicts the least recently used models to stay within the budget.
+
+        The lock must be held.
+
+        Args:
+            memory: Memory needed in addition to the loaded models, in bytes.
+            keep: Name of a model not to evict. Defaults to None.
+        """
+        while self.memory_usage + memory > self.memory_budget:
+            victim = next(
+                (
+                    model.name
+                    for model in self._models.values()
+                    if not model.pinned and model.name != keep
+                ),
+                None,
+            )
+            if victim is None:
+                logger.warning(
+                    "The memory budget is exceeded, but no model can be "
+                    "evicted."
+                )
+                return
+            self.evict(victim)
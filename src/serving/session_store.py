@@ -0,0 +1,424 @@
+"""Server-side storage of the conversation sessions.
+
+A session holds everything the server needs to continue a conversation: the
+context, the entities linked in each utterance, and the state of the options.
+This way, a request only carries the new message and the server only links
+the entities of that message.
+
+Sessions expire after a time-to-live without access, and the least recently
+used sessions are evicted when the store is full. Two stores are available:
+in memory, and in a local SQLite database that survives restarts and can be
+shared by several processes.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Any, Dict, List
+
+DEFAULT_TTL = 3600.0
+DEFAULT_MAX_SESSIONS = 10_000
+SESSION_STORES = ["memory", "sqlite"]
+
+
+class ConversationSession:
+    def __init__(
+        self,
+        session_id: str,
+        context: List[str] = None,
+        entities: List[List[str]] = None,
+        state: List[float] = None,
+    ) -> None:
+        """Initializes a conversation session.
+
+        Args:
+            session_id: Session id.
+            context: Utterances of the conversation. Defaults to none.
+            entities: Entities linked in each utterance of the context.
+              Defaults to none.
+            state: State of the options. Defaults to None.
+        """
+        self.session_id = session_id
+        self.context = context or []
+        self.entities = entities or []
+        self.state = state
+
+    def copy(self) -> ConversationSession:
+        """Returns a copy of the session that can be updated independently."""
+        return ConversationSession(
+            self.session_id,
+            list(self.context),
+            [list(entities) for entities in self.entities],
+            None if self.state is None else list(self.state),
+        )
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Returns the session as a dictionary that can be serialized to JSON.
+
+        Returns:
+            Session id, context, entities, and state.
+        """
+        return {
+            "session_id": self.session_id,
+            "context": self.context,
+            "entities": self.entities,
+            "state": self.state,
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> ConversationSession:
+        """Creates a session from its dictionary (see `to_dict`).
+
+        Args:
+            data: Dictionary of the session.
+
+        Returns:
+            Session.
+        """
+        return cls(
+            data["session_id"],
+            data["context"],
+            data["entities"],
+            data["state"],
+        )
+
+    def reset(self) -> None:
+        """Clears the conversation, the state of the options is kept."""
+        self.context = []
+        self.entities = []
+
+
+class SessionStore(ABC):
+    def __init__(
+        self,
+        ttl: float = DEFAULT_TTL,
+        max_sessions: int = DEFAULT_MAX_SESSIONS,
+    ) -> None:
+        """Initializes the session store.
+
+        Args:
+            ttl: Time in seconds after which a session that is not accessed
+              expires. Defaults to DEFAULT_TTL.
+            max_sessions: Maximum number of sessions, the least recently used
+              are evicted. Defaults to DEFAULT_MAX_SESSIONS.
+
+        Raises:
+            ValueError: If the time-to-live or the maximum number of sessions
+              is not positive.
+        """
+        if ttl <= 0:
+            raise ValueError("The time-to-live must be positive.")
+        if max_sessions < 1:
+            raise ValueError(
+                "The maximum number of sessions must be positive."
+            )
+        self.ttl = ttl
+        self.max_sessions = max_sessions
+        self._lock = threading.Lock()
+
+    @abstractmethod
+    def get(self, session_id: str) -> ConversationSession:
+        """Gets a session.
+
+        Changes to the returned session are only stored with `put`.
+
+        Args:
+            session_id: Session id.
+
+        Raises:
+            NotImplementedError: If the method is not implemented in the
+              subclass.
+
+        Returns:
+            Session, None if it does not exist or has expired.
+        """
+        raise NotImplementedError
+
+    def get_or_create(self, session_id: str) -> ConversationSession:
+        """Gets a session, or a new one if it does not exist or has expired.
+
+        Args:
+            session_id: Session id.
+
+        Returns:
+            Session.
+        """
+        session = self.get(session_id)
+        if session is None:
+            session = ConversationSession(session_id)
+        return session
+
+    @abstractmethod
+    def put(self, session: ConversationSession) -> None:
+        """Stores a session, evicting the least recently used if needed.
+
+        Args:
+            session: Session.
+
+        Raises:
+            NotImplementedError: If the method is not implemented in the
+              subclass.
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def delete(self, session_id: str) -> None:
+        """Deletes a session, if it exists.
+
+        Args:
+            session_id: Session id.
+
+        Raises:
+            NotImplementedError: If the method is not implemented in the
+              subclass.
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def __len__(self) -> int:
+        """Returns the number of sessions, expired ones included.
+
+        Raises:
+            NotImplementedError: If the method is not implemented in the
+              subclass.
+        """
+        raise NotImplementedError
+
+
+class InMemorySessionStore(SessionStore):
+    def __init__(
+        self,
+        ttl: float = DEFAULT_TTL,
+        max_sessions: int = DEFAULT_MAX_SESSIONS,
+    ) -> None:
+        """Initializes the in-memory session store.
+
+        Sessions are kept in least recently used order with their last
+        access time. Copies are returned by `get`, so that a request that
+        fails leaves its session unchanged.
+
+        Args:
+            ttl: Time in seconds after which a session that is not accessed
+              expires. Defaults to DEFAULT_TTL.
+            max_sessions: Maximum number of sessions. Defaults to
+              DEFAULT_MAX_SESSIONS.
+        """
+        super().__init__(ttl, max_sessions)
+        self._sessions: OrderedDict[str, ConversationSession] = OrderedDict()
+        self._last_access: Dict[str, float] = {}
+
+    def get(self, session_id: str) -> ConversationSession:
+        """Gets a session.
+
+        Args:
+            session_id: Session id.
+
+        Returns:
+            Session, None if it does not exist or has expired.
+        """
+        now = time.monotonic()
+        with self._lock:
+            self._evict_expired(now)
+            session = self._sessions.get(session_id)
+            if session is not None:
+                self._sessions.move_to_end(session_id)
+                self._last_access[session_id] = now
+                return session.copy()
+            return None
+
+    def put(self, session: ConversationSession) -> None:
+        """Stores a session, evicting the least recently used if needed.
+
+        Args:
+            session: Session.
+        """
+        now = time.monotonic()
+        with self._lock:
+            self._sessions[session.session_id] = session
+            self._sessions.move_to_end(session.session_id)
+            self._last_access[session.session_id] = now
+            self._evict_expired(now)
+            while len(self._sessions) > self.max_sessions:
+                session_id, _ = self._sessions.popitem(last=False)
+                del self._last_access[session_id]
+
+    def delete(self, session_id: str) -> None:
+        """Deletes a session, if it exists.
+
+        Args:
+            session_id: Session id.
+        """
+        with self._lock:
+            self._sessions.pop(session_id, None)
+            self._last_access.pop(session_id, None)
+
+    def __len__(self) -> int:
+        """Returns the number of sessions, expired ones included."""
+        return len(self._sessions)
+
+    def _evict_expired(self, now: float) -> None:
+        """Evicts the expired sessions, the lock must be held.
+
+        As sessions are in least recently used order, the expired ones are
+        at the front.
+
+        Args:
+            now: Current time.
+        """
+        while self._sessions:
+            session_id = next(iter(self._sessions))
+            if now - self._last_access[session_id] <= self.ttl:
+                break
+            del self._sessions[session_id]
+            del self._last_access[session_id]
+
+
+class SQLiteSessionStore(SessionStore):
+    def __init__(
+        self,
+        path: str,
+        ttl: float = DEFAULT_TTL,
+        max_sessions: int = DEFAULT_MAX_SESSIONS,
+    ) -> None:
+        """Initializes the SQLite session store.
+
+        Sessions are serialized to JSON in a table with their last access
+        time (wall clock, to be meaningful across restarts). Unlike pickles,
+        the data read from the database cannot execute code when it is
+        loaded. Sessions that cannot be decoded, e.g., written by an earlier
+        version, are treated as expired.
+
+        Args:
+            path: Path to the SQLite database, created if needed.
+            ttl: Time in seconds after which a session that is not accessed
+              expires. Defaults to DEFAULT_TTL.
+            max_sessions: Maximum number of sessions. Defaults to
+              DEFAULT_MAX_SESSIONS.
+        """
+        super().__init__(ttl, max_sessions)
+        folder = os.path.dirname(path)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._connection:
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS sessions ("
+                "session_id TEXT PRIMARY KEY, "
+                "data TEXT NOT NULL, "
+                "last_access REAL NOT NULL)"
+            )
+            self._connection.execute(
+                "CREATE INDEX IF NOT EXISTS sessions_last_access "
+                "ON sessions (last_access)"
+            )
+
+    def get(self, session_id: str) -> ConversationSession:
+        """Gets a session.
+
+        Args:
+            session_id: Session id.
+
+        Returns:
+            Session, None if it does not exist or has expired.
+        """
+        now = time.time()
+        with self._lock, self._connection:
+            row = self._connection.execute(
+                "SELECT data FROM sessions "
+                "WHERE session_id = ? AND last_access >= ?",
+                (session_id, now - self.ttl),
+            ).fetchone()
+            if row is None:
+                return None
+            self._connection.execute(
+                "UPDATE sessions SET last_access = ? WHERE session_id = ?",
+                (now, session_id),
+            )
+        try:
+            return ConversationSession.from_dict(json.loads(row[0]))
+        except (ValueError, KeyError, TypeError):
+            return None
+
+    def put(self, session: ConversationSession) -> None:
+        """Stores a session, evicting the least recently used if needed.
+
+        Args:
+            session: Session.
+        """
+        now = time.time()
+        data = json.dumps(session.to_dict())
+        with self._lock, self._connection:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO sessions "
+                "(session_id, data, last_access) VALUES (?, ?, ?)",
+                (session.session_id, data, now),
+            )
+            self._connection.execute(
+                "DELETE FROM sessions WHERE last_access < ?",
+                (now - self.ttl,),
+            )
+            self._connection.execute(
+                "DELETE FROM sessions WHERE session_id IN ("
+                "SELECT session_id FROM sessions "
+                "ORDER BY last_access DESC LIMIT -1 OFFSET ?)",
+                (self.max_sessions,),
+            )
+
+    def delete(self, session_id: str) -> None:
+        """Deletes a session, if it exists.
+
+        Args:
+            session_id: Session id.
+        """
+        with self._lock, self._connection:
+            self._connection.execute(
+                "DELETE FROM sessions WHERE session_id = ?", (session_id,)
+            )
+
+    def __len__(self) -> int:
+        """Returns the number of sessions, expired ones included."""
+        with self._lock:
+            return self._connection.execute(
+                "SELECT COUNT(*) FROM sessions"
+            ).fetchone()[0]
+
+
+def create_session_store(
+    store: str = "memory",
+    path: str = None,
+    ttl: float = DEFAULT_TTL,
+    max_sessions: int = DEFAULT_MAX_SESSIONS,
+) -> SessionStore:
+    """Creates a session store.
+
+    Args:
+        store: Type of store, "memory" or "sqlite". Defaults to "memory".
+        path: Path to the SQLite database. Defaults to None.
+        ttl: Time in seconds after which a session that is not accessed
+          expires. Defaults to DEFAULT_TTL.
+        max_sessions: Maximum number of sessions. Defaults to
+          DEFAULT_MAX_SESSIONS.
+
+    Raises:
+        ValueError: If the store is not supported or the path of the SQLite
+          database is missing.
+
+    Returns:
+        Session store.
+    """
+    if store == "memory":
+        return InMemorySessionStore(ttl, max_sessions)
+    elif store == "sqlite":
+        if not path:
+            raise ValueError("The SQLite session store requires a path.")
+        return SQLiteSessionStore(path, ttl, max_sessions)
+    raise ValueError(
+        f"Session store {store} is not supported, choose from "
+        f"{SESSION_STORES}."
+    )